@@ -0,0 +1,184 @@
+"""
+Scaling benchmark of the data minimization pipeline.
+
+Every strategy (all the budgets of INTERACTIONS_N at once) and every splitter runs on seeded synthetic interaction sets
+of growing size. The wall time (best of --repeat runs) and the peak memory allocated (tracemalloc, in a separate run)
+are written to a json file, together with the commit and library versions, so that two runs can be compared with
+--compare:
+
+    python benchmark_minimization.py --sizes 100000 1000000 --output bench/head.json --compare bench/base.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from data_minimization import data_splitting
+from data_minimization import minimization_strategies
+from data_minimization.synthetic_interactions import generate_interactions
+from minimize_dataset import INTERACTIONS_N
+
+SIZES = [100_000, 1_000_000, 10_000_000, 50_000_000]
+COLUMNS = dict(user_col_name='user_id:token', item_col_name='item_id:token', rating_col_name='rating:float',
+               timestamp_col_name='timestamp:float')
+
+
+def strategy_case(strategy: str) -> Callable[[pd.DataFrame], object]:
+    return lambda df: minimization_strategies.multi_budget_min(df, strategy, INTERACTIONS_N, **COLUMNS)
+
+
+CASES: Dict[str, Callable[[pd.DataFrame], object]] = {
+    **{'strategy/' + strategy: strategy_case(strategy) for strategy in minimization_strategies.ranking_mapping
+       if strategy != 'full'},
+    'splitter/iterative_k_core': lambda df: data_splitting.iterative_k_core(
+        df, column1=COLUMNS['user_col_name'], column2=COLUMNS['item_col_name'], k=5),
+    'splitter/k_core': lambda df: data_splitting.k_core(df, column=COLUMNS['user_col_name'], k=45),
+    'splitter/user_based_split': lambda df: data_splitting.user_based_split(
+        df, user_col=COLUMNS['user_col_name'], percentage=0.7, seed=42),
+    'splitter/split_dataset_per_user': lambda df: data_splitting.split_dataset_per_user(
+        df, user_col=COLUMNS['user_col_name'], train_ratio=0.7, val_ratio=0.1, test_ratio=0.2),
+    'splitter/split_dataset_per_user_train_test': lambda df: data_splitting.split_dataset_per_user_train_test(
+        df, user_col=COLUMNS['user_col_name'], percentage=0.7),
+}
+
+
+def time_case(case: Callable[[pd.DataFrame], object], df: pd.DataFrame, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        case(df)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def peak_memory_case(case: Callable[[pd.DataFrame], object], df: pd.DataFrame) -> float:
+    # numpy and pandas buffers are traced by tracemalloc, the input DataFrame allocated before is not counted
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case(df)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def run_benchmark(sizes: List[int] = SIZES, cases: List[str] = None, repeat: int = 3, memory: bool = True,
+                  max_seconds: float = None, interactions_per_user: int = 50, interactions_per_item: int = 25,
+                  **generator_kwargs) -> List[dict]:
+    """
+    Time and memory-profile the cases on synthetic interaction sets of each size.
+
+    Args:
+        sizes (List[int]): The numbers of interactions.
+        cases (List[str]): The names of the cases (keys of CASES), all of them by default.
+        repeat (int): The number of timed runs, the best one is kept.
+        memory (bool): Whether to measure the peak memory, in one more run.
+        max_seconds (float): A case slower than this is not run on the larger sizes.
+        interactions_per_user (int): The average number of interactions per user, fixing the number of users.
+        interactions_per_item (int): The average number of interactions per item, fixing the number of items.
+        **generator_kwargs: Forwarded to generate_interactions (exponents, ratings, timestamps, seed).
+
+    Returns:
+        List[dict]: One record per (case, size).
+    """
+    cases = cases if cases is not None else list(CASES)
+    too_slow = set()
+    results = []
+    for size in sorted(sizes):
+        started = time.perf_counter()
+        df = generate_interactions(size, n_users=max(1, size // interactions_per_user),
+                                   n_items=max(1, size // interactions_per_item), **COLUMNS, **generator_kwargs)
+        print(f" Generated {size} interactions in {time.perf_counter() - started:.2f}s")
+        for name in cases:
+            record = {'case': name, 'interactions': size, 'users': int(df[COLUMNS['user_col_name']].nunique()),
+                      'items': int(df[COLUMNS['item_col_name']].nunique()), 'seconds': None,
+                      'peak_memory_mb': None, 'status': 'ok'}
+            if name in too_slow:
+                record['status'] = 'skipped'
+            else:
+                try:
+                    record['seconds'] = time_case(CASES[name], df, repeat)
+                    if memory:
+                        record['peak_memory_mb'] = peak_memory_case(CASES[name], df)
+                except (KeyError, ValueError) as e:
+                    # e.g. most_recent without timestamps
+                    record['status'] = f"unsupported: {e}"
+                if max_seconds is not None and (record['seconds'] or 0) > max_seconds:
+                    too_slow.add(name)
+            results.append(record)
+            print(f" {name:<45} {size:>10} {record['status'] if record['seconds'] is None else '':<12}"
+                  f"{record['seconds'] or 0:>9.3f}s {record['peak_memory_mb'] or 0:>10.1f}MB")
+        del df
+    return results
+
+
+def compare(results: List[dict], baseline: List[dict]) -> None:
+    previous = {(r['case'], r['interactions']): r for r in baseline}
+    print(f" {'case':<45} {'size':>10} {'time':>9} {'memory':>9}")
+    for record in results:
+        base = previous.get((record['case'], record['interactions']))
+        if base is None or record['seconds'] is None or base['seconds'] is None:
+            continue
+        memory_ratio = (record['peak_memory_mb'] / base['peak_memory_mb']
+                        if record['peak_memory_mb'] and base['peak_memory_mb'] else float('nan'))
+        print(f" {record['case']:<45} {record['interactions']:>10} {record['seconds'] / base['seconds']:>8.2f}x "
+              f"{memory_ratio:>8.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the data minimization strategies and splitters.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="numbers of interactions")
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="skip the peak memory run")
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help="do not run a case on larger sizes once it took longer than this")
+    parser.add_argument('--interactions-per-user', type=int, default=50)
+    parser.add_argument('--interactions-per-item', type=int, default=25)
+    parser.add_argument('--min-interactions', type=int, default=1)
+    parser.add_argument('--user-exponent', type=float, default=1.5)
+    parser.add_argument('--item-exponent', type=float, default=1.0)
+    parser.add_argument('--no-ratings', action='store_true')
+    parser.add_argument('--no-timestamps', action='store_true')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmark_minimization.json')
+    parser.add_argument('--compare', default=None, help="json file of a previous run")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        sizes=args.sizes, cases=args.cases, repeat=args.repeat, memory=not args.no_memory,
+        max_seconds=args.max_seconds, interactions_per_user=args.interactions_per_user,
+        interactions_per_item=args.interactions_per_item, min_interactions=args.min_interactions,
+        user_exponent=args.user_exponent, item_exponent=args.item_exponent, ratings=not args.no_ratings,
+        timestamps=not args.no_timestamps, seed=args.seed)
+
+    output = {'environment': environment(), 'arguments': vars(args), 'results': results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=1, sort_keys=True)
+    print(f" Results saved in {args.output}")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['results'])
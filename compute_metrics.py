@@ -12,16 +12,16 @@ def compute_metric():
         if dataset == 'ml-1m':
             STRATEGIES = ['highest_variance', 'least_favorite', 'most_characteristic', 'most_favorite',
                           'most_rated', 'most_recent', 'random', 'full']
-            metrics_parameters = {'ml-1m': {'item_clustering_file_name': 'item_release_year:token.tsv',
+            metrics_parameters = {'ml-1m': {'item_clustering_file_name': 'item_release_year:token.npz',
                                             'item_clustering_name': 'item_release_year',
-                                            'user_clustering_file_name': 'user_gender:token.tsv',
+                                            'user_clustering_file_name': 'user_gender:token.npz',
                                             'user_clustering_name': 'user_gender'}}
         elif dataset == 'ambar':
             STRATEGIES = ['highest_variance', 'least_favorite', 'most_characteristic', 'most_favorite',
                           'most_rated', 'random', 'full']
-            metrics_parameters = {'ambar': {'item_clustering_file_name': 'item_continent.tsv',
+            metrics_parameters = {'ambar': {'item_clustering_file_name': 'item_continent.npz',
                                             'item_clustering_name': 'item_continent',
-                                            'user_clustering_file_name': 'user_continent.tsv',
+                                            'user_clustering_file_name': 'user_continent.npz',
                                             'user_clustering_name': 'user_continent'}}
         else:
             raise NotImplementedError
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from typing import List
 from sklearn.model_selection import train_test_split
 
 import pandas as pd
@@ -50,7 +51,47 @@ def subsample_by_column(df: pd.DataFrame, column: str, n:int = 2500, seed=42):
     return filtered_df
 
 
-def iterative_k_core(dataframe: pd.DataFrame, column1: str = 'user_id', column2: str = 'item_id', k: int = 5) -> pd.DataFrame:
+def k_core_keep_mask(dataframe: pd.DataFrame, columns: List[str], k: int = 5) -> (np.ndarray, List[int]):
+    """
+    Computes which rows survive an iterative k-core filtering on the specified columns.
+
+    The values of each column are factorized to int32 codes once. At every round the occurrences of each value among
+    the kept rows are counted with np.bincount (all columns on the same snapshot), and the rows holding a value with
+    less than k occurrences are dropped from the keep-mask, until a round removes nothing.
+
+    Parameters:
+    dataframe (pd.DataFrame): The input dataframe.
+    columns (List[str]): The column names to perform k-core on.
+    k (int): The minimum number of interactions required for every column.
+
+    Returns:
+    Tuple[np.ndarray, List[int]]: The boolean keep-mask and the number of rows removed at each round.
+    """
+    column_codes = []
+    for column in columns:
+        codes, uniques = pd.factorize(dataframe[column])
+        # missing values get their own code, they are never removed as value_counts ignores them
+        codes[codes < 0] = len(uniques)
+        column_codes.append((codes.astype(np.int32), len(uniques)))
+
+    keep = np.ones(len(dataframe), dtype=bool)
+    removed_per_round = []
+    while True:
+        new_keep = keep.copy()
+        for codes, n_values in column_codes:
+            counts = np.bincount(codes[keep], minlength=n_values + 1)
+            counts[n_values] = k
+            new_keep &= counts[codes] >= k
+        n_removed = int(keep.sum() - new_keep.sum())
+        if n_removed == 0:
+            break
+        removed_per_round.append(n_removed)
+        keep = new_keep
+    return keep, removed_per_round
+
+
+def iterative_k_core(dataframe: pd.DataFrame, column1: str = 'user_id', column2: str = 'item_id', k: int = 5,
+                     return_stats: bool = False) -> pd.DataFrame:
     """
     Performs k-core filtering on the dataset based on two specified columns.
     Filters the dataset by deleting rows, such that each value in both specified columns
@@ -61,34 +102,19 @@ def iterative_k_core(dataframe: pd.DataFrame, column1: str = 'user_id', column2:
     column1 (str): The first column name to perform k-core on. Default is 'user_id'.
     column2 (str): The second column name to perform k-core on. Default is 'item_id'.
     k (int): The minimum number of interactions required for both columns.
+    return_stats (bool): If True, also return the number of rows removed at each round.
 
     Returns:
     pd.DataFrame: The filtered dataframe.
     """
-    filtered_df = dataframe.copy()
-    while True:
-        # Count occurrences of each value in column1
-        counts_col1 = filtered_df[column1].value_counts()
-        to_remove_col1 = counts_col1[counts_col1 < k].index
-
-        # Count occurrences of each value in column2
-        counts_col2 = filtered_df[column2].value_counts()
-        to_remove_col2 = counts_col2[counts_col2 < k].index
-
-        # Check if any values need to be removed in either column
-        if len(to_remove_col1) == 0 and len(to_remove_col2) == 0:
-            break
-
-        # Filter out rows with values in column1 that have counts less than k
-        filtered_df = filtered_df[~filtered_df[column1].isin(to_remove_col1)]
-
-        # Filter out rows with values in column2 that have counts less than k
-        filtered_df = filtered_df[~filtered_df[column2].isin(to_remove_col2)]
-
+    keep, removed_per_round = k_core_keep_mask(dataframe, columns=[column1, column2], k=k)
+    filtered_df = dataframe[keep]
+    if return_stats:
+        return filtered_df, removed_per_round
     return filtered_df
 
 
-def k_core(dataframe: pd.DataFrame, column: str = 'user_id', k: int = 5) -> pd.DataFrame:
+def k_core(dataframe: pd.DataFrame, column: str = 'user_id', k: int = 5, return_stats: bool = False) -> pd.DataFrame:
     """
     Performs k-core filtering on the dataset based on the specified column.
     Filters the dataset by deleting rows, such that each value in the specified column in the final dataset has at least k interactions.
@@ -97,21 +123,15 @@ def k_core(dataframe: pd.DataFrame, column: str = 'user_id', k: int = 5) -> pd.D
     dataframe (pd.DataFrame): The input dataframe.
     column (str): The column name to perform k-core on. Default is 'user_id'.
     k (int): The minimum number of interactions required.
+    return_stats (bool): If True, also return the number of rows removed at each round.
 
     Returns:
     pd.DataFrame: The filtered dataframe.
     """
-    filtered_df = dataframe.copy()
-    while True:
-        # Count occurrences of each value in the specified column
-        counts = filtered_df[column].value_counts()
-        # Identify values with counts less than k
-        to_remove = counts[counts < k].index
-        # If there are no values to remove, break the loop
-        if len(to_remove) == 0:
-            break
-        # Filter out rows with values that have counts less than k
-        filtered_df = filtered_df[~filtered_df[column].isin(to_remove)]
+    keep, removed_per_round = k_core_keep_mask(dataframe, columns=[column], k=k)
+    filtered_df = dataframe[keep]
+    if return_stats:
+        return filtered_df, removed_per_round
     return filtered_df
 
 def user_based_split(dataframe: pd.DataFrame, user_col: str = 'user_id', percentage: float = 0.5, seed: int = 42) -> (pd.DataFrame, pd.DataFrame):
@@ -157,10 +177,41 @@ def user_based_split(dataframe: pd.DataFrame, user_col: str = 'user_id', percent
 
 
 
-def split_dataset_per_user_train_test(dataframe: pd.DataFrame, user_col: str = 'user_id', percentage: float = 0.5, seed: int = 42) -> (pd.DataFrame, pd.DataFrame):
+def _group_rows(user_codes: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
     """
-    Splits the dataset per user, distributing a percentage A of each user's interactions
-    into the train set and (1-A) into the test set.
+    Group the row positions by user code, keeping the original order within each user.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The grouped row positions, the start of each user in them and the
+                                                   number of rows of each user.
+    """
+    sizes = np.bincount(user_codes)
+    starts = np.cumsum(sizes) - sizes
+    return np.argsort(user_codes, kind='stable'), starts, sizes
+
+
+def _rank_per_user(user_codes: np.ndarray, keys: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Order the rows by user and, within each user, by key.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The ordered row positions, and for each of them the rank within its
+                                                   user and the number of rows of its user.
+    """
+    order = np.lexsort((keys, user_codes))
+    ordered_codes = user_codes[order]
+    sizes = np.bincount(user_codes)
+    starts = np.cumsum(sizes) - sizes
+    return order, np.arange(len(order)) - starts[ordered_codes], sizes[ordered_codes]
+
+
+def split_indices_per_user_train_test(dataframe: pd.DataFrame, user_col: str = 'user_id', percentage: float = 0.5,
+                                      seed: int = 42) -> (np.ndarray, np.ndarray):
+    """
+    Row positions of split_dataset_per_user_train_test, computed without iterating over the users.
+
+    Each user is shuffled by train_test_split with a fresh RandomState(seed), so the shuffle only depends on the
+    number of interactions of the user and a single permutation is drawn for each distinct profile size.
 
     Args:
         dataframe (pd.DataFrame): The dataset.
@@ -169,48 +220,70 @@ def split_dataset_per_user_train_test(dataframe: pd.DataFrame, user_col: str = '
         seed (int): Random seed for reproducibility.
 
     Returns:
-        Tuple[pd.DataFrame, pd.DataFrame]: Two DataFrames, the first containing A% of each user's interactions (train),
-                                           and the second containing the rest (test).
+        Tuple[np.ndarray, np.ndarray]: The positions (as for DataFrame.take) of the train and test rows.
     """
     # Ensure percentage is valid
     if not (0 < percentage < 1):
         raise ValueError("Percentage must be between 0 and 1.")
 
-    train_splits = []
-    test_splits = []
+    user_codes, _ = pd.factorize(dataframe[user_col], sort=True)
+    rows, starts, sizes = _group_rows(user_codes)
+    # train_test_split refuses to leave a user without train rows
+    if (np.floor(percentage * sizes) == 0).any():
+        n_samples = int(sizes[np.floor(percentage * sizes) == 0].min())
+        raise ValueError(f"With n_samples={n_samples} and train_size={percentage}, the train split of a user would be "
+                         f"empty. Filter the users with too few interactions or increase train_size.")
+    keys = np.empty(len(user_codes), dtype=np.int64)
+    for size, users in pd.Series(np.arange(len(sizes))).groupby(sizes).indices.items():
+        # row permutation[j] of a user is the j-th one drawn
+        permutation = np.random.RandomState(seed).permutation(size)
+        user_rows = rows[starts[users, None] + permutation]
+        keys[user_rows] = np.arange(size)
+
+    order, rank, size = _rank_per_user(user_codes, keys)
+    n_test = size - np.floor(percentage * size).astype(np.int64)
+    # train_test_split returns permutation[n_test:] as train and permutation[:n_test] as test
+    return order[rank >= n_test], order[rank < n_test]
 
-    # Group the dataset by user_id
-    grouped = dataframe.groupby(user_col)
 
-    for user_id, user_data in grouped:
-        # Split each user's interactions
-        train_data, test_data = train_test_split(
-            user_data,
-            train_size=percentage,
-            random_state=seed,
-            shuffle=True
-        )
-        train_splits.append(train_data)
-        test_splits.append(test_data)
+def split_dataset_per_user_train_test(dataframe: pd.DataFrame, user_col: str = 'user_id', percentage: float = 0.5, seed: int = 42) -> (pd.DataFrame, pd.DataFrame):
+    """
+    Splits the dataset per user, distributing a percentage A of each user's interactions
+    into the train set and (1-A) into the test set.
+
+    Args:
+        dataframe (pd.DataFrame): The dataset.
+        user_col (str): The name of the column representing the user IDs.
+        percentage (float): The percentage (A) of each user's interactions for the train split (0 < A < 1).
+        seed (int): Random seed for reproducibility.
 
-    # Concatenate all the user-specific splits into final DataFrames
-    train_split = pd.concat(train_splits).reset_index(drop=True)
-    test_split = pd.concat(test_splits).reset_index(drop=True)
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: Two DataFrames, the first containing A% of each user's interactions (train),
+                                           and the second containing the rest (test).
+    """
+    train_idx, test_idx = split_indices_per_user_train_test(dataframe, user_col=user_col, percentage=percentage,
+                                                            seed=seed)
+    train_split = dataframe.take(train_idx).reset_index(drop=True)
+    test_split = dataframe.take(test_idx).reset_index(drop=True)
 
     return train_split, test_split
 
 
-def split_dataset_per_user(
+def split_indices_per_user(
     dataframe: pd.DataFrame,
     user_col: str = 'user_id',
     train_ratio: float = 0.7,
     val_ratio: float = 0.1,
     test_ratio: float = 0.2,
-    seed: int = 42
-) -> (pd.DataFrame, pd.DataFrame, pd.DataFrame):
+    seed: int = 42,
+    reproduce_splits: bool = False
+) -> (np.ndarray, np.ndarray, np.ndarray):
     """
-    Splits the dataset per user, distributing specified ratios of each user's interactions
-    into the train, validation, and test sets.
+    Row positions of the per-user train, validation and test splits, computed in a single pass over all the rows.
+
+    Every row gets a random key, the rows are ranked within their user by key and assigned to a split by comparing
+    the rank with the ratio thresholds of the user. A user with too few interactions for a ratio gets no row in that
+    split: with a single interaction, the row goes to the test split.
 
     Args:
         dataframe (pd.DataFrame): The dataset.
@@ -219,9 +292,13 @@ def split_dataset_per_user(
         val_ratio (float): The ratio of each user's interactions for the validation split (0 <= val_ratio < 1).
         test_ratio (float): The ratio of each user's interactions for the test split (0 < test_ratio < 1).
         seed (int): Random seed for reproducibility.
+        reproduce_splits (bool): By default a single uniform key is drawn for every row from RandomState(seed). If
+                                 True, the keys come from one permutation per user drawn in user order, a loop over the
+                                 users that reproduces bit for bit the splits of the previous per-user shuffle.
 
     Returns:
-        Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: Three DataFrames containing the train, validation, and test splits.
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The positions (as for DataFrame.take) of the train, validation and
+                                                   test rows.
     """
     # Ensure ratios are valid
     if not (0 < train_ratio < 1) or not (0 <= val_ratio < 1) or not (0 < test_ratio < 1):
@@ -229,38 +306,52 @@ def split_dataset_per_user(
     if abs(train_ratio + val_ratio + test_ratio - 1.0) > 1e-6:
         raise ValueError("Ratios must sum up to 1.")
 
-    # Set a global random seed for reproducibility
-    np.random.seed(seed)
-
-    train_splits = []
-    val_splits = []
-    test_splits = []
+    random_state = np.random.RandomState(seed)
+    user_codes, _ = pd.factorize(dataframe[user_col], sort=True)
+    if reproduce_splits:
+        rows, starts, sizes = _group_rows(user_codes)
+        keys = np.empty(len(user_codes), dtype=np.int64)
+        for start, size in zip(starts, sizes):
+            # user_data.sample(frac=1) draws permutation(size) from the same random state, user after user
+            keys[rows[start + random_state.permutation(size)]] = np.arange(size)
+    else:
+        keys = random_state.random_sample(len(user_codes))
 
-    # Group the dataset by user_id
-    grouped = dataframe.groupby(user_col)
+    order, rank, size = _rank_per_user(user_codes, keys)
+    n_train = (train_ratio * size).astype(np.int64)
+    n_val = (val_ratio * size).astype(np.int64)
 
-    for user_id, user_data in grouped:
-        # Shuffle user_data using the global random state
-        user_data = user_data.sample(frac=1).reset_index(drop=True)
+    return order[rank < n_train], order[(rank >= n_train) & (rank < n_train + n_val)], order[rank >= n_train + n_val]
 
-        n = len(user_data)
-        n_train = int(train_ratio * n)
-        n_val = int(val_ratio * n)
-        n_test = n - n_train - n_val  # Ensure all data is assigned
 
-        # Split the data
-        train_data = user_data.iloc[:n_train]
-        val_data = user_data.iloc[n_train:n_train + n_val]
-        test_data = user_data.iloc[n_train + n_val:]
+def split_dataset_per_user(
+    dataframe: pd.DataFrame,
+    user_col: str = 'user_id',
+    train_ratio: float = 0.7,
+    val_ratio: float = 0.1,
+    test_ratio: float = 0.2,
+    seed: int = 42,
+    reproduce_splits: bool = False
+) -> (pd.DataFrame, pd.DataFrame, pd.DataFrame):
+    """
+    Splits the dataset per user, distributing specified ratios of each user's interactions
+    into the train, validation, and test sets.
 
-        train_splits.append(train_data)
-        val_splits.append(val_data)
-        test_splits.append(test_data)
+    Args:
+        dataframe (pd.DataFrame): The dataset.
+        user_col (str): The name of the column representing the user IDs.
+        train_ratio (float): The ratio of each user's interactions for the train split (0 < train_ratio < 1).
+        val_ratio (float): The ratio of each user's interactions for the validation split (0 <= val_ratio < 1).
+        test_ratio (float): The ratio of each user's interactions for the test split (0 < test_ratio < 1).
+        seed (int): Random seed for reproducibility.
+        reproduce_splits (bool): Reproduce the splits of the previous per-user shuffle, see split_indices_per_user.
 
-    # Concatenate all the user-specific splits into final DataFrames
-    train_split = pd.concat(train_splits).reset_index(drop=True)
-    val_split = pd.concat(val_splits).reset_index(drop=True)
-    test_split = pd.concat(test_splits).reset_index(drop=True)
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: Three DataFrames containing the train, validation, and test splits.
+    """
+    split_indices = split_indices_per_user(dataframe, user_col=user_col, train_ratio=train_ratio, val_ratio=val_ratio,
+                                           test_ratio=test_ratio, seed=seed, reproduce_splits=reproduce_splits)
+    train_split, val_split, test_split = [dataframe.take(idx).reset_index(drop=True) for idx in split_indices]
 
     return train_split, val_split, test_split
 
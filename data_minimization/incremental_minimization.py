@@ -0,0 +1,267 @@
+"""
+Minimized datasets kept up to date while new interactions are appended to the candidate set.
+
+Every strategy ranks the interactions within their user, so appending rows only changes the selection of:
+    - the users of the new rows, for random, most_recent, most_favorite and least_favorite;
+    - also the users holding an item whose statistic changed, for most_rated and highest_variance;
+    - also the users whose selected rows are no longer in the order of the new distances, for most_characteristic.
+Only those users are ranked again, on all their rows, and their selection replaces the previous one. The item
+statistics are updated from the new rows alone: popularity, Welford state of the ratings, first appearance, and the
+terms of the closed form of the distance to the average item (squared norms, dot products with the user counts, user
+counts), which move with every new interaction. The result is identical to minimizing the whole extended candidate set
+from scratch.
+"""
+
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+from typing import Dict, Iterable, Tuple
+
+from data_minimization.item_statistics import ItemStatistics, distance_from_terms, welford_update, welford_variance
+from data_minimization.minimization_strategies import ranking_mapping, take_budget
+
+ROW_COL = '__row__'
+ITEM_STATISTIC_OF_STRATEGY = {'most_rated': 'popularity', 'highest_variance': 'variance',
+                              'most_characteristic': 'distance_to_avg'}
+
+
+class IncrementalMinimization:
+    def __init__(self, df: pd.DataFrame, strategies: Iterable[str], interactions_n: Iterable[int],
+                 user_col_name: str = 'user_id:token', item_col_name: str = 'item_id:token',
+                 rating_col_name: str = 'rating:float', timestamp_col_name: str = 'timestamp:float', seed: int = 42):
+        """
+        Minimize the candidate set with every strategy, keeping the state needed by update().
+
+        Args:
+            df (pd.DataFrame): The candidate interactions.
+            strategies (Iterable[str]): The names of the strategies, as in minimization_strategies.ranking_mapping.
+            interactions_n (Iterable[int]): The numbers of interactions per user to select.
+            user_col_name (str): The name of the user column.
+            item_col_name (str): The name of the item column.
+            rating_col_name (str): The name of the rating column.
+            timestamp_col_name (str): The name of the timestamp column.
+            seed (int): The seed of the random strategy.
+        """
+        self.strategies = list(strategies)
+        self.interactions_n = list(interactions_n)
+        self.columns = dict(user_col_name=user_col_name, item_col_name=item_col_name, rating_col_name=rating_col_name,
+                            timestamp_col_name=timestamp_col_name, seed=seed)
+        self.user_col_name = user_col_name
+        self.item_col_name = item_col_name
+        self.rating_col_name = rating_col_name
+
+        # every row carries its position in the candidate set, its identity in the diffs
+        self.df = df.reset_index(drop=True).assign(**{ROW_COL: np.arange(len(df))})
+        # users coded in order of first appearance, codes never change as users are added
+        self._users = pd.Index(pd.unique(self.df[user_col_name]))
+        self._user_codes = self._users.get_indexer(self.df[user_col_name])
+        items = ItemStatistics.from_frame(self.df, item_col_name=item_col_name).items
+        # running Welford state of the ratings of each item, the variance is updated from the new ratings alone
+        self._nobs, self._mean, self._squared_deviations = (np.zeros(len(items)) for _ in range(3))
+        welford_update(self._nobs, self._mean, self._squared_deviations,
+                       items.get_indexer(self.df[item_col_name]), self.df[rating_col_name].to_numpy(dtype=np.float64))
+        statistics = {'variance': welford_variance(self._nobs, self._squared_deviations)}
+        if 'most_characteristic' in self.strategies:
+            # item x user interaction counts and the terms of distance_to_average, items coded in order of first
+            # appearance, users as self._users
+            self._pair_items = pd.Index(pd.unique(self.df[item_col_name]))
+            self._pairs = sp.csc_matrix((np.ones(len(self.df), dtype=np.int64),
+                                         (self._pair_items.get_indexer(self.df[item_col_name]), self._user_codes)),
+                                        shape=(len(self._pair_items), len(self._users)))
+            self._user_counts = np.bincount(self._user_codes, minlength=len(self._users)).astype(np.int64)
+            self._squared_norms = np.asarray(self._pairs.multiply(self._pairs).sum(axis=1)).ravel().astype(np.int64)
+            self._dots = self._pairs @ self._user_counts
+            statistics['distance_to_avg'] = self._distances(items)
+        self.item_statistics = self._statistics(items, self.df, statistics)
+
+        self.selections = {strategy: self._rank(strategy, self.df, self.item_statistics)
+                           for strategy in self.strategies}
+
+    def _statistics(self, items: pd.Index, df: pd.DataFrame, statistics: dict) -> ItemStatistics:
+        return ItemStatistics(items, item_col_name=self.item_col_name, user_col_name=self.user_col_name,
+                              rating_col_name=self.rating_col_name, df=df, statistics=statistics)
+
+    def _rank(self, strategy: str, df: pd.DataFrame, item_statistics: ItemStatistics) -> Tuple[pd.DataFrame, np.ndarray]:
+        # the ranked rows of df within reach of the largest budget
+        if strategy == 'full':
+            return df, np.zeros(len(df), dtype=np.int64)
+        ordered, rank = ranking_mapping[strategy](df, item_statistics=item_statistics, **self.columns)
+        keep = rank < max(self.interactions_n)
+        return ordered[keep], rank[keep]
+
+    def _distances(self, items: pd.Index) -> np.ndarray:
+        # distance_to_average from the maintained terms, the matrix columns in sorted user order for the tied items
+        user_order = np.argsort(self._users.to_numpy(), kind='stable')
+        distances = distance_from_terms(self._squared_norms, self._dots, self._user_counts[user_order],
+                                        lambda tied: self._pairs[tied][:, user_order].tocsr())
+        ordered = np.empty(len(items))
+        ordered[items.get_indexer(self._pair_items)] = distances
+        return ordered
+
+    def _update_distance_terms(self, delta: pd.DataFrame, delta_user_codes: np.ndarray) -> None:
+        # X' c' - X c = X (c' - c) + (X' - X) c' and ||x + d||² = ||x||² + 2 x·d + ||d||², from the new pairs alone
+        delta_items = pd.unique(delta[self.item_col_name])
+        self._pair_items = self._pair_items.append(pd.Index(delta_items[~pd.Index(delta_items).isin(self._pair_items)]))
+        shape = (len(self._pair_items), len(self._users))
+        delta_pairs = sp.coo_matrix((np.ones(len(delta), dtype=np.int64),
+                                     (self._pair_items.get_indexer(delta[self.item_col_name]), delta_user_codes)),
+                                    shape=shape).tocsc().tocoo()
+        pairs = self._pairs.copy()
+        pairs.resize(shape)
+        delta_counts = np.bincount(delta_user_codes, minlength=shape[1]).astype(np.int64)
+
+        def grown(values: np.ndarray, size: int) -> np.ndarray:
+            return np.concatenate([values, np.zeros(size - len(values), dtype=np.int64)])
+
+        self._user_counts = grown(self._user_counts, shape[1]) + delta_counts
+        users = np.flatnonzero(delta_counts)
+        self._dots = grown(self._dots, shape[0]) + pairs[:, users] @ delta_counts[users] + \
+            delta_pairs.tocsr() @ self._user_counts
+        previous = np.asarray(pairs[delta_pairs.row, delta_pairs.col]).ravel().astype(np.int64)
+        self._squared_norms = grown(self._squared_norms, shape[0])
+        np.add.at(self._squared_norms, delta_pairs.row, 2 * previous * delta_pairs.data + delta_pairs.data ** 2)
+        self._pairs = pairs + delta_pairs.tocsc()
+
+    def _reordered_users(self, ordered: pd.DataFrame, statistics: ItemStatistics, combined: pd.DataFrame,
+                         user_codes: np.ndarray, item_codes: np.ndarray) -> np.ndarray:
+        # most_characteristic ranks the rows of a user by (distance, first appearance of the item, row). A user keeps
+        # its selection if its selected rows are still in increasing key order and none of its other rows has a
+        # smaller key than its last selected one.
+        item_position = np.empty(len(statistics.items), dtype=np.int64)
+        item_position[np.lexsort((statistics.first_appearance, statistics.distance_to_avg))] = \
+            np.arange(len(statistics.items))
+        key = item_position[item_codes] * len(combined) + combined[ROW_COL].to_numpy()
+
+        reordered = np.zeros(len(self._users), dtype=bool)
+        selected_rows = ordered[ROW_COL].to_numpy()
+        selected_users, selected_key = user_codes[selected_rows], key[selected_rows]
+        same_user = selected_users[1:] == selected_users[:-1]
+        reordered[selected_users[1:][same_user & (selected_key[1:] <= selected_key[:-1])]] = True
+
+        # the rows of every user are contiguous in the selection, the last one closes its run
+        last = np.flatnonzero(np.append(~same_user, True))
+        last_key = np.full(len(self._users), np.iinfo(np.int64).max)
+        last_key[selected_users[last]] = selected_key[last]
+        other = np.ones(len(combined), dtype=bool)
+        other[selected_rows] = False
+        smallest_other = np.full(len(self._users), np.iinfo(np.int64).max)
+        np.minimum.at(smallest_other, user_codes[other], key[other])
+        reordered |= smallest_other < last_key
+        return reordered
+
+    def minimized(self, strategy: str, n: int) -> pd.DataFrame:
+        """
+        The current minimized DataFrame of a strategy for n interactions per user, as minimization_strategies.
+        """
+        return take_budget(*self.selections[strategy], n).drop(columns=ROW_COL)
+
+    def _update_statistics(self, delta: pd.DataFrame, combined: pd.DataFrame,
+                           delta_user_codes: np.ndarray) -> ItemStatistics:
+        old = self.item_statistics
+        new_items = pd.Index(pd.unique(delta[self.item_col_name])).difference(old.items)
+        items = old.items.append(new_items).sort_values()
+        previous = items.get_indexer(old.items)
+        delta_codes = items.get_indexer(delta[self.item_col_name])
+
+        def carried(values: np.ndarray, fill) -> np.ndarray:
+            updated = np.full(len(items), fill, dtype=values.dtype)
+            updated[previous] = values
+            return updated
+
+        popularity = carried(old.popularity, 0) + np.bincount(delta_codes, minlength=len(items))
+
+        self._nobs, self._mean, self._squared_deviations = [carried(a, 0.0) for a in
+                                                            (self._nobs, self._mean, self._squared_deviations)]
+        welford_update(self._nobs, self._mean, self._squared_deviations, delta_codes,
+                       delta[self.rating_col_name].to_numpy(dtype=np.float64))
+
+        first_appearance = carried(old.first_appearance, -1)
+        first_appearance[items.get_indexer(pd.unique(delta[self.item_col_name][
+            delta[self.item_col_name].isin(new_items)]))] = np.arange(len(old.items), len(items))
+        statistics = {'popularity': popularity, 'first_appearance': first_appearance,
+                      'variance': welford_variance(self._nobs, self._squared_deviations)}
+        if 'most_characteristic' in self.strategies:
+            self._update_distance_terms(delta, delta_user_codes)
+            statistics['distance_to_avg'] = self._distances(items)
+        return self._statistics(items, combined, statistics)
+
+    def _changed_items(self, strategy: str, statistics: ItemStatistics) -> np.ndarray:
+        # mask of the items whose statistic changed (or appeared), they may move in the ranking of each of their users
+        name = ITEM_STATISTIC_OF_STRATEGY[strategy]
+        previous = statistics.items.get_indexer(self.item_statistics.items)
+        old, current = getattr(self.item_statistics, name), getattr(statistics, name)[previous]
+        changed = np.ones(len(statistics.items), dtype=bool)
+        changed[previous] = (old != current) & ~(np.isnan(old) & np.isnan(current))
+        return changed
+
+    @staticmethod
+    def _diff(before: pd.DataFrame, before_rank: np.ndarray, after: pd.DataFrame, after_rank: np.ndarray,
+              n: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        # rows entering and leaving the first n of each user, marked by their position in the candidate set
+        rows_before, rows_after = before[ROW_COL].to_numpy(), after[ROW_COL].to_numpy()
+        in_before, in_after = before_rank < n, after_rank < n
+        # row positions are a dense range of integers, a lookup table is faster than sorting
+        added = after[in_after & ~np.isin(rows_after, rows_before[in_before], kind='table')]
+        removed = before[in_before & ~np.isin(rows_before, rows_after[in_after], kind='table')]
+        return tuple(frame.set_index(ROW_COL).rename_axis('row') for frame in (added, removed))
+
+    def update(self, delta: pd.DataFrame) -> Dict[Tuple[str, int], Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Append new interactions to the candidate set and update the minimized datasets.
+
+        Args:
+            delta (pd.DataFrame): The new interactions, with the columns of the candidate set.
+
+        Returns:
+            Dict[Tuple[str, int], Tuple[pd.DataFrame, pd.DataFrame]]: For every (strategy, n), the rows added to and
+            removed from its minimized DataFrame, indexed by their position in the candidate set.
+        """
+        delta = delta.reset_index(drop=True).assign(**{ROW_COL: np.arange(len(self.df), len(self.df) + len(delta))})
+        combined = pd.concat([self.df, delta], ignore_index=True)
+        self._users = self._users.append(pd.Index(pd.unique(delta[self.user_col_name])).difference(self._users))
+        delta_user_codes = self._users.get_indexer(delta[self.user_col_name])
+        user_codes = np.concatenate([self._user_codes, delta_user_codes])
+        statistics = self._update_statistics(delta, combined, delta_user_codes)
+        item_codes = None
+
+        diffs = {}
+        for strategy in self.strategies:
+            if strategy == 'full':
+                self.selections[strategy] = self._rank(strategy, combined, statistics)
+                added = delta.set_index(ROW_COL).rename_axis('row')
+                diffs.update({(strategy, n): (added, added.iloc[:0]) for n in self.interactions_n})
+                continue
+
+            affected = np.zeros(len(self._users), dtype=bool)
+            affected[delta_user_codes] = True
+            ordered, rank = self.selections[strategy]
+            if strategy in ITEM_STATISTIC_OF_STRATEGY:
+                if item_codes is None:
+                    item_codes = statistics.codes(combined)
+                if strategy == 'most_characteristic':
+                    # nearly every distance moves, only the users whose order changed are ranked again
+                    affected |= self._reordered_users(ordered, statistics, combined, user_codes, item_codes)
+                else:
+                    affected[user_codes[self._changed_items(strategy, statistics)[item_codes]]] = True
+            if affected.all():
+                selection = self._rank(strategy, combined, statistics)
+                before, after = (ordered, rank), selection
+            else:
+                kept = ~affected[user_codes[ordered[ROW_COL].to_numpy()]]
+                ranked, ranked_rank = self._rank(strategy, combined[affected[user_codes]], statistics)
+                # every strategy orders the users by id, their rows stay contiguous and in rank order
+                merged = pd.concat([ordered[kept], ranked])
+                merged_rank = np.concatenate([rank[kept], ranked_rank])
+                order = np.argsort(merged[self.user_col_name].to_numpy(), kind='stable')
+                selection = merged.take(order), merged_rank[order]
+                # the selection of the other users is unchanged
+                before, after = (ordered[~kept], rank[~kept]), (ranked, ranked_rank)
+
+            for n in self.interactions_n:
+                diffs[(strategy, n)] = self._diff(*before, *after, n)
+            self.selections[strategy] = selection
+
+        self.df = combined
+        self._user_codes = user_codes
+        self.item_statistics = statistics
+        return diffs
@@ -0,0 +1,263 @@
+import os
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+from typing import Callable, Tuple
+
+
+def interaction_matrix(df: pd.DataFrame, item_col_name: str = 'item_id:token',
+                       user_col_name: str = 'user_id:token') -> Tuple[sp.csr_matrix, np.ndarray]:
+    """
+    Build the item x user interaction counts as a CSR matrix, with rows and columns in sorted id order as pd.crosstab.
+
+    Args:
+        df (pd.DataFrame): The interactions.
+        item_col_name (str): The name of the item column.
+        user_col_name (str): The name of the user column.
+
+    Returns:
+        Tuple[sp.csr_matrix, np.ndarray]: The interaction matrix and the matrix row of each interaction of df.
+    """
+    item_codes, items = pd.factorize(df[item_col_name], sort=True)
+    user_codes, users = pd.factorize(df[user_col_name], sort=True)
+    matrix = sp.csr_matrix((np.ones(len(df), dtype=np.int64), (item_codes, user_codes)),
+                           shape=(len(items), len(users)))
+    return matrix, item_codes
+
+
+def distance_to_average(matrix: sp.csr_matrix, chunk_size: int = 1024) -> np.ndarray:
+    """
+    Euclidean distance between each row of the interaction matrix and the average row, without densifying the matrix.
+
+    The squared distance follows the closed form ||x - m||² = ||x||² - 2·x·m + ||m||², where m = c / n_items and c
+    holds the interactions of each user. Scaled by n_items² every term is an integer, so the items are ranked exactly.
+    Items tied on the exact value are evaluated again as ||x - m|| on dense blocks of chunk_size rows, summing in the
+    same order as the previous crosstab implementation, so that its floating point tie breaking is kept.
+
+    Args:
+        matrix (sp.csr_matrix): The item x user interaction matrix.
+        chunk_size (int): The number of tied rows densified at once.
+
+    Returns:
+        np.ndarray: The distance of each item to the average item profile.
+    """
+    user_counts = np.asarray(matrix.sum(axis=0)).ravel()
+    squared_norms = np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()
+    return distance_from_terms(squared_norms, matrix @ user_counts, user_counts, lambda rows: matrix[rows],
+                               chunk_size=chunk_size)
+
+
+def distance_from_terms(squared_norms: np.ndarray, dots: np.ndarray, user_counts: np.ndarray,
+                        tied_rows: Callable[[np.ndarray], sp.csr_matrix], chunk_size: int = 1024) -> np.ndarray:
+    """
+    distance_to_average from the terms of its closed form, for callers that accumulate them without the matrix.
+
+    Args:
+        squared_norms (np.ndarray): The squared norm ||x||² of each item row (int64).
+        dots (np.ndarray): The dot product x·c of each item row with the user counts (int64).
+        user_counts (np.ndarray): The interactions of each user, in the column order of the matrix (int64).
+        tied_rows (Callable): Returns the sparse matrix rows of the given items, only called for the items tied on the
+            exact value.
+        chunk_size (int): The number of tied rows densified at once.
+
+    Returns:
+        np.ndarray: The distance of each item to the average item profile.
+    """
+    n_items = len(squared_norms)
+    if n_items * n_items * int(squared_norms.max(initial=0)) + int(user_counts.sum()) ** 2 < np.iinfo(np.int64).max:
+        scaled = n_items * n_items * squared_norms - 2 * n_items * dots + user_counts @ user_counts
+    else:
+        user_counts = user_counts.astype(np.float64)
+        scaled = n_items * n_items * squared_norms - 2.0 * n_items * dots.astype(np.float64) + \
+            user_counts @ user_counts
+    distances = np.sqrt(scaled) / n_items
+
+    average = user_counts / n_items
+    tied = np.flatnonzero(pd.Series(scaled).duplicated(keep=False).to_numpy())
+    if len(tied):
+        matrix = tied_rows(tied)
+        for start in range(0, len(tied), chunk_size):
+            squared = np.square(matrix[start:start + chunk_size].toarray() - average)
+            # sequential sum over the users, the accumulation order np.linalg.norm(axis=1) used on the full matrix
+            distances[tied[start:start + chunk_size]] = np.sqrt(np.cumsum(squared, axis=1)[:, -1])
+    return distances
+
+
+def welford_update(nobs: np.ndarray, mean: np.ndarray, squared_deviations: np.ndarray, codes: np.ndarray,
+                   values: np.ndarray) -> None:
+    """
+    Add ratings to the running count, mean and sum of squared deviations of each item, in place.
+
+    The ratings are accumulated one at a time in row order per item (Welford), the same accumulation as
+    groupby().var(), so the variances squared_deviations / (nobs - 1) are identical. The k-th ratings of all the items
+    are processed together. NaN ratings are skipped.
+
+    Args:
+        nobs (np.ndarray): The number of ratings of each item.
+        mean (np.ndarray): The mean rating of each item.
+        squared_deviations (np.ndarray): The sum of squared deviations from the mean of each item.
+        codes (np.ndarray): The item code of each rating.
+        values (np.ndarray): The ratings, in row order.
+    """
+    rated = ~np.isnan(values)
+    codes, values = codes[rated], values[rated]
+    if len(codes) == 0:
+        return
+    occurrence = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+    order = np.argsort(occurrence, kind='stable')
+    bounds = np.searchsorted(occurrence[order], np.arange(occurrence.max() + 2))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        rows = order[start:stop]
+        item, value = codes[rows], values[rows]
+        nobs[item] += 1
+        old_mean = mean[item]
+        mean[item] = old_mean + (value - old_mean) / nobs[item]
+        squared_deviations[item] += (value - mean[item]) * (value - old_mean)
+
+
+def welford_variance(nobs: np.ndarray, squared_deviations: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(nobs > 1, squared_deviations / (nobs - 1), np.nan)
+
+
+class ItemStatistics:
+    """
+    Item-level statistics of a candidate set, shared by every strategy and budget that ranks by an item statistic.
+
+    The statistics are aligned arrays indexed by the item code, the position of the item in the sorted item ids.
+    Each one is computed on first access from the candidate set, and the whole store can be saved next to the
+    candidate file, so that later runs load it instead of computing it again.
+
+    Statistics:
+        popularity: number of interactions of the item (most_rated).
+        distinct_users: number of distinct users of the item (most_characteristic_old).
+        variance: sample variance of the ratings of the item, NaN with less than two ratings (highest_variance).
+        distance_to_avg: distance of the item profile to the average item profile (most_characteristic).
+        first_appearance: rank of the item by first appearance in the candidate set, used to break ties.
+    """
+    STATISTICS = ('popularity', 'distinct_users', 'variance', 'distance_to_avg', 'first_appearance')
+
+    def __init__(self, items: pd.Index, item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token',
+                 rating_col_name: str = 'rating:float', df: pd.DataFrame = None, statistics: dict = None):
+        self.items = items
+        self.item_col_name = item_col_name
+        self.user_col_name = user_col_name
+        self.rating_col_name = rating_col_name
+        self._df = df
+        self._statistics = dict(statistics or {})
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token',
+                   rating_col_name: str = 'rating:float', **kwargs) -> 'ItemStatistics':
+        _, items = pd.factorize(df[item_col_name], sort=True)
+        return cls(pd.Index(items), item_col_name=item_col_name, user_col_name=user_col_name,
+                   rating_col_name=rating_col_name, df=df)
+
+    def codes(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        The item code of every interaction of df.
+        """
+        codes = self.items.get_indexer(df[self.item_col_name])
+        if (codes < 0).any():
+            raise ValueError(f" Items of column {self.item_col_name} without statistics.")
+        return codes
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        if name not in ItemStatistics.STATISTICS:
+            raise AttributeError(name)
+        if name not in self._statistics:
+            if self._df is None:
+                raise ValueError(f" Statistic {name} was not stored and the candidate set is not available.")
+            self._statistics[name] = getattr(self, '_compute_' + name)(self._df)
+        return self._statistics[name]
+
+    def _compute_popularity(self, df: pd.DataFrame) -> np.ndarray:
+        return np.bincount(self.codes(df), minlength=len(self.items)).astype(np.int64)
+
+    def _compute_distinct_users(self, df: pd.DataFrame) -> np.ndarray:
+        return df.groupby(self.codes(df))[self.user_col_name].nunique().reindex(
+            range(len(self.items))).to_numpy(dtype=np.int64)
+
+    def _compute_variance(self, df: pd.DataFrame) -> np.ndarray:
+        return df.groupby(self.codes(df))[self.rating_col_name].var().reindex(range(len(self.items))).to_numpy()
+
+    def _compute_distance_to_avg(self, df: pd.DataFrame) -> np.ndarray:
+        matrix, _ = interaction_matrix(df, item_col_name=self.item_col_name, user_col_name=self.user_col_name)
+        return distance_to_average(matrix)
+
+    def _compute_first_appearance(self, df: pd.DataFrame) -> np.ndarray:
+        first_appearance = np.empty(len(self.items), dtype=np.int64)
+        first_appearance[pd.unique(self.codes(df))] = np.arange(len(self.items))
+        return first_appearance
+
+    def compute_all(self) -> 'ItemStatistics':
+        for name in ItemStatistics.STATISTICS:
+            getattr(self, name)
+        self._df = None
+        return self
+
+    @staticmethod
+    def default_path(candidate_path: str) -> str:
+        return os.path.splitext(candidate_path)[0] + '_item_statistics.npz'
+
+    @staticmethod
+    def _signature(candidate_path: str) -> np.ndarray:
+        stat = os.stat(candidate_path)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    def save(self, path: str, candidate_path: str = None) -> str:
+        """
+        Save all the statistics in a npz file, together with the size and modification time of the candidate file.
+        """
+        self.compute_all()
+        signature = self._signature(candidate_path) if candidate_path is not None else np.zeros(2, dtype=np.int64)
+        # string ids as a fixed-width unicode array, the file is loaded without pickle
+        items = self.items.to_numpy()
+        np.savez(path, items=items.astype(str) if items.dtype == object else items, signature=signature,
+                 columns=np.array([self.item_col_name, self.user_col_name, self.rating_col_name]),
+                 **self._statistics)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'ItemStatistics':
+        with np.load(path, allow_pickle=False) as stored:
+            item_col_name, user_col_name, rating_col_name = stored['columns'].tolist()
+            return cls(pd.Index(stored['items']), item_col_name=item_col_name, user_col_name=user_col_name,
+                       rating_col_name=rating_col_name,
+                       statistics={name: stored[name] for name in ItemStatistics.STATISTICS})
+
+    @classmethod
+    def load_or_compute(cls, candidate_path: str, df: pd.DataFrame = None, item_col_name: str = 'item_id:token',
+                        user_col_name: str = 'user_id:token', rating_col_name: str = 'rating:float',
+                        **kwargs) -> 'ItemStatistics':
+        """
+        Load the statistics saved next to the candidate file, or compute and save them if they are missing or were
+        computed on a different version of the file or with different columns.
+
+        Args:
+            candidate_path (str): The path of the candidate tsv file.
+            df (pd.DataFrame): The candidate set, if already loaded.
+            item_col_name (str): The name of the item column.
+            user_col_name (str): The name of the user column.
+            rating_col_name (str): The name of the rating column.
+
+        Returns:
+            ItemStatistics: The statistics of the candidate set.
+        """
+        path = cls.default_path(candidate_path)
+        if os.path.isfile(path):
+            try:
+                with np.load(path, allow_pickle=False) as stored:
+                    up_to_date = (np.array_equal(stored['signature'], cls._signature(candidate_path)) and
+                                  stored['columns'].tolist() == [item_col_name, user_col_name, rating_col_name])
+                if up_to_date:
+                    return cls.load(path)
+            except ValueError:
+                # object arrays saved by an earlier version need pickle, the statistics are computed again
+                pass
+        if df is None:
+            df = pd.read_csv(candidate_path, sep='\t')
+        statistics = cls.from_frame(df, item_col_name=item_col_name, user_col_name=user_col_name,
+                                    rating_col_name=rating_col_name)
+        statistics.save(path, candidate_path=candidate_path)
+        return statistics
@@ -0,0 +1,123 @@
+"""
+Content-addressed cache of the minimized datasets written in dataset/{dataset}/{strategy}/.
+
+Every (strategy, n) dataset is identified by a key, the hash of the candidate file content, the strategy, n, the seed
+and the column names. The files written for it are stored once under dataset/{dataset}/.objects/, named by the hash
+of their content, and hard-linked to their usual paths: identical outputs (e.g. every n of 'full') share one copy.
+dataset/{dataset}/manifest.json records, for every (strategy, n), its key and the content hash of each of its files,
+so that downstream training can tell which datasets actually changed between two runs.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from typing import Dict, List, Optional
+
+# bump when a change to the strategies alters their output, so that the cached datasets are produced again
+CACHE_VERSION = 2
+
+
+def file_digest(path: str, block_size: int = 1 << 20) -> str:
+    """
+    The sha256 hex digest of the content of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class MinimizationCache:
+    def __init__(self, dataset_path: str):
+        """
+        Args:
+            dataset_path (str): The directory of the minimized datasets of one dataset, e.g. ./dataset/ml-1m.
+        """
+        self.dataset_path = dataset_path
+        self.objects_path = os.path.join(dataset_path, '.objects')
+        self.manifest_path = os.path.join(dataset_path, 'manifest.json')
+        self.entries = {}
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(candidate_digest: str, strategy: str, n: int, seed: int = 42, user_col_name: str = 'user_id:token',
+            item_col_name: str = 'item_id:token', rating_col_name: str = 'rating:float',
+            timestamp_col_name: str = 'timestamp:float', **kwargs) -> str:
+        """
+        The cache key of the minimized dataset of a candidate file for a strategy and a budget n.
+        """
+        fields = [CACHE_VERSION, candidate_digest, strategy, n, seed, user_col_name, item_col_name, rating_col_name,
+                  timestamp_col_name]
+        return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+    @staticmethod
+    def _name(strategy: str, n: int) -> str:
+        return f"{strategy}/{n}"
+
+    def lookup(self, strategy: str, n: int, key: str) -> Optional[str]:
+        """
+        The path of the training file of (strategy, n) if it was produced for the same key and is still in place,
+        None otherwise.
+        """
+        entry = self.entries.get(self._name(strategy, n))
+        if entry is None or entry['key'] != key:
+            return None
+        train_path = os.path.join(self.dataset_path, strategy, f"{n}.tsv")
+        for suffix, (digest, size) in entry['files'].items():
+            path = os.path.join(self.dataset_path, strategy, f"{n}{suffix}")
+            if not os.path.isfile(path) or os.path.getsize(path) != size:
+                return None
+        return train_path
+
+    def put(self, written_path: str, path: str) -> List:
+        """
+        Move a freshly written file into the object store and hard-link it to its destination path.
+
+        Args:
+            written_path (str): The file just written, it is consumed.
+            path (str): The destination path.
+
+        Returns:
+            List: The content hash and size of the file, as recorded in the manifest.
+        """
+        os.makedirs(self.objects_path, exist_ok=True)
+        digest = file_digest(written_path)
+        size = os.path.getsize(written_path)
+        object_path = os.path.join(self.objects_path, digest)
+        if os.path.isfile(object_path):
+            os.remove(written_path)
+        else:
+            os.replace(written_path, object_path)
+
+        # link next to the destination and rename, readers never see a partially written file
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        try:
+            os.link(object_path, tmp_path)
+        except OSError:
+            # no hard links on this file system, keep a private copy
+            shutil.copyfile(object_path, tmp_path)
+        os.replace(tmp_path, path)
+        return [digest, size]
+
+    def record(self, strategy: str, n: int, key: str, candidate_digest: str, files: Dict) -> Dict:
+        """
+        Record the files of (strategy, n) in the in-memory manifest, call save() to persist it.
+        """
+        entry = {'key': key, 'candidate': candidate_digest, 'files': files}
+        self.entries[self._name(strategy, n)] = entry
+        return entry
+
+    def update(self, entries: Dict) -> None:
+        self.entries.update(entries)
+
+    def save(self) -> str:
+        os.makedirs(self.dataset_path, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+        return self.manifest_path
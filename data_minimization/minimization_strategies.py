@@ -1,5 +1,59 @@
 import pandas as pd
 import numpy as np
+from typing import Callable, Dict, Iterable, Tuple
+
+from data_minimization.item_statistics import ItemStatistics
+
+
+############## Ranking engine
+# Every strategy below is expressed as a ranking: the candidate DataFrame is ordered once, and each row receives its
+# 0-based position within its user. Selecting n interactions per user is then a slice on `rank < n`, so the
+# selection for n=3 is a prefix of the one for n=7 and a whole budget grid costs a single sort.
+def _rank_within_user(ordered: pd.DataFrame, user_col_name: str) -> np.ndarray:
+    return ordered.groupby(user_col_name, sort=False).cumcount().to_numpy()
+
+
+def _sorted_rank(df: pd.DataFrame, by: list, ascending: list, user_col_name: str) -> Tuple[pd.DataFrame, np.ndarray]:
+    # multi-column sort_values is a stable lexsort, ties keep the original row order
+    ordered = df.sort_values(by=by, ascending=ascending)
+    return ordered, _rank_within_user(ordered, user_col_name)
+
+
+def take_budget(ordered: pd.DataFrame, rank: np.ndarray, n: int) -> pd.DataFrame:
+    """
+    Select the first n ranked interactions of each user.
+
+    Args:
+        ordered (pd.DataFrame): The candidate interactions, as ordered by a `*_rank` function.
+        rank (np.ndarray): The position of each row of `ordered` within its user.
+        n (int): The number of interactions to keep per user.
+
+    Returns:
+        pd.DataFrame: The minimized DataFrame.
+    """
+    return ordered[rank < n].reset_index(drop=True)
+
+
+def multi_budget_min(df: pd.DataFrame, strategy: str, interactions_n: Iterable[int], **kwargs) -> Dict[int, pd.DataFrame]:
+    """
+    Apply a minimization strategy for several budgets at once, ranking the candidate interactions a single time.
+
+    Args:
+        df (pd.DataFrame): The candidate interactions.
+        strategy (str): The name of the strategy, one of the keys of `ranking_mapping`.
+        interactions_n (Iterable[int]): The numbers of interactions per user to select.
+        **kwargs: Column names forwarded to the strategy.
+
+    Returns:
+        Dict[int, pd.DataFrame]: The minimized DataFrame for each n, identical to calling the `*_min` function with that n.
+    """
+    if strategy not in ranking_mapping:
+        raise ValueError(f" Strategy: {strategy} has no ranking function.")
+    if strategy == 'full':
+        return {n: df for n in interactions_n}
+    kwargs.pop('n', None)
+    ordered, rank = ranking_mapping[strategy](df, **kwargs)
+    return {n: take_budget(ordered, rank, n) for n in interactions_n}
 
 
 ############## The following strategies align with those presented in the paper "Operationalizing the Legal Principle of Data Minimization for Personalization", where n represents the number of selected items per user
@@ -9,90 +63,133 @@ def full_min(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
 
 
 # Random minimization
-def random_min(df: pd.DataFrame, n: int, user_col_name: str  = 'user_id:token', **kwargs) -> pd.DataFrame:
-    return df.groupby(user_col_name).apply(lambda x: x.sample(n=min(len(x), n), random_state=42)).reset_index(drop=True)
+def random_rank(df: pd.DataFrame, user_col_name: str = 'user_id:token', seed: int = 42, **kwargs) -> Tuple[pd.DataFrame, np.ndarray]:
+    # x.sample(n=k, random_state=seed) takes the first k entries of RandomState(seed).permutation(len(x)), so the
+    # sampled rows of a user only depend on the size of the user profile: one permutation per distinct size is enough
+    user_codes, _ = pd.factorize(df[user_col_name], sort=True)
+    position = _rank_within_user(df, user_col_name)
+    profile_size = np.bincount(user_codes)[user_codes]
+    rank = np.empty(len(df), dtype=np.int64)
+    for size, rows in pd.Series(profile_size).groupby(profile_size).indices.items():
+        sampled_order = np.argsort(np.random.RandomState(seed).permutation(size))
+        rank[rows] = sampled_order[position[rows]]
+    order = np.lexsort((rank, user_codes))
+    return df.take(order), rank[order]
+
+
+def random_min(df: pd.DataFrame, n: int, user_col_name: str  = 'user_id:token', seed: int = 42, **kwargs) -> pd.DataFrame:
+    return take_budget(*random_rank(df, user_col_name=user_col_name, seed=seed), n)
 
 
 # Most recent minimization
-def most_recent_min(df: pd.DataFrame, n: int, user_col_name: str  = 'user_id:token', timestamp_col_name: str = 'timestamp:float', **kwargs) -> pd.DataFrame:
+def most_recent_rank(df: pd.DataFrame, user_col_name: str = 'user_id:token', timestamp_col_name: str = 'timestamp:float', **kwargs) -> Tuple[pd.DataFrame, np.ndarray]:
     # Assuming the dataset has a 'timestamp' column for ordering by time
     if timestamp_col_name not in df.columns:
         raise ValueError("Most recent minimization requires a 'timestamp' column.")
-    return df.sort_values(by=[user_col_name, timestamp_col_name], ascending=[True, False]).groupby(user_col_name).head(n).reset_index(
-        drop=True)
+    return _sorted_rank(df, [user_col_name, timestamp_col_name], [True, False], user_col_name)
+
+
+def most_recent_min(df: pd.DataFrame, n: int, user_col_name: str  = 'user_id:token', timestamp_col_name: str = 'timestamp:float', **kwargs) -> pd.DataFrame:
+    return take_budget(*most_recent_rank(df, user_col_name=user_col_name, timestamp_col_name=timestamp_col_name), n)
 
 
 # Most favorite minimization
+def most_favorite_rank(df: pd.DataFrame, user_col_name: str = 'user_id:token', rating_col_name: str = 'rating:float', **kwargs) -> Tuple[pd.DataFrame, np.ndarray]:
+    # same order as x.nlargest(columns=rating_col_name): descending rating, ties by first occurrence. When a whole
+    # profile fits in the budget nlargest falls back to an unstable quicksort, here those ties also keep the row order
+    return _sorted_rank(df, [user_col_name, rating_col_name], [True, False], user_col_name)
+
+
 def most_favorite_min(df: pd.DataFrame, n: int, user_col_name: str = 'user_id:token', rating_col_name:str = 'rating:float', **kwargs) -> pd.DataFrame:
-    return df.groupby(user_col_name).apply(lambda x: x.nlargest(n=min(len(x), n), columns=rating_col_name)).reset_index(drop=True)
+    return take_budget(*most_favorite_rank(df, user_col_name=user_col_name, rating_col_name=rating_col_name), n)
 
 
 # Least favorite minimization
+def least_favorite_rank(df: pd.DataFrame, user_col_name: str = 'user_id:token', rating_col_name: str = 'rating:float', **kwargs) -> Tuple[pd.DataFrame, np.ndarray]:
+    # same order as x.nsmallest(columns=rating_col_name): ascending rating, ties by first occurrence
+    return _sorted_rank(df, [user_col_name, rating_col_name], [True, True], user_col_name)
+
+
 def least_favorite_min(df: pd.DataFrame, n: int, user_col_name: str = 'user_id:token', rating_col_name:str = 'rating:float', **kwargs) -> pd.DataFrame:
-    return df.groupby(user_col_name).apply(lambda x: x.nsmallest(n=min(len(x), n), columns=rating_col_name)).reset_index(drop=True)
+    return take_budget(*least_favorite_rank(df, user_col_name=user_col_name, rating_col_name=rating_col_name), n)
+
+
+def _item_statistics(df: pd.DataFrame, item_statistics: ItemStatistics, item_col_name: str, user_col_name: str,
+                     rating_col_name: str = 'rating:float') -> ItemStatistics:
+    if item_statistics is None:
+        item_statistics = ItemStatistics.from_frame(df, item_col_name=item_col_name, user_col_name=user_col_name,
+                                                    rating_col_name=rating_col_name)
+    return item_statistics
 
 
 # Most rated minimization
-def most_rated_min(df: pd.DataFrame, n: int, item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token', **kwargs) -> pd.DataFrame:
-    item_counts = df[item_col_name].value_counts().to_dict()
-    df['item_rating_count'] = df[item_col_name].map(item_counts)
-    minimized = df.sort_values(by=[user_col_name, 'item_rating_count'], ascending=[True, False]).groupby(user_col_name).head(
-        n).reset_index(drop=True)
-    df.drop(columns='item_rating_count', inplace=True)  # Cleanup temporary column
-    return minimized
+def most_rated_rank(df: pd.DataFrame, item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token', item_statistics: ItemStatistics = None, **kwargs) -> Tuple[pd.DataFrame, np.ndarray]:
+    item_statistics = _item_statistics(df, item_statistics, item_col_name, user_col_name)
+    df = df.assign(item_rating_count=item_statistics.popularity[item_statistics.codes(df)])
+    return _sorted_rank(df, [user_col_name, 'item_rating_count'], [True, False], user_col_name)
+
+
+def most_rated_min(df: pd.DataFrame, n: int, item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token', item_statistics: ItemStatistics = None, **kwargs) -> pd.DataFrame:
+    return take_budget(*most_rated_rank(df, item_col_name=item_col_name, user_col_name=user_col_name, item_statistics=item_statistics), n)
 
 
 # Most characteristic minimization
-def most_characteristic_min_old(df: pd.DataFrame, n: int, item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token', **kwargs) -> pd.DataFrame:
+def most_characteristic_rank_old(df: pd.DataFrame, item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token', item_statistics: ItemStatistics = None, **kwargs) -> Tuple[pd.DataFrame, np.ndarray]:
     # Construct a characteristic score based on user-item interactions
-    item_characteristics = df.groupby(item_col_name).apply(lambda x: len(x[user_col_name].unique())).to_dict()
-    df['item_characteristic_score'] = df[item_col_name].map(item_characteristics)
-    minimized = df.sort_values(by=[user_col_name, 'item_characteristic_score'], ascending=[True, False]).groupby(
-        user_col_name).head(n).reset_index(drop=True)
-    df.drop(columns='item_characteristic_score', inplace=True)  # Cleanup temporary column
-    return minimized
+    item_statistics = _item_statistics(df, item_statistics, item_col_name, user_col_name)
+    df = df.assign(item_characteristic_score=item_statistics.distinct_users[item_statistics.codes(df)])
+    return _sorted_rank(df, [user_col_name, 'item_characteristic_score'], [True, False], user_col_name)
 
 
-def most_characteristic_min(df: pd.DataFrame, n: int,
-                            item_col_name: str = 'item_id:token',
-                            user_col_name: str = 'user_id:token',
-                            **kwargs) -> pd.DataFrame:
-    # Step 1: Create a binary user-item interaction matrix
-    user_item_matrix = pd.crosstab(df[item_col_name], df[user_col_name])
+def most_characteristic_min_old(df: pd.DataFrame, n: int, item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token', item_statistics: ItemStatistics = None, **kwargs) -> pd.DataFrame:
+    return take_budget(*most_characteristic_rank_old(df, item_col_name=item_col_name, user_col_name=user_col_name, item_statistics=item_statistics), n)
+
 
-    # Step 2: Compute the system-wide average item profile
-    avg_vector = user_item_matrix.mean(axis=0).to_frame().T
+def most_characteristic_rank(df: pd.DataFrame,
+                             item_col_name: str = 'item_id:token',
+                             user_col_name: str = 'user_id:token',
+                             item_statistics: ItemStatistics = None,
+                             **kwargs) -> Tuple[pd.DataFrame, np.ndarray]:
+    # Step 1: Euclidean distance between each item's vector and the system-wide average item profile
+    item_statistics = _item_statistics(df, item_statistics, item_col_name, user_col_name)
+    item_codes = item_statistics.codes(df)
 
-    # Step 3: Calculate Euclidean distance between each item's binary vector and the average vector
-    item_vectors = user_item_matrix.values  # Binary vectors for all items
-    # avg_vector = avg_vector.values.reshape(-1, 1)  # System-wide average as a column vector
-    distances = np.linalg.norm(item_vectors - avg_vector.to_numpy(), axis=1)
+    # Step 2: Map distances back to the interactions, grouping the rows by item in order of first appearance as the
+    # inner merge with the distance table did, so that equal distances keep being broken in the same way
+    merge_order = np.argsort(item_statistics.first_appearance[item_codes], kind='stable')
+    df = df.take(merge_order).reset_index(drop=True).assign(
+        distance_to_avg=item_statistics.distance_to_avg[item_codes[merge_order]])
 
-    # Step 4: Map distances back to the item IDs
-    item_distance_df = pd.DataFrame({
-        item_col_name: user_item_matrix.index,
-        'distance_to_avg': distances
-    })
+    # Step 3: Sort by user and distance, the rank selects the top `n` items for each user
+    return _sorted_rank(df, [user_col_name, 'distance_to_avg'], [True, True], user_col_name)
 
-    # Step 5: Merge distances with the original DataFrame
-    df = df.merge(item_distance_df, on=item_col_name)
 
-    # Step 6: Sort by user and distance, then select top `n` items for each user
-    minimized = (
-        df.sort_values(by=[user_col_name, 'distance_to_avg'], ascending=[True, True])
-        .groupby(user_col_name)
-        .head(n)
-        .reset_index(drop=True)
-    )
+def most_characteristic_min(df: pd.DataFrame, n: int,
+                            item_col_name: str = 'item_id:token',
+                            user_col_name: str = 'user_id:token',
+                            item_statistics: ItemStatistics = None,
+                            **kwargs) -> pd.DataFrame:
+    return take_budget(*most_characteristic_rank(df, item_col_name=item_col_name, user_col_name=user_col_name, item_statistics=item_statistics), n)
 
-    # Return the minimized DataFrame
-    return minimized
 
 # Highest variance minimization
-def highest_variance_min(df: pd.DataFrame, n: int,item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token', rating_col_name:str = 'rating:float', **kwargs) -> pd.DataFrame:
-    item_variances = df.groupby(item_col_name)[rating_col_name].var().to_dict()
-    df['item_variance'] = df[item_col_name].map(item_variances)
-    minimized = df.sort_values(by=[user_col_name, 'item_variance'], ascending=[True, False]).groupby(user_col_name).head(
-        n).reset_index(drop=True)
-    df.drop(columns='item_variance', inplace=True)  # Cleanup temporary column
-    return minimized
\ No newline at end of file
+def highest_variance_rank(df: pd.DataFrame, item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token', rating_col_name: str = 'rating:float', item_statistics: ItemStatistics = None, **kwargs) -> Tuple[pd.DataFrame, np.ndarray]:
+    item_statistics = _item_statistics(df, item_statistics, item_col_name, user_col_name, rating_col_name)
+    df = df.assign(item_variance=item_statistics.variance[item_statistics.codes(df)])
+    return _sorted_rank(df, [user_col_name, 'item_variance'], [True, False], user_col_name)
+
+
+def highest_variance_min(df: pd.DataFrame, n: int,item_col_name: str = 'item_id:token', user_col_name: str = 'user_id:token', rating_col_name:str = 'rating:float', item_statistics: ItemStatistics = None, **kwargs) -> pd.DataFrame:
+    return take_budget(*highest_variance_rank(df, item_col_name=item_col_name, user_col_name=user_col_name, rating_col_name=rating_col_name, item_statistics=item_statistics), n)
+
+
+ranking_mapping: Dict[str, Callable[..., Tuple[pd.DataFrame, np.ndarray]]] = {
+    'full': None,
+    'random': random_rank,
+    'most_recent': most_recent_rank,
+    'most_favorite': most_favorite_rank,
+    'least_favorite': least_favorite_rank,
+    'most_rated': most_rated_rank,
+    'most_characteristic': most_characteristic_rank,
+    'highest_variance': highest_variance_rank
+}
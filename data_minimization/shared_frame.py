@@ -0,0 +1,90 @@
+"""
+Columnar DataFrame kept in shared memory, so that the candidate set is parsed once and read by every worker process
+of a pool without copying or pickling the rows.
+
+Numeric columns are stored as they are, the other ones as int codes of pd.factorize (sorted, -1 for the missing
+values), whose (small) table of unique values travels with the picklable spec.
+"""
+
+import pandas as pd
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+
+class SharedFrame:
+    def __init__(self, spec: List[Tuple], blocks: List[shared_memory.SharedMemory]):
+        self.spec = spec
+        self._blocks = blocks
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'SharedFrame':
+        """
+        Copy the columns of df into new shared memory blocks.
+
+        Args:
+            df (pd.DataFrame): The DataFrame to share.
+
+        Returns:
+            SharedFrame: The owner of the blocks, call close() and unlink() once the workers are done.
+        """
+        spec, blocks = [], []
+        for column in df.columns:
+            values = df[column].to_numpy()
+            uniques = None
+            if not np.issubdtype(values.dtype, np.number):
+                # sorted uniques: ordering the codes orders the values, the workers sort on the codes
+                values, uniques = pd.factorize(df[column], sort=True)
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+            spec.append((column, block.name, values.dtype.str, len(values), uniques))
+            blocks.append(block)
+        return cls(spec, blocks)
+
+    @classmethod
+    def attach(cls, spec: List[Tuple]) -> 'SharedFrame':
+        """
+        Open the blocks described by the spec of a SharedFrame created in another process.
+        """
+        return cls(spec, [shared_memory.SharedMemory(name=name) for _, name, _, _, _ in spec])
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        The columns as numpy arrays backed by the shared blocks (codes for the factorized columns).
+        """
+        return {column: np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf)
+                for (column, _, dtype, length, _), block in zip(self.spec, self._blocks)}
+
+    def to_frame(self, categorical: bool = False) -> pd.DataFrame:
+        """
+        Rebuild the DataFrame.
+
+        Args:
+            categorical (bool): Keep the factorized columns as pd.Categorical (their codes and the shared uniques)
+                instead of decoding every row. Sorting and grouping them gives the same order as the values, decode()
+                restores the values of the rows that are kept.
+        """
+        columns = {}
+        for (column, _, _, _, uniques), values in zip(self.spec, self.arrays().values()):
+            if uniques is None:
+                columns[column] = values
+            else:
+                # from_codes maps the -1 code of pd.factorize back to a missing value
+                codes = pd.Categorical.from_codes(values, categories=uniques)
+                columns[column] = codes if categorical else np.asarray(codes)
+        return pd.DataFrame(columns)
+
+    def decode(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Decode the factorized columns of a frame built by to_frame(categorical=True), or of a selection of its rows.
+        """
+        factorized = [column for column, _, _, _, uniques in self.spec if uniques is not None and column in df]
+        return df.assign(**{column: np.asarray(df[column].array) for column in factorized})
+
+    def close(self) -> None:
+        for block in self._blocks:
+            block.close()
+
+    def unlink(self) -> None:
+        for block in self._blocks:
+            block.unlink()
@@ -0,0 +1,230 @@
+"""
+Out-of-core counterpart of the strategies in minimization_strategies, for candidate files larger than memory.
+
+The candidate file is read in chunks. The per-user strategies keep, for every user, only the best max(n) rows seen so
+far: each chunk is concatenated with the current selection, the whole is sorted and truncated again with
+groupby().head(), so every chunk costs a sort of the selection plus the chunk. The strategies ranking by an item
+statistic compute it in a first pass over the file and select the rows in a second one. The result is identical to the
+in-memory path, ties included, as every row carries its position in the file as last sort key. Memory scales with
+users x max(n) plus one entry per item; most_characteristic spills the user-item pairs to temporary files and
+aggregates them one partition at a time.
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+from typing import Dict, Iterable, Iterator
+
+from data_minimization.item_statistics import distance_from_terms, welford_update, welford_variance
+from data_minimization.minimization_strategies import take_budget
+
+ROW_COL = '__row__'
+ITEM_CODE_COL = '__item_code__'
+RANK_COL = '__rank__'
+
+
+class _Encoder:
+    """
+    Assigns consecutive integer codes to ids in order of first appearance, across chunks.
+    """
+    def __init__(self):
+        self.index = pd.Index([])
+
+    def encode(self, values: pd.Series) -> np.ndarray:
+        codes = self.index.get_indexer(values)
+        unseen = codes < 0
+        if unseen.any():
+            self.index = self.index.append(pd.Index(pd.unique(values[unseen])))
+            codes[unseen] = self.index.get_indexer(values[unseen])
+        return codes
+
+    def __len__(self):
+        return len(self.index)
+
+
+def _read_chunks(df_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    for chunk in pd.read_csv(df_path, sep='\t', chunksize=chunksize):
+        # read_csv numbers the rows of the chunks continuously, that is the position in the file
+        chunk[ROW_COL] = chunk.index
+        yield chunk
+
+
+def _top_rows_per_user(chunks: Iterable[pd.DataFrame], by: list, ascending: list, user_col_name: str,
+                       n: int) -> pd.DataFrame:
+    selected = None
+    for chunk in chunks:
+        candidates = chunk if selected is None else pd.concat([selected, chunk])
+        selected = candidates.sort_values(by=by + [ROW_COL], ascending=ascending + [True]).groupby(
+            user_col_name, sort=False).head(n)
+    return selected
+
+
+def _bincount_update(counts: np.ndarray, codes: np.ndarray, size: int) -> np.ndarray:
+    updated = np.zeros(size, dtype=np.int64)
+    updated[:len(counts)] = counts
+    updated += np.bincount(codes, minlength=size)
+    return updated
+
+
+def _item_counts(df_path: str, chunksize: int, item_col_name: str) -> pd.Series:
+    items = _Encoder()
+    counts = np.zeros(0, dtype=np.int64)
+    for chunk in _read_chunks(df_path, chunksize):
+        codes = items.encode(chunk[item_col_name])
+        counts = _bincount_update(counts, codes, len(items))
+    return pd.Series(counts, index=items.index)
+
+
+def _item_variances(df_path: str, chunksize: int, item_col_name: str, rating_col_name: str) -> pd.Series:
+    # Welford updates in row order per item, the same accumulation as groupby().var(), so the values are identical
+    items = _Encoder()
+    nobs = np.zeros(0)
+    mean = np.zeros(0)
+    squared_deviations = np.zeros(0)
+    for chunk in _read_chunks(df_path, chunksize):
+        codes = items.encode(chunk[item_col_name])
+        nobs, mean, squared_deviations = [np.concatenate([a, np.zeros(len(items) - len(a))])
+                                          for a in (nobs, mean, squared_deviations)]
+        welford_update(nobs, mean, squared_deviations, codes, chunk[rating_col_name].to_numpy(dtype=np.float64))
+    return pd.Series(welford_variance(nobs, squared_deviations), index=items.index)
+
+
+def _item_distances(df_path: str, chunksize: int, item_col_name: str, user_col_name: str,
+                    chunk_size: int = 1024, partitions: int = 64) -> pd.Series:
+    # The terms of the closed form of distance_to_average are accumulated without the interaction matrix: the user
+    # counts are streamed, the (item, user) keys are spilled to temporary files partitioned by user, and each partition
+    # is aggregated on its own into per-item squared norms and dot products with the user counts. Memory holds one
+    # entry per user and per item plus a single partition.
+    items, users = _Encoder(), _Encoder()
+    user_counts = np.zeros(0, dtype=np.int64)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f'{partition}.bin') for partition in range(partitions)]
+        files = [open(path, 'wb') for path in paths]
+        try:
+            for chunk in _read_chunks(df_path, chunksize):
+                item_codes = items.encode(chunk[item_col_name]).astype(np.int64)
+                user_codes = users.encode(chunk[user_col_name]).astype(np.int64)
+                user_counts = _bincount_update(user_counts, user_codes, len(users))
+                keys = (item_codes << 32) | user_codes
+                order = np.argsort(user_codes % partitions, kind='stable')
+                bounds = np.searchsorted((user_codes % partitions)[order], np.arange(partitions + 1))
+                for partition, file in enumerate(files):
+                    keys[order[bounds[partition]:bounds[partition + 1]]].tofile(file)
+        finally:
+            for file in files:
+                file.close()
+
+        def pairs():
+            # the distinct pairs of a partition and their number of interactions
+            for path in paths:
+                pair_keys, pair_counts = np.unique(np.fromfile(path, dtype=np.int64), return_counts=True)
+                yield pair_keys >> 32, pair_keys & 0xFFFFFFFF, pair_counts.astype(np.int64)
+
+        squared_norms = np.zeros(len(items), dtype=np.int64)
+        dots = np.zeros(len(items), dtype=np.int64)
+        for pair_items, pair_users, pair_counts in pairs():
+            np.add.at(squared_norms, pair_items, pair_counts * pair_counts)
+            np.add.at(dots, pair_items, pair_counts * user_counts[pair_users])
+
+        # the matrix columns are in sorted user order as in interaction_matrix, for the tied items only
+        user_order = np.argsort(users.index.to_numpy(), kind='stable')
+        user_position = np.empty(len(users), dtype=np.int64)
+        user_position[user_order] = np.arange(len(users))
+
+        def tied_rows(tied: np.ndarray) -> sp.csr_matrix:
+            rows, cols, values = [], [], []
+            for pair_items, pair_users, pair_counts in pairs():
+                keep = np.isin(pair_items, tied)
+                rows.append(np.searchsorted(tied, pair_items[keep]))
+                cols.append(user_position[pair_users[keep]])
+                values.append(pair_counts[keep])
+            return sp.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                                 shape=(len(tied), len(users)))
+
+        distances = distance_from_terms(squared_norms, dots, user_counts[user_order], tied_rows, chunk_size=chunk_size)
+    return pd.Series(distances, index=items.index)
+
+
+def _random_selection(df_path: str, chunksize: int, user_col_name: str, n: int, seed: int = 42) -> pd.DataFrame:
+    # first pass: profile sizes, second pass: position of each row in its user and rank in the seeded permutation
+    users = _Encoder()
+    sizes = np.zeros(0, dtype=np.int64)
+    for chunk in _read_chunks(df_path, chunksize):
+        sizes = _bincount_update(sizes, users.encode(chunk[user_col_name]), len(users))
+
+    seen = np.zeros(len(users), dtype=np.int64)
+    sampled_orders = {}
+    selected = []
+    for chunk in _read_chunks(df_path, chunksize):
+        codes = users.encode(chunk[user_col_name])
+        position = seen[codes] + chunk.groupby(user_col_name, sort=False).cumcount().to_numpy()
+        seen += np.bincount(codes, minlength=len(users))
+        profile_size = sizes[codes]
+        rank = np.empty(len(chunk), dtype=np.int64)
+        for size, rows in pd.Series(profile_size).groupby(profile_size).indices.items():
+            if size not in sampled_orders:
+                sampled_orders[size] = np.argsort(np.random.RandomState(seed).permutation(size))
+            rank[rows] = sampled_orders[size][position[rows]]
+        keep = rank < n
+        selected.append(chunk[keep].assign(**{RANK_COL: rank[keep]}))
+    return pd.concat(selected).sort_values(by=[user_col_name, RANK_COL])
+
+
+def streaming_multi_budget_min(df_path: str, strategy: str, interactions_n: Iterable[int], chunksize: int = 1000000,
+                               user_col_name: str = 'user_id:token', item_col_name: str = 'item_id:token',
+                               rating_col_name: str = 'rating:float', timestamp_col_name: str = 'timestamp:float',
+                               **kwargs) -> Dict[int, pd.DataFrame]:
+    """
+    Apply a minimization strategy for several budgets, reading the candidate file in chunks.
+
+    Args:
+        df_path (str): The path of the candidate tsv file.
+        strategy (str): The name of the strategy, as in minimization_strategies.ranking_mapping ('full' excluded).
+        interactions_n (Iterable[int]): The numbers of interactions per user to select.
+        chunksize (int): The number of rows read at once.
+        user_col_name (str): The name of the user column.
+        item_col_name (str): The name of the item column.
+        rating_col_name (str): The name of the rating column.
+        timestamp_col_name (str): The name of the timestamp column.
+
+    Returns:
+        Dict[int, pd.DataFrame]: The minimized DataFrame for each n, identical to minimization_strategies.multi_budget_min.
+    """
+    interactions_n = list(interactions_n)
+    max_n = max(interactions_n)
+    chunks = _read_chunks(df_path, chunksize)
+
+    if strategy == 'random':
+        selected = _random_selection(df_path, chunksize, user_col_name, max_n)
+    elif strategy == 'most_recent':
+        selected = _top_rows_per_user(chunks, [user_col_name, timestamp_col_name], [True, False], user_col_name, max_n)
+    elif strategy == 'most_favorite':
+        selected = _top_rows_per_user(chunks, [user_col_name, rating_col_name], [True, False], user_col_name, max_n)
+    elif strategy == 'least_favorite':
+        selected = _top_rows_per_user(chunks, [user_col_name, rating_col_name], [True, True], user_col_name, max_n)
+    elif strategy == 'most_rated':
+        item_counts = _item_counts(df_path, chunksize, item_col_name)
+        scored = (chunk.assign(item_rating_count=chunk[item_col_name].map(item_counts)) for chunk in chunks)
+        selected = _top_rows_per_user(scored, [user_col_name, 'item_rating_count'], [True, False], user_col_name, max_n)
+    elif strategy == 'highest_variance':
+        item_variances = _item_variances(df_path, chunksize, item_col_name, rating_col_name)
+        scored = (chunk.assign(item_variance=chunk[item_col_name].map(item_variances)) for chunk in chunks)
+        selected = _top_rows_per_user(scored, [user_col_name, 'item_variance'], [True, False], user_col_name, max_n)
+    elif strategy == 'most_characteristic':
+        item_distances = _item_distances(df_path, chunksize, item_col_name, user_col_name)
+        # equal distances are broken by first appearance of the item, then by row, as in most_characteristic_rank
+        item_codes = pd.Series(np.arange(len(item_distances)), index=item_distances.index)
+        scored = (chunk.assign(distance_to_avg=chunk[item_col_name].map(item_distances),
+                               **{ITEM_CODE_COL: chunk[item_col_name].map(item_codes)}) for chunk in chunks)
+        selected = _top_rows_per_user(scored, [user_col_name, 'distance_to_avg', ITEM_CODE_COL], [True, True, True],
+                                      user_col_name, max_n)
+        selected = selected.drop(columns=ITEM_CODE_COL)
+    else:
+        raise ValueError(f" Strategy: {strategy} can not be applied in streaming mode.")
+
+    selected = selected.drop(columns=[c for c in (ROW_COL, RANK_COL) if c in selected.columns])
+    rank = selected.groupby(user_col_name, sort=False).cumcount().to_numpy()
+    return {n: take_budget(selected, rank, n) for n in interactions_n}
@@ -0,0 +1,86 @@
+"""
+Seeded synthetic interaction sets, shaped like the candidate sets of the minimization pipeline, to measure how the
+strategies and the splitters scale with the number of users, items and interactions.
+"""
+
+import pandas as pd
+import numpy as np
+
+
+def power_law_sizes(n_users: int, n_interactions: int, exponent: float = 1.5, min_size: int = 1,
+                    rng: np.random.RandomState = None) -> np.ndarray:
+    """
+    Draw the number of interactions of each user from a power law, rescaled to sum exactly to n_interactions.
+
+    Args:
+        n_users (int): The number of users.
+        n_interactions (int): The total number of interactions.
+        exponent (float): The tail exponent of the profile sizes, lower values give heavier tails.
+        min_size (int): The minimum number of interactions of a user.
+        rng (np.random.RandomState): The random generator.
+
+    Returns:
+        np.ndarray: The number of interactions of each user.
+    """
+    if n_users * min_size > n_interactions:
+        raise ValueError(f" {n_users} users with at least {min_size} interactions need more than {n_interactions}.")
+    rng = rng if rng is not None else np.random.RandomState(42)
+    weights = rng.pareto(exponent, n_users) + 1
+    extra = n_interactions - n_users * min_size
+    sizes = np.floor(weights / weights.sum() * extra).astype(np.int64)
+    # the interactions lost by the rounding go to the users with the largest remainders
+    remainders = weights / weights.sum() * extra - sizes
+    sizes[np.argsort(-remainders, kind='stable')[:extra - sizes.sum()]] += 1
+    return sizes + min_size
+
+
+def generate_interactions(n_interactions: int, n_users: int = None, n_items: int = None, user_exponent: float = 1.5,
+                          item_exponent: float = 1.0, min_interactions: int = 1, ratings: bool = True,
+                          timestamps: bool = True, seed: int = 42, user_col_name: str = 'user_id:token',
+                          item_col_name: str = 'item_id:token', rating_col_name: str = 'rating:float',
+                          timestamp_col_name: str = 'timestamp:float') -> pd.DataFrame:
+    """
+    Generate a synthetic interaction set.
+
+    The profile sizes follow a power law (power_law_sizes) and the items are drawn with Zipf popularity, the
+    probability of the item of popularity rank r being proportional to r ** -item_exponent. The same (user, item) pair
+    may occur more than once. Ratings are integers in 1..5 skewed towards the high values, as in MovieLens, and the
+    timestamps are seconds within three years of a random start for each user.
+
+    Args:
+        n_interactions (int): The number of interactions.
+        n_users (int): The number of users, by default one every 50 interactions.
+        n_items (int): The number of items, by default one every 25 interactions.
+        user_exponent (float): The tail exponent of the profile sizes.
+        item_exponent (float): The exponent of the Zipf item popularity.
+        min_interactions (int): The minimum number of interactions of a user.
+        ratings (bool): Whether to generate the rating column.
+        timestamps (bool): Whether to generate the timestamp column.
+        seed (int): The seed of the generator, the same arguments always give the same interactions.
+        user_col_name (str): The name of the user column.
+        item_col_name (str): The name of the item column.
+        rating_col_name (str): The name of the rating column.
+        timestamp_col_name (str): The name of the timestamp column.
+
+    Returns:
+        pd.DataFrame: The interactions, grouped by user, with int64 columns as read from a tsv file.
+    """
+    n_users = n_users if n_users is not None else max(1, n_interactions // 50)
+    n_items = n_items if n_items is not None else max(1, n_interactions // 25)
+    rng = np.random.RandomState(seed)
+
+    sizes = power_law_sizes(n_users, n_interactions, exponent=user_exponent, min_size=min_interactions, rng=rng)
+    # shuffled ids, so that neither users nor items are sorted by activity
+    user_ids = rng.permutation(n_users).astype(np.int64) + 1
+    item_ids = rng.permutation(n_items).astype(np.int64) + 1
+    popularity = np.arange(1, n_items + 1, dtype=np.float64) ** -item_exponent
+
+    columns = {user_col_name: np.repeat(user_ids, sizes),
+               item_col_name: item_ids[rng.choice(n_items, size=n_interactions, p=popularity / popularity.sum())]}
+    if ratings:
+        columns[rating_col_name] = rng.choice(np.arange(1, 6, dtype=np.int64), size=n_interactions,
+                                              p=[0.06, 0.11, 0.26, 0.35, 0.22])
+    if timestamps:
+        starts = rng.randint(946684800, 1577836800, size=n_users).astype(np.int64)
+        columns[timestamp_col_name] = np.repeat(starts, sizes) + rng.randint(0, 3 * 365 * 86400, size=n_interactions)
+    return pd.DataFrame(columns)
@@ -0,0 +1,256 @@
+"""
+Module description:
+Sparse users x items mask of the items that can be recommended to each user.
+
+"""
+
+__version__ = '0.3.1'
+__author__ = 'Vito Walter Anelli, Claudio Pomo'
+__email__ = 'vitowalter.anelli@poliba.it, claudio.pomo@poliba.it'
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class CandidateMask:
+    """
+    Boolean users x items mask backed by a sparse matrix instead of a dense array.
+
+    An exclusion mask (exclude=True, built from the training matrix) is True everywhere but at the stored positions,
+    the items already seen by each user; an inclusion mask (exclude=False, the negative sampling candidates) is True
+    only at the stored positions. Memory grows with the stored positions, not with users x items.
+
+    batch() slices a block of users and apply() masks a block of scores (numpy, torch or tensorflow) by scattering
+    -inf at the excluded positions only. Indexing keeps the dense array semantics for the per-user recommenders:
+    mask[u] is the dense row of user u, mask[u, i] a single entry and mask[start:stop] a dense block.
+    """
+
+    def __init__(self, matrix, exclude=True):
+        self.matrix = sp.csr_matrix(matrix, dtype=bool)
+        # in place only when needed, the indices may be read-only (memory mapped from a DataSet snapshot)
+        if not self.matrix.data.all():
+            self.matrix.eliminate_zeros()
+        self.matrix.sort_indices()
+        self.exclude = exclude
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def dtype(self):
+        return np.dtype(bool)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def batch(self, start, stop):
+        """
+        The mask of the users in [start, stop), still sparse
+        """
+        return CandidateMask(self.matrix[start:stop], exclude=self.exclude)
+
+    def toarray(self):
+        dense = self.matrix.toarray()
+        return ~dense if self.exclude else dense
+
+    def __array__(self, dtype=None):
+        dense = self.toarray()
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.matrix.shape[0])
+            if step == 1:
+                return self.batch(start, stop).toarray()
+        elif isinstance(key, (int, np.integer)):
+            row = np.zeros(self.matrix.shape[1], dtype=bool)
+            row[self.matrix.indices[self.matrix.indptr[key]:self.matrix.indptr[key + 1]]] = True
+            return ~row if self.exclude else row
+        elif isinstance(key, tuple) and len(key) == 2 and all(isinstance(k, (int, np.integer)) for k in key):
+            row = self.matrix.indices[self.matrix.indptr[key[0]]:self.matrix.indptr[key[0] + 1]]
+            position = np.searchsorted(row, key[1])
+            found = position < len(row) and row[position] == key[1]
+            return bool(found != self.exclude)
+        return self.toarray()[key]
+
+    def contains(self, rows, cols):
+        """
+        Whether the mask is True at each (row, col) position
+        """
+        rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+        n_cols = self.matrix.shape[1]
+        # the stored positions in row-major order are sorted, as the rows of the csr and their indices
+        rows_of_stored = np.repeat(np.arange(self.matrix.shape[0], dtype=np.int64), np.diff(self.matrix.indptr))
+        stored = rows_of_stored * n_cols + self.matrix.indices
+        keys = rows * n_cols + cols
+        found = np.zeros(len(keys), dtype=bool)
+        if len(stored):
+            found = stored[np.minimum(np.searchsorted(stored, keys), len(stored) - 1)] == keys
+        return ~found if self.exclude else found
+
+    def nonzero(self):
+        if not self.exclude:
+            return self.matrix.nonzero()
+        return self.toarray().nonzero()
+
+    def apply(self, scores):
+        """
+        Mask a block of scores of the same shape: the excluded positions are set to -inf, on a copy.
+        :param scores: numpy array, torch tensor or tensorflow tensor
+        :return: the masked scores, of the same type, dtype and device
+        """
+        rows, cols = self.matrix.nonzero()
+        module = type(scores).__module__.split('.')[0]
+        if module == 'torch':
+            import torch
+            rows = torch.as_tensor(rows, dtype=torch.long, device=scores.device)
+            cols = torch.as_tensor(cols, dtype=torch.long, device=scores.device)
+            if self.exclude:
+                masked = scores.clone()
+                masked[rows, cols] = -np.inf
+            else:
+                masked = torch.full_like(scores, -np.inf)
+                masked[rows, cols] = scores[rows, cols]
+            return masked
+        if module == 'tensorflow':
+            import tensorflow as tf
+            indices = tf.constant(np.stack([rows, cols], axis=1).reshape(-1, 2), dtype=tf.int64)
+            if self.exclude:
+                return tf.tensor_scatter_nd_update(scores, indices,
+                                                   tf.fill([len(rows)], tf.constant(-np.inf, scores.dtype)))
+            return tf.tensor_scatter_nd_update(tf.fill(tf.shape(scores), tf.constant(-np.inf, scores.dtype)), indices,
+                                               tf.gather_nd(scores, indices))
+        scores = np.asarray(scores)
+        if self.exclude:
+            masked = scores.copy()
+            masked[rows, cols] = -np.inf
+        else:
+            masked = np.full_like(scores, -np.inf)
+            masked[rows, cols] = scores[rows, cols]
+        return masked
+
+    def stored_positions(self):
+        """
+        The rows and columns of the stored positions, row by row, without the scan of nonzero()
+        """
+        rows = np.repeat(np.arange(self.matrix.shape[0], dtype=np.int64), np.diff(self.matrix.indptr))
+        return rows, self.matrix.indices.astype(np.int64)
+
+    def apply_(self, scores):
+        """
+        Mask a block of scores in place: the excluded positions are set to -inf. Only the stored positions are
+        written, and read for an inclusion mask.
+        :param scores: writable numpy array or torch tensor
+        :return: scores
+        """
+        rows, cols = self.stored_positions()
+        if type(scores).__module__.split('.')[0] == 'torch':
+            import torch
+            positions = (torch.from_numpy(rows).to(scores.device), torch.from_numpy(cols).to(scores.device))
+            if self.exclude:
+                scores.index_put_(positions, torch.tensor(-np.inf, dtype=scores.dtype, device=scores.device))
+            else:
+                kept = scores[positions]
+                scores.fill_(-np.inf)
+                scores.index_put_(positions, kept)
+            return scores
+        if self.exclude:
+            scores[rows, cols] = -np.inf
+        else:
+            kept = scores[rows, cols]
+            scores.fill(-np.inf)
+            scores[rows, cols] = kept
+        return scores
+
+    def top_k_candidates(self, candidate_scores, k):
+        """
+        The k best candidates of each row of an inclusion mask, from the scores of its stored positions only: the
+        caller scores the candidates (e.g. the ~100 items of negative sampling) instead of the whole catalog. Rows with
+        less than k candidates are completed with -inf scores on items out of the mask, as top_k does.
+        :param candidate_scores: numpy array of the scores of the stored positions, in the order of stored_positions()
+        :param k: number of candidates, at most the number of items
+        :return: the scores (float32) and the items (int32) numpy arrays, rows sorted by decreasing score
+        """
+        if self.exclude:
+            raise ValueError("The candidates of an exclusion mask are not stored, use top_k")
+        candidate_scores = np.asarray(candidate_scores)
+        n_rows, n_items = self.matrix.shape
+        k = min(k, n_items)
+        rows, cols = self.stored_positions()
+        counts = np.diff(self.matrix.indptr)
+        width = max(k, int(counts.max(initial=0)))
+
+        # one row of width slots per user: its candidates first, then the first items out of its row
+        values = np.full((n_rows, width), -np.inf, dtype=candidate_scores.dtype)
+        items = np.empty((n_rows, width), dtype=np.int64)
+        positions = np.arange(len(cols), dtype=np.int64) - self.matrix.indptr[rows]
+        values[rows, positions] = candidate_scores
+        items[rows, positions] = cols
+        padding = np.arange(width) >= counts[:, None]
+        padded_rows, padded_positions = np.nonzero(padding)
+        items[padding] = self._unstored_columns(padded_rows, padded_positions - counts[padded_rows])
+
+        candidates = np.argpartition(-values, k - 1, axis=1)[:, :k] if k < width \
+            else np.broadcast_to(np.arange(width), values.shape)
+        candidate_values = np.take_along_axis(values, candidates, axis=1)
+        order = np.argsort(-candidate_values, axis=1, kind='stable')
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        return (np.take_along_axis(candidate_values, order, axis=1).astype(np.float32),
+                np.take_along_axis(items, candidates, axis=1).astype(np.int32))
+
+    def _unstored_columns(self, rows, ranks):
+        # the column of rank r among the columns not stored in its row is r + (number of stored columns c_j with
+        # c_j - j <= r), c_j sorted: counted for all the rows at once with keys offset by row
+        n_cols = self.matrix.shape[1]
+        stored_rows, stored_cols = self.stored_positions()
+        skipped = np.arange(len(stored_cols), dtype=np.int64) - self.matrix.indptr[stored_rows]
+        keys = stored_rows * (n_cols + 1) + stored_cols - skipped
+        rows, ranks = np.asarray(rows, dtype=np.int64), np.asarray(ranks, dtype=np.int64)
+        return ranks + np.searchsorted(keys, rows * (n_cols + 1) + ranks, side='right') - self.matrix.indptr[rows]
+
+    def top_k(self, scores, k, buffers=None):
+        """
+        The k best candidates of each row of a block of scores. The scores are copied into a buffer and masked there
+        in place, the caller's block is left untouched: it may be ranked again with another mask (validation, then
+        test) or share memory with the model outputs.
+        :param scores: numpy array or torch tensor of the scores of the users of the mask
+        :param k: number of candidates, at most the number of items
+        :param buffers: dict kept by the caller, the copy of the scores and the outputs of torch.topk are reused from
+        a call to the next
+        :return: the scores (float32) and the items (int32) numpy arrays, rows sorted by decreasing score
+        """
+        buffers = {} if buffers is None else buffers
+        k = min(k, scores.shape[1])
+        if type(scores).__module__.split('.')[0] != 'torch':
+            scores = np.asarray(scores)
+            block = buffers.get(('scores', scores.dtype))
+            if block is None or block.shape != scores.shape:
+                block = buffers[('scores', scores.dtype)] = np.empty_like(scores)
+            np.copyto(block, scores)
+            self.apply_(block)
+            candidates = np.argpartition(-block, k - 1, axis=1)[:, :k] if k < block.shape[1] \
+                else np.broadcast_to(np.arange(block.shape[1]), block.shape)
+            values = np.take_along_axis(block, candidates, axis=1)
+            order = np.argsort(-values, axis=1, kind='stable')
+            return (np.take_along_axis(values, order, axis=1).astype(np.float32),
+                    np.take_along_axis(candidates, order, axis=1).astype(np.int32))
+
+        import torch
+        with torch.no_grad():
+            key = (scores.device, scores.dtype)
+            if key not in buffers:
+                buffers[key] = (torch.empty(0, dtype=scores.dtype, device=scores.device),
+                                torch.empty(0, dtype=scores.dtype, device=scores.device),
+                                torch.empty(0, dtype=torch.long, device=scores.device))
+            block, values, indices = buffers[key]
+            # resize_ keeps the storage of a larger previous block
+            block.resize_(scores.shape).copy_(scores.detach())
+            self.apply_(block)
+            torch.topk(block, k=k, sorted=True, out=(values, indices))
+        # copies, the buffers are overwritten by the next call
+        return values.cpu().numpy().astype(np.float32), indices.cpu().numpy().astype(np.int32)
@@ -8,7 +8,11 @@ __author__ = 'Vito Walter Anelli, Claudio Pomo'
 __email__ = 'vitowalter.anelli@poliba.it, claudio.pomo@poliba.it'
 
 import copy
+import hashlib
+import json
 import os
+import shutil
+from functools import cached_property
 from types import SimpleNamespace
 
 import numpy as np
@@ -18,13 +22,20 @@ import typing as t
 import logging as pylog
 
 from elliot.dataset.abstract_dataset import AbstractDataset
+from elliot.dataset import dataset_cache
+from elliot.dataset.candidate_mask import CandidateMask
 from elliot.splitter.base_splitter import Splitter
 from elliot.prefiltering.standard_prefilters import PreFilter
 from elliot.negative_sampling.negative_sampling import NegativeSampler
 from elliot.utils import logging
+from elliot.utils.read import read_split_npz
+from elliot.utils.write import save_split_npz
 
 from elliot.dataset.modular_loaders.loader_coordinator_mixin import LoaderCoordinator
 
+# layout of the DataSet snapshots written by DataSet.save_snapshot
+SNAPSHOT_VERSION = 1
+
 
 class DataSetLoader(LoaderCoordinator):
     """
@@ -50,8 +61,9 @@ class DataSetLoader(LoaderCoordinator):
             path_val_data = getattr(config.data_config, "validation_path", None)
             path_test_data = config.data_config.test_path
 
-            self.train_dataframe = pd.read_csv(path_train_data, sep="\t", header=None, names=self.column_names)
-            self.test_dataframe = pd.read_csv(path_test_data, sep="\t", header=None, names=self.column_names)
+            # parsed once per process, the same splits are loaded by every experiment of a grid
+            self.train_dataframe = dataset_cache.read_split(path_train_data, self.read_tsv_split)
+            self.test_dataframe = dataset_cache.read_split(path_test_data, self.read_tsv_split)
 
             # self.train_dataframe, self.side_information = self.coordinate_information(self.train_dataframe, sides=config.data_config.side_information)
             # self.train_dataframe = pd.read_csv(path_train_data, sep="\t", header=None, names=self.column_names)
@@ -66,7 +78,7 @@ class DataSetLoader(LoaderCoordinator):
                 self.train_dataframe["rating"] = 1
 
             if path_val_data:
-                self.validation_dataframe = pd.read_csv(path_val_data, sep="\t", header=None, names=self.column_names)
+                self.validation_dataframe = dataset_cache.read_split(path_val_data, self.read_tsv_split)
                 self.validation_dataframe = self.check_timestamp(self.validation_dataframe)
 
                 if config.binarize == True or all(self.train_dataframe["rating"].isna()):
@@ -82,6 +94,34 @@ class DataSetLoader(LoaderCoordinator):
                                                                                      sides=config.data_config.side_information,
                                                                                      logger=self.logger)
 
+        elif config.data_config.strategy == "binary":
+            # as "fixed", with the splits stored as npz (see save_split_npz) instead of headerless tsv
+            path_train_data = config.data_config.train_path
+            path_val_data = getattr(config.data_config, "validation_path", None)
+            path_test_data = config.data_config.test_path
+
+            self.train_dataframe = self.read_binary_split(path_train_data)
+            self.test_dataframe = self.read_binary_split(path_test_data)
+
+            self.logger.info(f"{path_train_data} - Loaded")
+
+            if config.binarize == True or all(self.train_dataframe["rating"].isna()):
+                self.test_dataframe["rating"] = 1
+                self.train_dataframe["rating"] = 1
+
+            if path_val_data:
+                self.validation_dataframe = self.read_binary_split(path_val_data)
+
+                if config.binarize == True or all(self.train_dataframe["rating"].isna()):
+                    self.validation_dataframe["rating"] = 1
+
+                self.tuple_list = [([(self.train_dataframe, self.validation_dataframe)], self.test_dataframe)]
+            else:
+                self.tuple_list = [(self.train_dataframe, self.test_dataframe)]
+            self.tuple_list, self.side_information = self.coordinate_information(self.tuple_list,
+                                                                                 sides=config.data_config.side_information,
+                                                                                 logger=self.logger)
+
         elif config.data_config.strategy == "hierarchy":
             self.tuple_list = self.read_splitting(config.data_config.root_folder, column_names=self.column_names)
 
@@ -125,6 +165,28 @@ class DataSetLoader(LoaderCoordinator):
             d = d.drop(columns=["timestamp"]).reset_index(drop=True)
         return d
 
+    def read_tsv_split(self, path):
+        return pd.read_csv(path, sep="\t", header=None, names=self.column_names)
+
+    def read_binary_split(self, path):
+        """
+        Load a split stored as npz. When the npz does not exist yet, the headerless tsv with the same name is
+        parsed once and converted, so that the next experiments on the same split load the npz.
+        """
+        if not os.path.isfile(path):
+            tsv_path = os.path.splitext(path)[0] + ".tsv"
+            dataframe = pd.read_csv(tsv_path, sep="\t", header=None, names=self.column_names)
+            dataframe = self.check_timestamp(dataframe)
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            save_split_npz(dataframe, tmp_path)
+            os.replace(tmp_path, path)
+            self.logger.info(f"{tsv_path} - Converted to {path}")
+        # parsed once per process, as the tsv splits of "fixed"
+        return dataset_cache.read_split(path, self.read_npz_split)
+
+    def read_npz_split(self, path):
+        return read_split_npz(path, column_names=self.column_names[:3])
+
     def read_splitting(self, folder_path, column_names):
         tuple_list = []
         for dirs in os.listdir(folder_path):
@@ -204,101 +266,297 @@ class DataSet(AbstractDataset):
         else:
             self.side_information = side_information_data
 
-        self.train_dict = self.dataframe_to_dict(data_tuple[0])
+        self._train_interactions = self.group_interactions(data_tuple[0])
+        users, indptr, items, _ = self._train_interactions
 
-        self.users = list(self.train_dict.keys())
-        self.items = list({k for a in self.train_dict.values() for k in a.keys()})
+        self.users = users.tolist()
+        # the private ids of the items follow the iteration order of the set of items, as when they were collected
+        # from the keys of train_dict: the first appearances, in user order, are inserted in the same sequence
+        self.items = list(set(pd.unique(items).tolist()))
         self.num_users = len(self.users)
         self.num_items = len(self.items)
-        self.transactions = sum(len(v) for v in self.train_dict.values())
+        self.transactions = len(items)
 
         sparsity = 1 - (self.transactions / (self.num_users * self.num_items))
         self.logger.info(
             f"Statistics\tUsers:\t{self.num_users}\tItems:\t{self.num_items}\tTransactions:\t{self.transactions}\t"
             f"Sparsity:\t{sparsity}")
 
-        self.private_users = {p: u for p, u in enumerate(self.users)}
-        self.public_users = {v: k for k, v in self.private_users.items()}
-        self.private_items = {p: i for p, i in enumerate(self.items)}
-        self.public_items = {v: k for k, v in self.private_items.items()}
-
-        self.i_train_dict = {self.public_users[user]: {self.public_items[i]: v for i, v in items.items()}
-                             for user, items in self.train_dict.items()}
+        self._train_item_codes = pd.Index(self.items).get_indexer(items)
 
         self.sp_i_train = self.build_sparse()
         self.sp_i_train_ratings = self.build_sparse_ratings()
 
+        self._test_interactions = self.group_interactions(data_tuple[-1])
+        self._val_interactions = self.group_interactions(data_tuple[1]) if len(data_tuple) == 3 else None
+
         if len(data_tuple) == 2:
-            self.test_dict = self.build_dict(data_tuple[1], self.users)
             if hasattr(config, "negative_sampling"):
                 val_neg_samples, test_neg_samples = NegativeSampler.sample(config, self.public_users, self.public_items,
                                                                            self.private_users, self.private_items,
                                                                            self.sp_i_train, None, self.test_dict)
-                sp_i_test = self.to_bool_sparse(self.test_dict)
+                sp_i_test = self.interactions_to_bool_sparse(self._test_interactions)
                 test_candidate_items = test_neg_samples + sp_i_test
-                self.test_mask = np.where((test_candidate_items.toarray() == True), True, False)
+                self.test_mask = CandidateMask(test_candidate_items, exclude=False)
         else:
-            self.val_dict = self.build_dict(data_tuple[1], self.users)
-            self.test_dict = self.build_dict(data_tuple[2], self.users)
             if hasattr(config, "negative_sampling"):
                 val_neg_samples, test_neg_samples = NegativeSampler.sample(config, self.public_users, self.public_items,
                                                                            self.private_users, self.private_items,
                                                                            self.sp_i_train, self.val_dict,
                                                                            self.test_dict)
-                sp_i_val = self.to_bool_sparse(self.val_dict)
-                sp_i_test = self.to_bool_sparse(self.test_dict)
+                sp_i_val = self.interactions_to_bool_sparse(self._val_interactions)
+                sp_i_test = self.interactions_to_bool_sparse(self._test_interactions)
                 val_candidate_items = val_neg_samples + sp_i_val
-                self.val_mask = np.where((val_candidate_items.toarray() == True), True, False)
+                self.val_mask = CandidateMask(val_candidate_items, exclude=False)
                 test_candidate_items = test_neg_samples + sp_i_test
-                self.test_mask = np.where((test_candidate_items.toarray() == True), True, False)
+                self.test_mask = CandidateMask(test_candidate_items, exclude=False)
 
-        self.allunrated_mask = np.where((self.sp_i_train.toarray() == 0), True, False)
+        # the items already rated in training are excluded, without a dense users x items array
+        self.allunrated_mask = CandidateMask(self.sp_i_train)
 
     def build_items_neighbour(self):
-        row, col = self.sp_i_train.nonzero()
-        edge_index = np.array([row, col])
-        iu_dict = {i: edge_index[0, iu].tolist() for i, iu in
-                   enumerate(list((edge_index[1] == i).nonzero()[0] for i in list(self.private_items.keys())))}
-        return iu_dict
+        """
+        The users of each item, {private item: [private users]}, the dict view of item_users
+        """
+        return self.adjacency_to_dict(*self.item_users)
 
-    def dataframe_to_dict(self, data):
-        users = list(data['userId'].unique())
+    @staticmethod
+    def adjacency_to_dict(indptr, indices):
+        indices = indices.tolist()
+        return {p: indices[start:end] for p, (start, end) in enumerate(zip(indptr[:-1].tolist(), indptr[1:].tolist()))}
 
-        "Conversion to Dictionary"
-        ratings = data.set_index('userId')[['itemId', 'rating']].apply(lambda x: (x['itemId'], float(x['rating'])), 1)\
-            .groupby(level=0).agg(lambda x: dict(x.values)).to_dict()
-        # for u in users:
-        #     sel_ = data[data['userId'] == u]
-        #     ratings[u] = dict(zip(sel_['itemId'], sel_['rating']))
-        return ratings
+    @property
+    def user_items(self):
+        """
+        The items of each user (private ids), as the indptr and indices of sp_i_train: the items of user u are
+        indices[indptr[u]:indptr[u + 1]], in ascending order
+        """
+        return self.sp_i_train.indptr, self.sp_i_train.indices
 
-    def build_dict(self, dataframe, users):
-        ratings = dataframe.set_index('userId')[['itemId', 'rating']].apply(lambda x: (x['itemId'], float(x['rating'])), 1)\
-            .groupby(level=0).agg(lambda x: dict(x.values)).to_dict()
-        # for u in users:
-        #     sel_ = dataframe[dataframe['userId'] == u]
-        #     ratings[u] = dict(zip(sel_['itemId'], sel_['rating']))
-        return ratings
+    @cached_property
+    def item_users(self):
+        """
+        The users of each item (private ids), as the indptr and indices of the CSC form of sp_i_train: the users of
+        item i are indices[indptr[i]:indptr[i + 1]], in ascending order
+        """
+        csc = self.sp_i_train.tocsc()
+        csc.sort_indices()
+        return csc.indptr, csc.indices
 
-    def build_sparse(self):
+    @cached_property
+    def item_degrees(self):
+        return np.diff(self.item_users[0])
 
-        rows_cols = [(u, i) for u, items in self.i_train_dict.items() for i in items.keys()]
-        rows = [u for u, _ in rows_cols]
-        cols = [i for _, i in rows_cols]
-        data = sp.csr_matrix((np.ones_like(rows), (rows, cols)), dtype='float32',
-                             shape=(len(self.users), len(self.items)))
+    @cached_property
+    def user_item_edges(self):
+        """
+        The interactions as the edges of the user-item graph, with the items numbered after the users: a 2 x
+        transactions int64 array of (user, num_users + item) private ids, in the order of sp_i_train.nonzero()
+        """
+        indptr, indices = self.user_items
+        return np.stack([np.repeat(np.arange(self.num_users, dtype=np.int64), np.diff(indptr)),
+                         indices.astype(np.int64) + self.num_users])
+
+    def save_snapshot(self, path):
+        """
+        Store the DataSet in a directory: one .npy file per array and a json header. The splits are kept as grouped
+        by group_interactions (users, indptr, items and ratings, a CSR matrix over the public item ids), the training
+        matrix also as the CSR indices and ratings of sp_i_train, the private ids as the arrays of public users and
+        items, and the candidate items of negative sampling as CSR indices. The side information is not stored.
+        :param path: directory of the snapshot, written once: an existing snapshot is left as it is
+        """
+        arrays = {'users': np.asarray(self.users), 'items': np.asarray(self.items),
+                  'train_item_codes': self._train_item_codes,
+                  'train_csr_indptr': self.sp_i_train_ratings.indptr,
+                  'train_csr_indices': self.sp_i_train_ratings.indices,
+                  'train_csr_ratings': self.sp_i_train_ratings.data}
+        splits = {'train': self._train_interactions, 'test': self._test_interactions, 'val': self._val_interactions}
+        for split, interactions in splits.items():
+            if interactions is not None:
+                for name, array in zip(('users', 'indptr', 'items', 'ratings'), interactions):
+                    arrays[f'{split}_{name}'] = array
+        masks = [name for name in ('test_mask', 'val_mask') if hasattr(self, name)]
+        for name in masks:
+            arrays[f'{name}_indptr'] = getattr(self, name).matrix.indptr
+            arrays[f'{name}_indices'] = getattr(self, name).matrix.indices
+        header = {'version': SNAPSHOT_VERSION, 'num_users': self.num_users, 'num_items': self.num_items,
+                  'transactions': self.transactions,
+                  'splits': [split for split, interactions in splits.items() if interactions is not None],
+                  'masks': masks}
+
+        # written aside and moved in place, the workers of a grid may save the same snapshot at once
+        tmp_path = f"{os.path.normpath(path)}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path)
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array.astype(str) if array.dtype == object else array)
+        with open(os.path.join(tmp_path, "header.json"), "w") as f:
+            json.dump(header, f)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path)
+            if not os.path.isfile(os.path.join(path, "header.json")):
+                raise
+        self.logger.info(f"DataSet snapshot saved in {path}")
+
+    @classmethod
+    def load_snapshot(cls, path, config, side_information_data=None, *args, **kwargs):
+        """
+        Load a DataSet stored by save_snapshot. The arrays are memory mapped (read-only), so that the processes
+        loading the same snapshot share its pages and start without parsing or grouping the splits.
+        :param path: directory of the snapshot
+        :param config: configuration the DataSet is bound to
+        :param side_information_data: side information of the DataSet, not part of the snapshot
+        """
+        with open(os.path.join(path, "header.json")) as f:
+            header = json.load(f)
+        if header['version'] != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported DataSet snapshot version {header['version']} in {path}")
+
+        def load(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+
+        data = cls.__new__(cls)
+        data.logger = logging.get_logger(cls.__name__, pylog.CRITICAL if config.config_test else pylog.DEBUG)
+        data.config = config
+        data.args = args
+        data.kwargs = kwargs
+        data.side_information = side_information_data
+
+        data.users = load('users').tolist()
+        data.items = load('items').tolist()
+        data.num_users = header['num_users']
+        data.num_items = header['num_items']
+        data.transactions = header['transactions']
+
+        interactions = {split: tuple(load(f'{split}_{name}') for name in ('users', 'indptr', 'items', 'ratings'))
+                        for split in header['splits']}
+        data._train_interactions = interactions['train']
+        data._test_interactions = interactions['test']
+        data._val_interactions = interactions.get('val')
+        data._train_item_codes = load('train_item_codes')
+
+        shape = (data.num_users, data.num_items)
+        indptr, indices = load('train_csr_indptr'), load('train_csr_indices')
+        data.sp_i_train = sp.csr_matrix((np.ones(len(indices), dtype='float32'), indices, indptr), shape=shape)
+        data.sp_i_train_ratings = sp.csr_matrix((load('train_csr_ratings'), indices, indptr), shape=shape)
+        for name in header['masks']:
+            indices = load(f'{name}_indices')
+            setattr(data, name, CandidateMask(sp.csr_matrix((np.ones(len(indices), dtype=bool), indices,
+                                                             load(f'{name}_indptr')), shape=shape), exclude=False))
+        data.allunrated_mask = CandidateMask(data.sp_i_train)
+        data.logger.info(f"DataSet snapshot loaded from {path}")
         return data
 
-    def build_sparse_ratings(self):
-        rows_cols_ratings = [(u, i, r) for u, items in self.i_train_dict.items() for i, r in items.items()]
-        rows = [u for u, _, _ in rows_cols_ratings]
-        cols = [i for _, i, _ in rows_cols_ratings]
-        ratings = [r for _, _, r in rows_cols_ratings]
+    @staticmethod
+    def group_interactions(data):
+        """
+        Group the interactions of a split by user, as in the nested dict {user: {item: rating}}: the users in
+        ascending order, the items of each user in order of first occurrence, with the rating of their last occurrence.
+        :param data: dataframe with userId, itemId and rating columns
+        :return: the users, the boundaries of the interactions of each user, the items and the ratings (float64)
+        """
+        user_codes, users = pd.factorize(data['userId'], sort=True)
+        item_codes, item_ids = pd.factorize(data['itemId'])
+        order = np.argsort(user_codes, kind='stable')
+        keys = user_codes[order].astype(np.int64) * len(item_ids) + item_codes[order]
+
+        # first and last occurrence of each (user, item) pair, the pairs are kept in order of first occurrence
+        _, first = np.unique(keys, return_index=True)
+        _, last_reversed = np.unique(keys[::-1], return_index=True)
+        pair_order = np.argsort(first, kind='stable')
+        first = order[first[pair_order]]
+        last = order[len(keys) - 1 - last_reversed[pair_order]]
+
+        indptr = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(user_codes[first], minlength=len(users)), out=indptr[1:])
+        return (users.to_numpy(), indptr, data['itemId'].to_numpy()[first],
+                data['rating'].to_numpy(dtype=np.float64)[last])
+
+    @staticmethod
+    def interactions_to_dict(users, indptr, items, ratings):
+        """
+        Materialize interactions grouped by group_interactions as the nested dict {user: {item: rating}}
+        """
+        items, ratings = items.tolist(), ratings.tolist()
+        return {u: dict(zip(items[start:end], ratings[start:end]))
+                for u, start, end in zip(users.tolist(), indptr[:-1].tolist(), indptr[1:].tolist())}
+
+    @cached_property
+    def private_users(self):
+        return {p: u for p, u in enumerate(self.users)}
+
+    @cached_property
+    def public_users(self):
+        return {v: k for k, v in self.private_users.items()}
+
+    @cached_property
+    def private_items(self):
+        return {p: i for p, i in enumerate(self.items)}
+
+    @cached_property
+    def public_items(self):
+        return {v: k for k, v in self.private_items.items()}
+
+    @cached_property
+    def train_dict(self):
+        return self.interactions_to_dict(*self._train_interactions)
+
+    @cached_property
+    def i_train_dict(self):
+        _, indptr, _, ratings = self._train_interactions
+        return self.interactions_to_dict(np.arange(self.num_users), indptr, self._train_item_codes, ratings)
+
+    @cached_property
+    def test_dict(self):
+        return self.interactions_to_dict(*self._test_interactions)
+
+    @cached_property
+    def val_dict(self):
+        if self._val_interactions is None:
+            # no validation split, hasattr(self, 'val_dict') is False
+            raise AttributeError("val_dict")
+        return self.interactions_to_dict(*self._val_interactions)
+
+    @staticmethod
+    def interactions_fingerprint(interactions):
+        """
+        Digest of interactions grouped by group_interactions, equal for equal splits
+        """
+        digest = hashlib.sha1()
+        for array in interactions:
+            digest.update(pd.util.hash_array(np.asarray(array)).tobytes())
+        return digest.hexdigest()
 
-        data = sp.csr_matrix((ratings, (rows, cols)), dtype='float32',
-                             shape=(len(self.users), len(self.items)))
+    @cached_property
+    def test_fingerprint(self):
+        return self.interactions_fingerprint(self._test_interactions)
 
-        return data
+    @cached_property
+    def val_fingerprint(self):
+        if self._val_interactions is None:
+            raise AttributeError("val_fingerprint")
+        return self.interactions_fingerprint(self._val_interactions)
+
+    def dataframe_to_dict(self, data):
+        return self.interactions_to_dict(*self.group_interactions(data))
+
+    def build_dict(self, dataframe, users):
+        return self.interactions_to_dict(*self.group_interactions(dataframe))
+
+    def _build_csr(self, data):
+        _, indptr, _, _ = self._train_interactions
+        matrix = sp.csr_matrix((data, self._train_item_codes.copy(), indptr.copy()),
+                               shape=(len(self.users), len(self.items)))
+        matrix.sort_indices()
+        return matrix
+
+    def build_sparse(self):
+        return self._build_csr(np.ones(self.transactions, dtype='float32'))
+
+    def build_sparse_ratings(self):
+        return self._build_csr(self._train_interactions[3].astype('float32'))
 
     def get_test(self):
         return self.test_dict
@@ -316,15 +574,26 @@ class DataSet(AbstractDataset):
                                shape=(len(self.public_users.keys()), len(self.public_items.keys())))
         return i_test
 
+    def interactions_to_bool_sparse(self, interactions):
+        """
+        Boolean users x items matrix of the interactions grouped by group_interactions, as to_bool_sparse: the users
+        and items unknown to the training set are dropped
+        """
+        users, indptr, items, _ = interactions
+        rows = pd.Index(self.users).get_indexer(np.repeat(users, np.diff(indptr)))
+        cols = pd.Index(self.items).get_indexer(items)
+        known = (rows >= 0) & (cols >= 0)
+        return sp.csr_matrix((np.ones(known.sum(), dtype=bool), (rows[known], cols[known])), dtype='bool',
+                             shape=(len(self.users), len(self.items)))
+
     def align_with_training(self, train, side_information_data):
         """Alignment with training"""
 
         def equal(a, b, c):
             return len(a) == len(b) == len(c)
 
-        train_dict = self.dataframe_to_dict(train)
-        users = set(train_dict.keys())
-        items = set({k for a in train_dict.values() for k in a.keys()})
+        users = set(pd.unique(train['userId']).tolist())
+        items = set(pd.unique(train['itemId']).tolist())
         users_items = []
         side_objs = []
         for k, v in side_information_data.__dict__.items():
@@ -0,0 +1,227 @@
+"""
+Module description:
+In-process caches shared by successive run_experiment calls, e.g. a grid of models and configurations on the same
+splits: the DataSet objects of a data configuration, the parsed split files and the evaluation objects of a test set.
+With data_config.snapshot_folder the DataSet objects are also stored on disk (DataSet.save_snapshot), and the next
+processes on the same data configuration memory map them instead of loading the splits.
+
+"""
+
+__version__ = '0.3.1'
+__author__ = 'Vito Walter Anelli, Claudio Pomo'
+__email__ = 'vitowalter.anelli@poliba.it, claudio.pomo@poliba.it'
+
+import copy
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from types import SimpleNamespace
+
+# fields of the configuration read while loading the data, the other ones (models, evaluation, paths) do not change it
+DATA_CONFIG_FIELDS = ('data_config', 'binarize', 'prefiltering', 'splitting', 'negative_sampling',
+                      'align_side_with_train', 'random_seed', 'config_test')
+
+
+class LRUCache:
+    """
+    Least recently used cache bounded by a number of entries and, optionally, by their estimated size in bytes
+    """
+
+    def __init__(self, max_entries, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._sizes = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._sizes[key] = self.sizeof(value) if self.sizeof is not None else 0
+        # the newest entry is always kept, even alone above max_bytes
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and sum(self._sizes.values()) > self.max_bytes)):
+            oldest, _ = self._entries.popitem(last=False)
+            del self._sizes[oldest]
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+
+
+def _plain(value):
+    if isinstance(value, SimpleNamespace):
+        return {k: _plain(v) for k, v in vars(value).items()}
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def _file_stats(value):
+    # size and modification time of the files named in the configuration, a rewritten file is loaded again
+    if isinstance(value, dict):
+        return [s for v in value.values() for s in _file_stats(v)]
+    if isinstance(value, list):
+        return [s for v in value for s in _file_stats(v)]
+    if isinstance(value, str) and os.path.isfile(value):
+        stat = os.stat(value)
+        return [[os.path.abspath(value), stat.st_size, stat.st_mtime_ns]]
+    return []
+
+
+def data_config_key(config):
+    """
+    The key of the data loaded for a configuration: the fields read by the data loaders and the state of the files
+    they name
+    """
+    fields = _plain({name: getattr(config, name, None) for name in DATA_CONFIG_FIELDS})
+    return json.dumps([fields, _file_stats(fields)], sort_keys=True, default=str)
+
+
+def dataset_nbytes(data_test_list):
+    """
+    Estimated size of the DataSet objects of a data configuration, from their sparse matrices
+    """
+    total = 0
+    for folds in data_test_list:
+        for data in folds:
+            for name in ('sp_i_train', 'sp_i_train_ratings'):
+                matrix = getattr(data, name, None)
+                if matrix is not None:
+                    total += matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+            # the id maps and dicts are python objects, roughly 100 bytes per entry
+            total += 100 * (data.num_users + data.num_items + 2 * data.transactions)
+    return total
+
+
+_datasets = LRUCache(max_entries=4, max_bytes=4 * 2 ** 30, sizeof=lambda entry: dataset_nbytes(entry[0]))
+_splits = LRUCache(max_entries=8)
+_relevances = LRUCache(max_entries=8)
+
+
+def load_data(dataloader_class, config):
+    """
+    The DataSet objects of a configuration, as dataloader_class(config=config).generate_dataobjects(), reused from
+    a previous call with the same data configuration. The reused objects are bound to the new configuration.
+    """
+    key = data_config_key(config)
+    entry = _datasets.get(key)
+    if entry is None:
+        path = snapshot_path(dataloader_class, config, key)
+        if path is not None and os.path.isfile(os.path.join(path, "layout.json")):
+            entry = _datasets.put(key, load_snapshots(path, config))
+    if entry is None:
+        evaluation = copy.copy(vars(config.evaluation))
+        data_test_list = dataloader_class(config=config).generate_dataobjects()
+        # the loaders may switch off evaluation options (e.g. the paired t-test with folds), replayed on reuse
+        overrides = {k: v for k, v in vars(config.evaluation).items() if evaluation.get(k, object()) != v}
+        entry = _datasets.put(key, (data_test_list, overrides))
+        if path is not None:
+            save_snapshots(path, data_test_list, overrides)
+    data_test_list, overrides = entry
+    for name, value in overrides.items():
+        setattr(config.evaluation, name, value)
+    for folds in data_test_list:
+        for data in folds:
+            data.config = config
+    return data_test_list
+
+
+def snapshot_path(dataloader_class, config, key):
+    """
+    The directory of the snapshots of a data configuration, None when they are not enabled or not supported: only
+    the DataSet objects of DataSetLoader are stored, and without side information, which is not part of a snapshot
+    """
+    from elliot.dataset.dataset import DataSetLoader
+    folder = getattr(config.data_config, "snapshot_folder", None)
+    if folder is None or not issubclass(dataloader_class, DataSetLoader) or \
+            getattr(config.data_config, "side_information", None):
+        return None
+    return os.path.join(folder, hashlib.sha1(key.encode()).hexdigest())
+
+
+def save_snapshots(path, data_test_list, overrides):
+    """
+    Store the DataSet objects of a data configuration, one snapshot per fold. The layout is written last, a
+    snapshot without it is incomplete and not loaded.
+    """
+    for p1, folds in enumerate(data_test_list):
+        for p2, data in enumerate(folds):
+            data.save_snapshot(os.path.join(path, f"{p1}_{p2}"))
+    tmp_path = os.path.join(path, f"layout.json.tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump({'folds': [len(folds) for folds in data_test_list], 'overrides': overrides}, f)
+    os.replace(tmp_path, os.path.join(path, "layout.json"))
+
+
+def load_snapshots(path, config):
+    """
+    The DataSet objects and evaluation overrides stored by save_snapshots, memory mapped
+    """
+    from elliot.dataset.dataset import DataSet
+    with open(os.path.join(path, "layout.json")) as f:
+        layout = json.load(f)
+    data_test_list = [[DataSet.load_snapshot(os.path.join(path, f"{p1}_{p2}"), config) for p2 in range(folds)]
+                      for p1, folds in enumerate(layout['folds'])]
+    return data_test_list, layout['overrides']
+
+
+def read_split(path, reader):
+    """
+    A split file parsed by reader(path), reused while the file is unchanged. A copy is returned, the loaders modify
+    the ratings in place.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, reader.__name__)
+    dataframe = _splits.get(key)
+    if dataframe is None:
+        dataframe = _splits.put(key, reader(path))
+    return dataframe.copy()
+
+
+def relevance(test, fingerprint, rel_threshold, factory):
+    """
+    The relevance object of a test set, shared by the DataSet objects with the same test set (fingerprint) whatever
+    their training set. Without a fingerprint a new object is built.
+    """
+    if fingerprint is None:
+        return factory(test, rel_threshold)
+    key = (fingerprint, rel_threshold)
+    shared = _relevances.get(key)
+    if shared is None:
+        shared = _relevances.put(key, factory(test, rel_threshold))
+    return shared
+
+
+def popularity(data, factory):
+    """
+    The popularity object of a DataSet, shared by all the models evaluated on it
+    """
+    # kept by the DataSet itself, the popularity refers to it and a cache would keep both alive
+    shared = getattr(data, '_shared_popularity', None)
+    if shared is None:
+        shared = factory(data)
+        data._shared_popularity = shared
+    return shared
+
+
+def clear():
+    _datasets.clear()
+    _splits.clear()
+    _relevances.clear()
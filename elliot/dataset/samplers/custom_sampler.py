@@ -7,40 +7,97 @@ __version__ = '0.3.1'
 __author__ = 'Vito Walter Anelli, Claudio Pomo'
 __email__ = 'vitowalter.anelli@poliba.it, claudio.pomo@poliba.it'
 
+import itertools
+
 import numpy as np
 
 
 class Sampler:
+    """
+    BPR triplet sampler: a user drawn uniformly, one of its items and an item it has not rated.
+
+    The training set is held as CSR arrays (the indptr and indices of the items of each user, e.g. DataSet.user_items)
+    and the triplets of a step are drawn with numpy, many at once: the negatives are checked against the (user, item)
+    keys of the training set, in a bitmap when users x items bits fit in max_bitmap_bits, with a binary search in the
+    sorted keys otherwise, and only the rejected ones are drawn again.
+    """
+
+    # triplets drawn at once, rounded to whole batches
+    chunk_size = 2 ** 20
+    max_bitmap_bits = 2 ** 30
+
     def __init__(self, indexed_ratings, seed=42):
+        """
+        :param indexed_ratings: the (indptr, indices) CSR arrays of the items of each user, or the dict {user: {item:
+        rating}} of private ids (DataSet.i_train_dict)
+        :param seed: seed of np.random
+        """
         np.random.seed(seed)
-        self._indexed_ratings = indexed_ratings
-        self._users = list(self._indexed_ratings.keys())
-        self._nusers = len(self._users)
-        self._items = list({k for a in self._indexed_ratings.values() for k in a.keys()})
-        self._nitems = len(self._items)
-        self._ui_dict = {u: list(set(indexed_ratings[u])) for u in indexed_ratings}
-        self._lui_dict = {u: len(v) for u, v in self._ui_dict.items()}
-
-    def step(self, events: int, batch_size: int):
-        r_int = np.random.randint
-        n_users = self._nusers
-        n_items = self._nitems
-        ui_dict = self._ui_dict
-        lui_dict = self._lui_dict
-
-        def sample():
-            u = r_int(n_users)
-            ui = ui_dict[u]
-            lui = lui_dict[u]
-            if lui == n_items:
-                sample()
-            i = ui[r_int(lui)]
-
-            j = r_int(n_items)
-            while j in ui:
-                j = r_int(n_items)
-            return u, i, j
-
-        for batch_start in range(0, events, batch_size):
-            bui, bii, bij = map(np.array, zip(*[sample() for _ in range(batch_start, min(batch_start + batch_size, events))]))
-            yield bui[:, None], bii[:, None], bij[:, None]
+        if isinstance(indexed_ratings, dict):
+            indptr, indices = self.ratings_to_csr(indexed_ratings)
+        else:
+            indptr, indices = indexed_ratings
+        self._indptr = np.asarray(indptr, dtype=np.int64)
+        self._indices = np.asarray(indices, dtype=np.int64)
+        self._nusers = len(self._indptr) - 1
+        self._nitems = int(self._indices.max()) + 1 if len(self._indices) else 0
+
+        degrees = np.diff(self._indptr)
+        self._keys = np.sort(np.repeat(np.arange(self._nusers, dtype=np.int64), degrees) * self._nitems + self._indices)
+        self._bitmap = None
+        if self._nusers * self._nitems <= self.max_bitmap_bits:
+            # the keys are unique, the sum of the bits of a byte is their union
+            self._bitmap = np.bincount(self._keys >> 3, weights=1 << (self._keys & 7),
+                                       minlength=(self._nusers * self._nitems + 7) // 8).astype(np.uint8)
+        # a user with no items, or with all of them, has no triplet
+        self._users = np.flatnonzero((degrees > 0) & (degrees < self._nitems))
+
+    @staticmethod
+    def ratings_to_csr(indexed_ratings):
+        n_users = len(indexed_ratings)
+        degrees = np.fromiter((len(indexed_ratings[u]) for u in range(n_users)), dtype=np.int64, count=n_users)
+        indptr = np.zeros(n_users + 1, dtype=np.int64)
+        np.cumsum(degrees, out=indptr[1:])
+        indices = np.fromiter(itertools.chain.from_iterable(indexed_ratings[u] for u in range(n_users)),
+                              dtype=np.int64, count=indptr[-1])
+        return indptr, indices
+
+    def rated(self, users, items):
+        keys = users * self._nitems + items
+        if self._bitmap is not None:
+            return ((self._bitmap[keys >> 3] >> (keys & 7)) & 1).astype(bool)
+        found = np.searchsorted(self._keys, keys)
+        return self._keys[np.minimum(found, len(self._keys) - 1)] == keys
+
+    def sample(self, events: int):
+        """
+        Draw events triplets
+        :return: the users, positive items and negative items, int64 arrays
+        """
+        if not len(self._users):
+            raise ValueError("No user has both rated and unrated items to sample from")
+        users = self._users[np.random.randint(len(self._users), size=events)]
+        start = self._indptr[users]
+        positives = self._indices[start + np.random.randint(0, self._indptr[users + 1] - start)]
+
+        negatives = np.random.randint(self._nitems, size=events)
+        rejected = np.flatnonzero(self.rated(users, negatives))
+        while len(rejected):
+            negatives[rejected] = np.random.randint(self._nitems, size=len(rejected))
+            rejected = rejected[self.rated(users[rejected], negatives[rejected])]
+        return users, positives, negatives
+
+    def step(self, events: int, batch_size: int, as_tensor: bool = False):
+        """
+        Yield the triplets of an epoch in batches of contiguous (batch_size, 1) int64 arrays, torch tensors if
+        as_tensor
+        """
+        chunk = max(batch_size, self.chunk_size // batch_size * batch_size)
+        for chunk_start in range(0, events, chunk):
+            users, positives, negatives = self.sample(min(chunk, events - chunk_start))
+            for batch_start in range(0, len(users), batch_size):
+                batch = [a[batch_start:batch_start + batch_size, None] for a in (users, positives, negatives)]
+                if as_tensor:
+                    import torch
+                    batch = [torch.from_numpy(a) for a in batch]
+                yield tuple(batch)
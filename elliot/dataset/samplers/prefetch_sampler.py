@@ -0,0 +1,113 @@
+"""
+Module description:
+Prefetching wrapper running any sampler in a producer thread, so that the next batch is ready when the training loop
+asks for it.
+
+"""
+
+__version__ = '0.3.1'
+__author__ = 'Vito Walter Anelli, Claudio Pomo'
+__email__ = 'vitowalter.anelli@poliba.it, claudio.pomo@poliba.it'
+
+import queue
+import threading
+import time
+
+
+class PrefetchSampler:
+    """
+    Wrap a sampler: step() yields the batches of sampler.step() while the following ones are drawn by a producer
+    thread into a queue of at most queue_size batches. The batches are passed through convert in the producer, e.g.
+    to_torch(device) or to_tensorflow(), so that the conversion overlaps with the optimizer steps too.
+
+    numpy releases the GIL in the vectorized draws, a thread is enough and keeps the sampler state in the process.
+    The sampler draws from its own random state only if the training loop does not draw from np.random concurrently.
+
+    The counters of the last step() are kept in batches, starved (how many times the training loop found the queue
+    empty) and wait_time (the seconds it waited for a batch).
+    """
+
+    _end = object()
+
+    def __init__(self, sampler, queue_size=8, convert=None):
+        self._sampler = sampler
+        self._queue_size = max(1, int(queue_size))
+        self._convert = convert
+        self.batches = 0
+        self.starved = 0
+        self.wait_time = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self._sampler, name)
+
+    @staticmethod
+    def to_torch(device=None):
+        import torch
+
+        def convert(batch):
+            tensors = [torch.from_numpy(a) if not isinstance(a, torch.Tensor) else a for a in batch]
+            if device is not None and torch.device(device).type == 'cuda':
+                tensors = [t.pin_memory().to(device, non_blocking=True) for t in tensors]
+            elif device is not None:
+                tensors = [t.to(device) for t in tensors]
+            return tuple(tensors)
+        return convert
+
+    @staticmethod
+    def to_tensorflow():
+        import tensorflow as tf
+
+        def convert(batch):
+            return tuple(tf.convert_to_tensor(a) for a in batch)
+        return convert
+
+    @staticmethod
+    def _put(batches, stop, item):
+        # a full queue is waited on only while the training loop is still reading it
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self, batches, stop, args, kwargs):
+        try:
+            for batch in self._sampler.step(*args, **kwargs):
+                if self._convert is not None:
+                    batch = self._convert(batch)
+                if not self._put(batches, stop, batch):
+                    return
+            self._put(batches, stop, self._end)
+        except BaseException as e:
+            self._put(batches, stop, e)
+
+    def step(self, *args, **kwargs):
+        self.batches = 0
+        self.starved = 0
+        self.wait_time = 0.0
+        batches = queue.Queue(maxsize=self._queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(batches, stop, args, kwargs), daemon=True)
+        producer.start()
+        try:
+            while True:
+                try:
+                    batch = batches.get_nowait()
+                except queue.Empty:
+                    self.starved += 1
+                    started = time.perf_counter()
+                    batch = batches.get()
+                    self.wait_time += time.perf_counter() - started
+                if batch is self._end:
+                    return
+                if isinstance(batch, BaseException):
+                    raise batch
+                self.batches += 1
+                yield batch
+        finally:
+            # the training loop may stop early (e.g. on a nan loss), the producer is released. It stops at its next
+            # put, the daemon thread is not waited for while it draws a chunk
+            stop.set()
+            producer.join(timeout=1.0)
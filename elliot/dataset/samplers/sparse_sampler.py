@@ -9,6 +9,8 @@ __email__ = 'vitowalter.anelli@poliba.it, claudio.pomo@poliba.it'
 
 import random
 
+import numpy as np
+
 
 class Sampler:
     def __init__(self, sp_i_train
@@ -16,10 +18,26 @@ class Sampler:
         random.seed(42)
         self._train = sp_i_train
 
-    def step(self, users: int, batch_size: int):
+    def step(self, users: int, batch_size: int, as_sparse: bool = False):
+        """
+        Yield the rows of the users in shuffled batches, dense arrays or tf.SparseTensor if as_sparse
+        """
         train = self._train
         shuffled_list = random.sample(range(users), users)
 
         for start_idx in range(0, users, batch_size):
             end_idx = min(start_idx + batch_size, users)
-            yield train[shuffled_list[start_idx:end_idx]].toarray()
+            rows = train[shuffled_list[start_idx:end_idx]]
+            yield self.to_sparse_tensor(rows) if as_sparse else rows.toarray()
+
+    @staticmethod
+    def to_sparse_tensor(matrix):
+        """
+        A csr matrix as a float32 tf.SparseTensor, its entries in row-major order
+        """
+        import tensorflow as tf
+        matrix = matrix.tocsr()
+        matrix.sort_indices()
+        rows = np.repeat(np.arange(matrix.shape[0], dtype=np.int64), np.diff(matrix.indptr))
+        indices = np.stack([rows, matrix.indices.astype(np.int64)], axis=1)
+        return tf.SparseTensor(indices, matrix.data.astype(np.float32), matrix.shape)
@@ -28,6 +28,7 @@ import logging as pylog
 import numpy as np
 
 import elliot.dataset.dataset as ds
+from elliot.dataset import dataset_cache
 from elliot.utils import logging
 from . import metrics
 from . import popularity_utils
@@ -62,16 +63,21 @@ class Evaluator(object):
         #     raise Exception("Validation metric must be in list of general metrics")
         self._test = data.get_test()
 
-        self._pop = popularity_utils.Popularity(self._data)
+        # shared by the models evaluated on the same data, and the relevance by every DataSet with the same test set
+        self._pop = dataset_cache.popularity(self._data, popularity_utils.Popularity)
+        test_relevance = dataset_cache.relevance(self._test, getattr(data, "test_fingerprint", None),
+                                                 self._rel_threshold, relevance.Relevance)
 
-        self._evaluation_objects = SimpleNamespace(relevance=relevance.Relevance(self._test, self._rel_threshold),
+        self._evaluation_objects = SimpleNamespace(relevance=test_relevance,
                                                    pop=self._pop,
                                                    num_items=self._data.num_items,
                                                    data = self._data,
                                                    additional_metrics=self._complex_metrics)
         if data.get_validation():
             self._val = data.get_validation()
-            self._val_evaluation_objects = SimpleNamespace(relevance=relevance.Relevance(self._val, self._rel_threshold),
+            val_relevance = dataset_cache.relevance(self._val, getattr(data, "val_fingerprint", None),
+                                                    self._rel_threshold, relevance.Relevance)
+            self._val_evaluation_objects = SimpleNamespace(relevance=val_relevance,
                                                            pop=self._pop,
                                                            num_items=self._data.num_items,
                                                            data = self._data,
@@ -14,6 +14,7 @@ from collections import Counter
 
 from elliot.evaluation.metrics.base_metric import BaseMetric
 from elliot.evaluation.metrics.metrics_utils import ProxyMetric
+from elliot.utils.read import read_clustering
 
 class BiasDisparityBR(BaseMetric):
     r"""
@@ -52,7 +53,7 @@ class BiasDisparityBR(BaseMetric):
         self._item_clustering_path = self._additional_data.get("item_clustering_file", False)
 
         if self._item_clustering_path:
-            self._item_clustering = pd.read_csv(self._item_clustering_path, sep="\t", header=None)
+            self._item_clustering = read_clustering(self._item_clustering_path)
             self._item_n_clusters = self._item_clustering[1].nunique()
             self._item_clustering = dict(zip(self._item_clustering[0], self._item_clustering[1]))
             self._item_clustering_name = self._additional_data['item_clustering_name']
@@ -64,7 +65,7 @@ class BiasDisparityBR(BaseMetric):
         self._user_clustering_path = self._additional_data.get("user_clustering_file", False)
 
         if self._user_clustering_path:
-            self._user_clustering = pd.read_csv(self._user_clustering_path, sep="\t", header=None)
+            self._user_clustering = read_clustering(self._user_clustering_path)
             self._user_n_clusters = self._user_clustering[1].nunique()
             self._user_clustering = dict(zip(self._user_clustering[0], self._user_clustering[1]))
             self._user_clustering_name = self._additional_data['user_clustering_name']
@@ -10,6 +10,7 @@ __email__ = 'vitowalter.anelli@poliba.it, claudio.pomo@poliba.it'
 import numpy as np
 import pandas as pd
 from elliot.evaluation.metrics.base_metric import BaseMetric
+from elliot.utils.read import read_clustering
 
 
 class UserMADrating(BaseMetric):
@@ -48,7 +49,7 @@ class UserMADrating(BaseMetric):
         self._user_clustering_path = self._additional_data.get("clustering_file", False)
         self._user_clustering_name = self._additional_data.get("clustering_name", "")
         if self._user_clustering_path:
-            self._user_clustering = pd.read_csv(self._additional_data["clustering_file"], sep="\t", header=None)
+            self._user_clustering = read_clustering(self._additional_data["clustering_file"])
             self._n_clusters = self._user_clustering[1].nunique()
             self._user_clustering = dict(zip(self._user_clustering[0], self._user_clustering[1]))
         else:
@@ -14,6 +14,7 @@ from collections import Counter
 
 from elliot.evaluation.metrics.base_metric import BaseMetric
 from elliot.evaluation.metrics.metrics_utils import ProxyMetric
+from elliot.utils.read import read_clustering
 
 class RSP(BaseMetric):
     r"""
@@ -61,7 +62,7 @@ class RSP(BaseMetric):
         self._item_clustering_path = self._additional_data.get("clustering_file", False)
 
         if self._item_clustering_path:
-            self._item_clustering = pd.read_csv(self._item_clustering_path, sep="\t", header=None, names=["id","cluster"])
+            self._item_clustering = read_clustering(self._item_clustering_path, names=["id", "cluster"])
             self._item_n_clusters = self._item_clustering['cluster'].nunique()
             self._item_clustering = self._item_clustering.groupby('cluster')['id'].apply(set).to_dict()
             self._item_clustering_name = self._additional_data['clustering_name']
@@ -33,7 +33,8 @@ class NegativeSampler:
                                                               private_items, i_train,
                                                                test) if test != None else None
 
-        return (val_negative_items, test_negative_items) if val_negative_items else (test_negative_items, test_negative_items)
+        return (val_negative_items, test_negative_items) if val_negative_items is not None \
+            else (test_negative_items, test_negative_items)
 
     @staticmethod
     def process_sampling(ns: SimpleNamespace, public_users: t.Dict, public_items: t.Dict, private_users: t.Dict,
@@ -47,7 +48,8 @@ class NegativeSampler:
         i_test = sp.csr_matrix((np.ones_like(rows), (rows, cols)), dtype='float32',
                                shape=(len(public_users.keys()), len(public_items.keys())))
 
-        candidate_negatives = ((i_test + i_train).astype('bool') != True)
+        # the positives of each user, the negatives are sampled from the complement without building it
+        excluded = (i_test + i_train).astype('bool')
         ns = ns.negative_sampling
 
         strategy = getattr(ns, "strategy", None)
@@ -57,7 +59,7 @@ class NegativeSampler:
             file_path = getattr(ns, "file_path", None)
             if num_items is not None:
                 if str(num_items).isdigit():
-                    negative_items = NegativeSampler.sample_by_random_uniform(candidate_negatives, num_items)
+                    negative_items = NegativeSampler.sample_by_random_uniform(excluded, int(num_items))
 
                     nnz = negative_items.nonzero()
                     old_ind = 0
@@ -90,16 +92,51 @@ class NegativeSampler:
         return negative_items
 
     @staticmethod
-    def sample_by_random_uniform(data: sp.csr_matrix, num_items=99) -> sp.csr_matrix:
-        rows = []
-        cols = []
-        for row in range(data.shape[0]):
-            candidate_negatives = list(zip(*data.getrow(row).nonzero()))
-            sampled_negatives = np.array(candidate_negatives)[random.sample(range(len(candidate_negatives)), num_items)]
-            rows.extend(list(np.ones(len(sampled_negatives), dtype=int) * row))
-            cols.extend(sampled_negatives[:, 1])
-        negative_samples = sp.csr_matrix((np.ones_like(rows), (rows, cols)), dtype='bool',
-                                         shape=(data.shape[0], data.shape[1]))
+    def sample_by_random_uniform(excluded: sp.csr_matrix, num_items=99) -> sp.csr_matrix:
+        """
+        Sample num_items distinct items per user, uniformly among the items not stored in its row of excluded.
+        Each user draws ranks among its n_items - n_excluded candidates, which are mapped to the item ids by skipping
+        the excluded items, so the complement of the matrix is never materialized.
+        :param excluded: users x items boolean matrix of the items that can not be sampled
+        :param num_items: number of negative items per user
+        :return: users x items boolean matrix of the sampled items
+        """
+        excluded = sp.csr_matrix(excluded, dtype=bool)
+        excluded.eliminate_zeros()
+        excluded.sort_indices()
+        n_users, n_items = excluded.shape
+        n_candidates = n_items - np.diff(excluded.indptr)
+        if (n_candidates < num_items).any():
+            raise ValueError(f"Sample larger than population: some users have less than {num_items} negative items")
+
+        # distinct ranks in [0, n_candidates) for every user: duplicates within a row are drawn again
+        ranks = np.zeros((n_users, num_items), dtype=np.int64)
+        redraw = np.ones((n_users, num_items), dtype=bool)
+        # users with few candidates would need many rounds, their ranks are drawn as a permutation instead
+        few = n_candidates < 2 * num_items
+        for u in np.flatnonzero(few):
+            ranks[u] = np.random.permutation(n_candidates[u])[:num_items]
+        redraw[few] = False
+        while redraw.any():
+            rows, positions = np.nonzero(redraw)
+            ranks[rows, positions] = (np.random.random_sample(len(rows)) * n_candidates[rows]).astype(np.int64)
+            order = np.argsort(ranks, axis=1, kind='stable')
+            sorted_ranks = np.take_along_axis(ranks, order, axis=1)
+            duplicate = np.zeros_like(redraw)
+            duplicate[:, 1:] = sorted_ranks[:, 1:] == sorted_ranks[:, :-1]
+            redraw = np.zeros_like(redraw)
+            np.put_along_axis(redraw, order, duplicate, axis=1)
+
+        # the rank r of a user is the item r + (number of its excluded items e_j with e_j - j <= r), e_j sorted:
+        # counted for all the users at once with keys offset by user
+        stored_rows = np.repeat(np.arange(n_users, dtype=np.int64), np.diff(excluded.indptr))
+        skipped = np.arange(excluded.nnz, dtype=np.int64) - excluded.indptr[stored_rows]
+        keys = stored_rows * (n_items + 1) + excluded.indices - skipped
+        rows = np.repeat(np.arange(n_users, dtype=np.int64), num_items)
+        ranks = ranks.ravel()
+        cols = ranks + np.searchsorted(keys, rows * (n_items + 1) + ranks, side='right') - excluded.indptr[rows]
+        negative_samples = sp.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), dtype='bool',
+                                         shape=(n_users, n_items))
         return negative_samples
 
     @staticmethod
@@ -1,4 +1,5 @@
 
+import numpy as np
 import pandas as pd
 from types import SimpleNamespace
 
@@ -11,6 +12,62 @@ prefiltering:
 """
 
 
+class FilteredInteractions:
+    """
+    The interactions being prefiltered: the user and item columns factorized once as int32 codes (-1 for a missing
+    id) and a boolean mask of the rows kept so far. Every strategy narrows the mask, the DataFrame is indexed only
+    once, by result().
+    """
+
+    def __init__(self, d: pd.DataFrame):
+        self.data = d
+        self.keep = np.ones(len(d), dtype=bool)
+        self.user_codes = pd.factorize(d["userId"])[0].astype(np.int32)
+        self.item_codes = pd.factorize(d["itemId"])[0].astype(np.int32)
+        # index labels of the rows after a strategy renumbering them (user_average), None for the original index
+        self.labels = None
+
+    @property
+    def ratings(self) -> pd.Series:
+        return self.data["rating"][self.keep]
+
+    def __len__(self):
+        return int(np.count_nonzero(self.keep))
+
+    def counts(self, codes: np.ndarray) -> np.ndarray:
+        # kept rows of each user (item), missing ids are not counted
+        kept = codes[self.keep]
+        return np.bincount(kept[kept >= 0], minlength=codes.max(initial=-1) + 1)
+
+    def nunique(self, codes: np.ndarray) -> int:
+        return int(np.count_nonzero(self.counts(codes)))
+
+    def narrow(self, kept: np.ndarray):
+        """
+        Keep the rows flagged by kept, a mask over the rows kept so far
+        """
+        self.keep[self.keep] = kept
+
+    def narrow_by_count(self, codes: np.ndarray, accept):
+        # keep the rows of the users (items) whose number of kept rows is accepted, and none with a missing id
+        counts = self.counts(codes)
+        kept = codes[self.keep]
+        self.narrow((kept >= 0) & accept(counts[np.maximum(kept, 0)]))
+
+    def renumber(self):
+        self.labels = np.full(len(self.keep), -1, dtype=np.int64)
+        self.labels[self.keep] = np.arange(len(self))
+
+    def result(self) -> pd.DataFrame:
+        data = self.data[self.keep]
+        if self.labels is not None:
+            labels = self.labels[self.keep]
+            data = data.reset_index(drop=True)
+            if not np.array_equal(labels, np.arange(len(labels))):
+                data.index = pd.Index(labels)
+        return data
+
+
 class PreFilter:
 
     @staticmethod
@@ -18,38 +75,38 @@ class PreFilter:
         if not hasattr(ns, "prefiltering"):
             return d
         ns = ns.prefiltering
-        dataframe = d.copy()
+        interactions = FilteredInteractions(d)
 
+        # the chained strategies narrow a single mask, applied to the dataframe at the end
         for strategy in ns:
-            dataframe = PreFilter.single_filter(dataframe, strategy)
+            PreFilter.single_filter(interactions, strategy)
 
-        return dataframe
+        return interactions.result()
 
     @staticmethod
-    def single_filter(d: pd.DataFrame, ns: SimpleNamespace) -> pd.DataFrame:
+    def single_filter(interactions: FilteredInteractions, ns: SimpleNamespace) -> None:
 
         strategy = getattr(ns, "strategy", None)
-        data = d.copy()
         if strategy == "global_threshold":
             threshold = getattr(ns, "threshold", None)
             if threshold is not None:
                 if str(threshold).isdigit():
-                    data = PreFilter.filter_ratings_by_threshold(data, threshold)
+                    PreFilter.filter_ratings_by_threshold(interactions, threshold)
                 elif threshold == "average":
-                    data = PreFilter.filter_ratings_by_global_average(data)
+                    PreFilter.filter_ratings_by_global_average(interactions)
                 else:
                     raise Exception("Threshold value not recognized")
             else:
                 raise Exception("Threshold option is missing")
 
         elif strategy == "user_average":
-            data = PreFilter.filter_ratings_by_user_average(data)
+            PreFilter.filter_ratings_by_user_average(interactions)
 
         elif strategy == "user_k_core":
             core = getattr(ns, "core", None)
             if core is not None:
                 if str(core).isdigit():
-                    data = PreFilter.filter_users_by_profile_size(data, core)
+                    PreFilter.filter_users_by_profile_size(interactions, core)
                 else:
                     raise Exception("Core option is not a digit")
             else:
@@ -59,7 +116,7 @@ class PreFilter:
             core = getattr(ns, "core", None)
             if core is not None:
                 if str(core).isdigit():
-                    data = PreFilter.filter_items_by_popularity(data, core)
+                    PreFilter.filter_items_by_popularity(interactions, core)
                 else:
                     raise Exception("Core option is not a digit")
             else:
@@ -69,7 +126,7 @@ class PreFilter:
             core = getattr(ns, "core", None)
             if core is not None:
                 if str(core).isdigit():
-                    data = PreFilter.filter_iterative_k_core(data, core)
+                    PreFilter.filter_iterative_k_core(interactions, core)
                 else:
                     raise Exception("Core option is not a digit")
             else:
@@ -80,7 +137,7 @@ class PreFilter:
             n_rounds = getattr(ns, "rounds", None)
             if (core is not None) and (n_rounds is not None):
                 if str(core).isdigit() and str(n_rounds).isdigit():
-                    data = PreFilter.filter_rounds_k_core(data, core, n_rounds)
+                    PreFilter.filter_rounds_k_core(interactions, core, n_rounds)
                 else:
                     raise Exception("Core or rounds options are not digits")
             else:
@@ -90,7 +147,7 @@ class PreFilter:
             threshold = getattr(ns, "threshold", None)
             if threshold is not None:
                 if str(threshold).isdigit():
-                    data = PreFilter.filter_retain_cold_users(data, threshold)
+                    PreFilter.filter_retain_cold_users(interactions, threshold)
                 else:
                     raise Exception("Threshold option is not a digit")
             else:
@@ -99,107 +156,93 @@ class PreFilter:
         else:
             raise Exception("Misssing strategy")
 
-        return data
-
     @staticmethod
-    def filter_ratings_by_global_average(d: pd.DataFrame) -> pd.DataFrame:
-        data = d.copy()
-        threshold = data["rating"].mean()
+    def filter_ratings_by_global_average(interactions: FilteredInteractions) -> None:
+        ratings = interactions.ratings
+        threshold = ratings.mean()
+        accepted = (ratings >= threshold).to_numpy()
         print("\nPrefiltering with Global Average")
         print(f"The rating average is {round(threshold, 1)}")
-        print(f"The transactions above threshold are {data[data['rating'] >= threshold]['rating'].count()}")
-        print(f"The transactions below threshold are {data[data['rating'] < threshold]['rating'].count()}")
-        return data[data["rating"] >= threshold]
+        print(f"The transactions above threshold are {np.count_nonzero(accepted)}")
+        print(f"The transactions below threshold are {np.count_nonzero((ratings < threshold).to_numpy())}")
+        interactions.narrow(accepted)
 
     @staticmethod
-    def filter_ratings_by_threshold(d: pd.DataFrame, threshold) -> pd.DataFrame:
-        data = d.copy()
+    def filter_ratings_by_threshold(interactions: FilteredInteractions, threshold) -> None:
+        ratings = interactions.ratings
+        accepted = (ratings >= threshold).to_numpy()
         print("\nPrefiltering with fixed threshold")
         print(f"The rating threshold is {round(threshold, 1)}")
-        print(f"The transactions above threshold are {data[data['rating'] >= threshold]['rating'].count()}")
-        print(f"The transactions below threshold are {data[data['rating'] < threshold]['rating'].count()}\n")
-        return data[data["rating"] >= threshold]
+        print(f"The transactions above threshold are {np.count_nonzero(accepted)}")
+        print(f"The transactions below threshold are {np.count_nonzero((ratings < threshold).to_numpy())}\n")
+        interactions.narrow(accepted)
 
     @staticmethod
-    def filter_ratings_by_user_average(d: pd.DataFrame) -> pd.DataFrame:
-        data = d.copy()
-        user_groups = data.groupby(['userId'])
-        for name, group in user_groups:
-            threshold = group["rating"].mean()
-            data.loc[group.index, 'accept_flag'] = data.loc[group.index, 'rating'] >= threshold
+    def filter_ratings_by_user_average(interactions: FilteredInteractions) -> None:
+        ratings = interactions.ratings
+        user_codes = interactions.user_codes[interactions.keep]
+        # the rows of a missing user id have no average and are dropped
+        threshold = ratings.groupby(np.where(user_codes >= 0, user_codes, np.nan)).transform('mean')
+        accepted = (ratings >= threshold).to_numpy()
 
         print("\nPrefiltering with user average")
-        print(f"The transactions above threshold are {data[data['accept_flag']]['rating'].count()}")
-        print(f"The transactions below threshold are {data[data['accept_flag'] == False]['rating'].count()}\n")
-        return data[data["accept_flag"] == True].drop(columns=["accept_flag"]).reset_index(drop=True)
+        print(f"The transactions above threshold are {np.count_nonzero(accepted)}")
+        print(f"The transactions below threshold are {ratings[~accepted].count()}\n")
+        interactions.narrow(accepted)
+        interactions.renumber()
 
     @staticmethod
-    def filter_users_by_profile_size(d: pd.DataFrame, threshold) -> pd.DataFrame:
-        data = d.copy()
+    def filter_users_by_profile_size(interactions: FilteredInteractions, threshold) -> None:
         print(f"\nPrefiltering with user {threshold}-core")
-        print(f"The transactions before filtering are {len(data)}")
-        print(f"The users before filtering are {data['userId'].nunique()}")
-        user_groups = data.groupby(['userId'])
-        data = user_groups.filter(lambda x: len(x) >= threshold)
-        print(f"The transactions after filtering are {len(data)}")
-        print(f"The users after filtering are {data['userId'].nunique()}")
-        return data
+        print(f"The transactions before filtering are {len(interactions)}")
+        print(f"The users before filtering are {interactions.nunique(interactions.user_codes)}")
+        interactions.narrow_by_count(interactions.user_codes, lambda size: size >= threshold)
+        print(f"The transactions after filtering are {len(interactions)}")
+        print(f"The users after filtering are {interactions.nunique(interactions.user_codes)}")
 
     @staticmethod
-    def filter_items_by_popularity(d: pd.DataFrame, threshold) -> pd.DataFrame:
-        data = d.copy()
+    def filter_items_by_popularity(interactions: FilteredInteractions, threshold) -> None:
         print(f"\nPrefiltering with item {threshold}-core")
-        print(f"The transactions before filtering are {len(data)}")
-        print(f"The items before filtering are {data['itemId'].nunique()}")
-        item_groups = data.groupby(['itemId'])
-        data = item_groups.filter(lambda x: len(x) >= threshold)
-        print(f"The transactions after filtering are {len(data)}")
-        print(f"The items after filtering are {data['itemId'].nunique()}")
-        return data
+        print(f"The transactions before filtering are {len(interactions)}")
+        print(f"The items before filtering are {interactions.nunique(interactions.item_codes)}")
+        interactions.narrow_by_count(interactions.item_codes, lambda size: size >= threshold)
+        print(f"The transactions after filtering are {len(interactions)}")
+        print(f"The items after filtering are {interactions.nunique(interactions.item_codes)}")
 
     @staticmethod
-    def filter_iterative_k_core(d: pd.DataFrame, threshold) -> pd.DataFrame:
-        data = d.copy()
+    def filter_iterative_k_core(interactions: FilteredInteractions, threshold) -> None:
         check_var = True
-        original_length = len(data)
+        original_length = len(interactions)
         print("\n**************************************")
         print(f"Iterative {threshold}-core")
         while check_var:
-            data = PreFilter.filter_users_by_profile_size(data, threshold)
-            data = PreFilter.filter_items_by_popularity(data, threshold)
-            new_length = len(data)
+            PreFilter.filter_users_by_profile_size(interactions, threshold)
+            PreFilter.filter_items_by_popularity(interactions, threshold)
+            new_length = len(interactions)
             if original_length == new_length:
                 check_var = False
             else:
                 original_length = new_length
         print("**************************************\n")
 
-        return data
-
     @staticmethod
-    def filter_rounds_k_core(d: pd.DataFrame, threshold, n_rounds) -> pd.DataFrame:
-        data = d.copy()
+    def filter_rounds_k_core(interactions: FilteredInteractions, threshold, n_rounds) -> None:
         print("\n**************************************")
         print(f"{n_rounds} rounds of user/item {threshold}-core")
         for i in range(n_rounds):
             print(f"Iteration:\t{i}")
-            data = PreFilter.filter_users_by_profile_size(data, threshold)
-            data = PreFilter.filter_items_by_popularity(data, threshold)
+            PreFilter.filter_users_by_profile_size(interactions, threshold)
+            PreFilter.filter_items_by_popularity(interactions, threshold)
         print("**************************************\n")
 
-        return data
-
     @staticmethod
-    def filter_retain_cold_users(d: pd.DataFrame, threshold) -> pd.DataFrame:
-        data = d.copy()
+    def filter_retain_cold_users(interactions: FilteredInteractions, threshold) -> None:
         print(f"\nPrefiltering retaining cold users with {threshold} or less ratings")
-        print(f"The transactions before filtering are {len(data)}")
-        print(f"The users before filtering are {data['userId'].nunique()}")
-        user_groups = data.groupby(['userId'])
-        data = user_groups.filter(lambda x: len(x) <= threshold)
-        print(f"The transactions after filtering are {len(data)}")
-        print(f"The users after filtering are {data['userId'].nunique()}")
-        return data
+        print(f"The transactions before filtering are {len(interactions)}")
+        print(f"The users before filtering are {interactions.nunique(interactions.user_codes)}")
+        interactions.narrow_by_count(interactions.user_codes, lambda size: size <= threshold)
+        print(f"The transactions after filtering are {len(interactions)}")
+        print(f"The users after filtering are {interactions.nunique(interactions.user_codes)}")
 
 
 # import unittest
@@ -100,7 +100,7 @@ class MultiVAE(RecMixin, BaseRecommenderModel):
             loss = 0
             steps = 0
             with tqdm(total=int(self._num_users // self._batch_size), disable=not self._verbose) as t:
-                for batch in self._sampler.step(self._num_users, self._batch_size):
+                for batch in self._sampler.step(self._num_users, self._batch_size, as_sparse=True):
                     steps += 1
 
                     if self._total_anneal_steps > 0:
@@ -118,3 +118,16 @@ class MultiVAE(RecMixin, BaseRecommenderModel):
                     self._update_count += 1
 
             self.evaluate(it, loss/(it + 1))
+
+    def get_recommendations(self, k: int = 100):
+        predictions_top_k_test = {}
+        predictions_top_k_val = {}
+        for index, offset in enumerate(range(0, self._num_users, self._batch_size)):
+            offset_stop = min(offset + self._batch_size, self._num_users)
+            # the encoder reads the training rows as they are stored
+            predictions = self._model.predict(self._sampler.to_sparse_tensor(self._data.sp_i_train[offset:offset_stop]))
+            recs_val, recs_test = self.process_protocol(k, predictions, offset, offset_stop)
+            predictions_top_k_val.update(recs_val)
+            predictions_top_k_test.update(recs_test)
+
+        return predictions_top_k_val, predictions_top_k_test
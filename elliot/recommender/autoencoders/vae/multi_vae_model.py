@@ -53,11 +53,29 @@ class Encoder(layers.Layer):
                                        kernel_regularizer=keras.regularizers.l2(regularization_lambda))
         self.sampling = Sampling()
 
+    def sparse_proj(self, inputs, training=None):
+        """
+        dense_proj of the l2 normalized and dropped out rows of a tf.SparseTensor, computed on its stored values
+        """
+        if not self.dense_proj.built:
+            self.dense_proj.build(inputs.shape)
+        rows = inputs.indices[:, 0]
+        # as keras.backend.l2_normalize, the zeros of the rows do not change their norm
+        squared_norms = tf.math.unsorted_segment_sum(tf.square(inputs.values), rows, inputs.dense_shape[0])
+        values = inputs.values * tf.gather(tf.math.rsqrt(tf.maximum(squared_norms, 1e-12)), rows)
+        values = self.input_dropout(values, training=training)
+        x = tf.sparse.sparse_dense_matmul(tf.SparseTensor(inputs.indices, values, inputs.dense_shape),
+                                          self.dense_proj.kernel)
+        return self.dense_proj.activation(tf.nn.bias_add(x, self.dense_proj.bias))
+
     @tf.function
     def call(self, inputs, training=None):
-        i_normalized = self.l2_normalizer(inputs, 1)
-        i_drop = self.input_dropout(i_normalized, training=training)
-        x = self.dense_proj(i_drop)
+        if isinstance(inputs, tf.SparseTensor):
+            x = self.sparse_proj(inputs, training=training)
+        else:
+            i_normalized = self.l2_normalizer(inputs, 1)
+            i_drop = self.input_dropout(i_normalized, training=training)
+            x = self.dense_proj(i_drop)
         z_mean = self.dense_mean(x)
         z_log_var = self.dense_log_var(x)
         z = self.sampling((z_mean, z_log_var))
@@ -131,8 +149,13 @@ class VariationalAutoEncoder(keras.Model):
             log_softmax_var = tf.nn.log_softmax(logits)
 
             # per-user average negative log-likelihood
-            neg_ll = -tf.reduce_mean(tf.reduce_sum(
-                log_softmax_var * batch, axis=-1))
+            if isinstance(batch, tf.SparseTensor):
+                neg_ll = -tf.reduce_mean(tf.math.unsorted_segment_sum(
+                    batch.values * tf.gather_nd(log_softmax_var, batch.indices), batch.indices[:, 0],
+                    batch.dense_shape[0]))
+            else:
+                neg_ll = -tf.reduce_mean(tf.reduce_sum(
+                    log_softmax_var * batch, axis=-1))
 
             loss = neg_ll + anneal_ph * KL
 
@@ -154,6 +177,5 @@ class VariationalAutoEncoder(keras.Model):
         log_softmax_var = tf.nn.log_softmax(logits)
         return log_softmax_var
 
-    @tf.function
     def get_top_k(self, preds, train_mask, k=100):
-        return tf.nn.top_k(tf.where(train_mask, preds, -np.inf), k=k, sorted=True)
+        return tf.nn.top_k(train_mask.apply(preds), k=k, sorted=True)
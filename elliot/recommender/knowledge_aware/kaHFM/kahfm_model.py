@@ -167,7 +167,7 @@ class KAHFMModel(object):
         self._preds = self._global_bias + self._item_bias + self._user_factors @ self._item_factors.T
 
     def get_all_topks(self, mask, k, user_map, item_map):
-        masking = np.where(mask, self._preds, -np.inf)
+        masking = mask.apply(self._preds)
         partial_index = np.argpartition(masking, -k, axis=1)[:, -k:]
         masking_partition = np.take_along_axis(masking, partial_index, axis=1)
         masking_partition_index = masking_partition.argsort(axis=1)[:, ::-1]
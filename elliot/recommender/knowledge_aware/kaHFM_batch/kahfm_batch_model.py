@@ -93,9 +93,8 @@ class KaHFM_model(keras.Model):
         logits, _ = self.call(inputs=inputs, training=True)
         return logits
 
-    @tf.function
     def get_top_k(self, preds, train_mask, k=100):
-        return tf.nn.top_k(tf.where(train_mask, preds, -np.inf), k=k, sorted=True)
+        return tf.nn.top_k(train_mask.apply(preds), k=k, sorted=True)
 
     def get_config(self):
         raise NotImplementedError
@@ -360,8 +360,7 @@ class KGINModel(keras.Model):
     def rating(self, u_g_embeddings, i_g_embeddings):
         return tf.matmul(u_g_embeddings, tf.transpose(i_g_embeddings))
 
-    @tf.function
     def get_top_k(self, predictions, train_mask, k=100):
-        return tf.nn.top_k(tf.where(train_mask, predictions, -np.inf), k=k, sorted=True)
+        return tf.nn.top_k(train_mask.apply(predictions), k=k, sorted=True)
 
 
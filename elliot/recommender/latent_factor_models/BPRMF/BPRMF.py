@@ -88,7 +88,7 @@ class BPRMF(RecMixin, BaseRecommenderModel):
                               self._positive_item_regularization,
                               self._negative_item_regularization,
                               self._seed)
-        self._sampler = cs.Sampler(self._data.i_train_dict)
+        self._sampler = cs.Sampler(self._data.user_items)
 
     def get_recommendations(self, k: int = 10):
         predictions = self._model.get_all_recs()
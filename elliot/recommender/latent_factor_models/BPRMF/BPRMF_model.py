@@ -72,7 +72,7 @@ class MFModel(object):
         return predictions
 
     def get_all_topks(self, mask, k, user_map, item_map, predictions):
-        masking = np.where(mask, predictions, -np.inf)
+        masking = mask.apply(predictions)
         partial_index = np.argpartition(masking, -k, axis=1)[:, -k:]
         masking_partition = np.take_along_axis(masking, partial_index, axis=1)
         masking_partition_index = masking_partition.argsort(axis=1)[:, ::-1]
@@ -83,9 +83,8 @@ class BPRMF_batch_model(keras.Model):
     def predict(self, start, stop,  **kwargs):
         return self.Bi + tf.matmul(self.Gu[start:stop], self.Gi, transpose_b=True)
 
-    @tf.function
     def get_top_k(self, predictions, train_mask, k=100):
-        return tf.nn.top_k(tf.where(train_mask, predictions, -np.inf), k=k, sorted=True)
+        return tf.nn.top_k(train_mask.apply(predictions), k=k, sorted=True)
 
     @tf.function
     def get_positions(self, predictions, train_mask, items, inner_test_user_true_mask):
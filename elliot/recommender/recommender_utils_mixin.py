@@ -81,8 +81,25 @@ class RecMixin(object):
             return self.get_single_recommendation(self.get_candidate_mask(validation=True), k, *args) if hasattr(self._data, "val_dict") else {}, \
                    self.get_single_recommendation(self.get_candidate_mask(), k, *args)
 
+    def process_candidates_protocol(self, k, score_candidates, offset, offset_stop):
+        """
+        process_protocol with negative sampling, scoring only the candidates of each user instead of the catalog
+        :param score_candidates: function of the users and items (private ids) of the candidate pairs returning
+        their scores as a numpy array, the same scores as the full predictions
+        """
+        def recommend(mask):
+            mask = mask.batch(offset, offset_stop)
+            users, items = mask.stored_positions()
+            v, i = mask.top_k_candidates(score_candidates(users + offset, items), k)
+            items_ratings_pair = [list(zip(map(self._data.private_items.get, u_list[0].tolist()), u_list[1]))
+                                  for u_list in zip(i, v)]
+            return dict(zip(map(self._data.private_users.get, range(offset, offset_stop)), items_ratings_pair))
+
+        return recommend(self.get_candidate_mask(validation=True)) if hasattr(self._data, "val_dict") else {}, \
+            recommend(self.get_candidate_mask())
+
     def get_single_recommendation(self, mask, k, predictions, offset, offset_stop):
-        v, i = self._model.get_top_k(predictions, mask[offset: offset_stop], k=k)
+        v, i = self._model.get_top_k(predictions, mask.batch(offset, offset_stop), k=k)
         items_ratings_pair = [list(zip(map(self._data.private_items.get, u_list[0]), u_list[1]))
                               for u_list in list(zip(i.numpy(), v.numpy()))]
         return dict(zip(map(self._data.private_users.get, range(offset, offset_stop)), items_ratings_pair))
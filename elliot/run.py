@@ -15,6 +15,7 @@ import numpy as np
 from hyperopt import Trials, fmin
 
 import elliot.hyperoptimization as ho
+from elliot.dataset import dataset_cache
 from elliot.namespace.namespace_model_builder import NameSpaceBuilder
 from elliot.result_handler.result_handler import ResultHandler, HyperParameterStudy, StatTest
 from elliot.utils import logging as logging_project
@@ -59,8 +60,8 @@ def run_experiment(config_path: str = ''):
     res_handler = ResultHandler(rel_threshold=base.base_namespace.evaluation.relevance_threshold)
     hyper_handler = HyperParameterStudy(rel_threshold=base.base_namespace.evaluation.relevance_threshold)
     dataloader_class = getattr(importlib.import_module("elliot.dataset"), base.base_namespace.data_config.dataloader)
-    dataloader = dataloader_class(config=base.base_namespace)
-    data_test_list = dataloader.generate_dataobjects()
+    # the DataSet objects are reused by the next run_experiment calls on the same data configuration
+    data_test_list = dataset_cache.load_data(dataloader_class, base.base_namespace)
     all_trials = {}
     for key, model_base in builder.models():
         test_results = []
@@ -1,7 +1,6 @@
 import typing as t
 import pandas as pd
 import numpy as np
-import math
 import shutil
 import os
 
@@ -199,118 +198,133 @@ class Splitter:
     def generic_split_function(self, data: pd.DataFrame, **kwargs) -> t.List[t.Tuple[pd.DataFrame, pd.DataFrame]]:
         pass
 
-    def fold_list_generator(self, length, folds=5):
-        def infinite_looper(folds=5):
-            while True:
-                for f in range(folds):
-                    yield f
-
-        looper = infinite_looper(folds)
-        return [next(looper) for _ in range(length)]
+    def user_positions(self, data: pd.DataFrame) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The rows of each user, as iterated by data.groupby(['userId']): the users in ascending order, their rows in
+        order of appearance.
+        :return: the row positions grouped by user, the boundaries of each user in them and the user code of each
+        row (-1 for a missing user id, left out of every split as by groupby)
+        """
+        user_codes, _ = pd.factorize(data["userId"], sort=True)
+        order = np.argsort(user_codes, kind='stable')
+        order = order[user_codes[order] >= 0]
+        indptr = np.zeros(user_codes.max(initial=-1) + 2, dtype=np.int64)
+        np.cumsum(np.bincount(user_codes[order], minlength=len(indptr) - 1), out=indptr[1:])
+        return order, indptr, user_codes
+
+    def split_by_flag(self, data: pd.DataFrame, test_flag: np.ndarray) -> t.Tuple[pd.DataFrame, pd.DataFrame]:
+        # test_flag is 1 for test, 0 for train and -1 for the rows of neither
+        test = data[test_flag == 1].reset_index(drop=True)
+        train = data[test_flag == 0].reset_index(drop=True)
+        return train, test
 
     def splitting_kfolds(self, data: pd.DataFrame, folds=5):
         tuple_list = []
-        user_groups = data.groupby(['userId'])
-        for name, group in user_groups:
-            data.loc[group.index, 'fold'] = self.fold_list_generator(len(group), folds)
-        data["fold"] = pd.to_numeric(data["fold"], downcast='integer')
+        # the rows of each user are dealt to the folds in turn, in order of appearance
+        order, indptr, user_codes = self.user_positions(data)
+        fold = np.full(len(data), -1, dtype=np.int64)
+        fold[order] = (np.arange(len(order)) - np.repeat(indptr[:-1], np.diff(indptr))) % folds
         for i in range(folds):
-            test = data[data["fold"] == i].drop(columns=["fold"]).reset_index(drop=True)
-            train = data[data["fold"] != i].drop(columns=["fold"]).reset_index(drop=True)
-            tuple_list.append((train, test))
+            tuple_list.append(self.split_by_flag(data, np.where(fold < 0, -1, (fold == i).astype(np.int64))))
         return tuple_list
 
+    def temporal_ranks(self, data: pd.DataFrame, ascending=True) -> np.ndarray:
+        # rank of each row by timestamp within its user, ties in order of appearance, nan for a missing timestamp
+        return data.groupby(['userId'])['timestamp'].rank(method='first', ascending=ascending).to_numpy()
+
     def splitting_temporal_holdout(self, d: pd.DataFrame, ratio=0.2):
         tuple_list = []
-        data = d.copy()
-        user_size = data.groupby(['userId'], as_index=True).size()
-        user_threshold = user_size.apply(lambda x: math.floor(x * (1 - ratio)))
-        data['rank_first'] = data.groupby(['userId'])['timestamp'].rank(method='first', ascending=True, axis=1)
-        data["test_flag"] = data.apply(
-            lambda x: x["rank_first"] > user_threshold.loc[x["userId"]], axis=1)
-        test = data[data["test_flag"] == True].drop(columns=["rank_first", "test_flag"]).reset_index(drop=True)
-        train = data[data["test_flag"] == False].drop(columns=["rank_first", "test_flag"]).reset_index(drop=True)
-        tuple_list.append((train, test))
+        user_size = d.groupby(['userId'])['userId'].transform('count').to_numpy()
+        user_threshold = np.floor(user_size * (1 - ratio))
+        test_flag = self.temporal_ranks(d, ascending=True) > user_threshold
+        tuple_list.append(self.split_by_flag(d, test_flag.astype(np.int64)))
         return tuple_list
 
     def splitting_temporal_leavenout(self, d: pd.DataFrame, n=1):
         tuple_list = []
-        data = d.copy()
-        data['rank_first'] = data.groupby(['userId'])['timestamp'].rank(method='first', ascending=False, axis=1)
-        data["test_flag"] = data.apply(
-            lambda x: x["rank_first"] <= n, axis=1)
-        test = data[data["test_flag"] == True].drop(columns=["rank_first", "test_flag"]).reset_index(drop=True)
-        train = data[data["test_flag"] == False].drop(columns=["rank_first", "test_flag"]).reset_index(drop=True)
-        tuple_list.append((train, test))
+        test_flag = self.temporal_ranks(d, ascending=False) <= n
+        tuple_list.append(self.split_by_flag(d, test_flag.astype(np.int64)))
         return tuple_list
 
     def splitting_passed_timestamp(self, d: pd.DataFrame, timestamp=1):
         tuple_list = []
-        data = d.copy()
-        data["test_flag"] = data.apply(lambda x: x["timestamp"] >= timestamp, axis=1)
-        test = data[data["test_flag"] == True].drop(columns=["test_flag"]).reset_index(drop=True)
-        train = data[data["test_flag"] == False].drop(columns=["test_flag"]).reset_index(drop=True)
-        tuple_list.append((train, test))
+        test_flag = (d["timestamp"] >= timestamp).to_numpy()
+        tuple_list.append(self.split_by_flag(d, test_flag.astype(np.int64)))
         return tuple_list
 
-    def subsampling_list_generator(self, length, ratio=0.2):
-        train = int(math.floor(length * (1 - ratio)))
-        test = length - train
-        list_ = [0] * train + [1] * test
-        np.random.shuffle(list_)
-        return list_
+    def shuffled_test_flags(self, data: pd.DataFrame, test_sizes: t.Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """
+        Flag a random subset of the rows of each user as test: test_sizes(sizes) rows out of the sizes rows of each
+        user. Each user is shuffled with np.random.shuffle, in the order of data.groupby(['userId']), so that the
+        splits of a seed are the same as when the per-user lists were shuffled one by one.
+        """
+        order, indptr, _ = self.user_positions(data)
+        sizes = np.diff(indptr)
+        tests = test_sizes(sizes)
+        if (tests > sizes).any():
+            raise ValueError(f"A user has fewer interactions than the {tests.max()} to hold out")
+        test_flag = np.full(len(data), -1, dtype=np.int64)
+        flags = np.zeros(len(order), dtype=np.int64)
+        for start, end, test in zip(indptr[:-1].tolist(), indptr[1:].tolist(), tests.tolist()):
+            user_flags = flags[start:end]
+            user_flags[end - start - test:] = 1
+            np.random.shuffle(user_flags)
+        test_flag[order] = flags
+        return test_flag
 
     def splitting_randomsubsampling_kfolds(self, d: pd.DataFrame, folds=5, ratio=0.2):
         tuple_list = []
-        data = d.copy()
-        user_groups = data.groupby(['userId'])
         for i in range(folds):
-            for name, group in user_groups:
-                data.loc[group.index, 'test_flag'] = self.subsampling_list_generator(len(group), ratio)
-            data["test_flag"] = pd.to_numeric(data["test_flag"], downcast='integer')
-            test = data[data["test_flag"] == 1].drop(columns=["test_flag"]).reset_index(drop=True)
-            train = data[data["test_flag"] == 0].drop(columns=["test_flag"]).reset_index(drop=True)
-            tuple_list.append((train, test))
+            test_flag = self.shuffled_test_flags(
+                d, lambda sizes: sizes - np.floor(sizes * (1 - ratio)).astype(np.int64))
+            tuple_list.append(self.split_by_flag(d, test_flag))
         return tuple_list
 
-    def subsampling_leavenout_list_generator(self, length, n=1):
-        test = n
-        train = length - test
-        list_ = [0] * train + [1] * test
-        np.random.shuffle(list_)
-        return list_
-
     def splitting_randomsubsampling_kfolds_leavenout(self, d: pd.DataFrame, folds=5, n=1):
         tuple_list = []
-        data = d.copy()
-        user_groups = data.groupby(['userId'])
         for i in range(folds):
-            for name, group in user_groups:
-                data.loc[group.index, 'test_flag'] = self.subsampling_leavenout_list_generator(len(group), n)
-            data["test_flag"] = pd.to_numeric(data["test_flag"], downcast='integer')
-            test = data[data["test_flag"] == 1].drop(columns=["test_flag"]).reset_index(drop=True)
-            train = data[data["test_flag"] == 0].drop(columns=["test_flag"]).reset_index(drop=True)
-            tuple_list.append((train, test))
+            test_flag = self.shuffled_test_flags(d, lambda sizes: np.full(len(sizes), n, dtype=np.int64))
+            tuple_list.append(self.split_by_flag(d, test_flag))
         return tuple_list
 
     def splitting_best_timestamp(self, d: pd.DataFrame, min_below=1, min_over=1):
-        data = d.copy()
-        unique_timestamps = data["timestamp"].unique()
-        user_groups = data.groupby(['userId'])
-        ts_dict = {}
-        nuniques = len(unique_timestamps)
-        i = 0
-        for ts in unique_timestamps:
-            print(nuniques - i)
-            i += 1
-            ts_dict[ts] = 0
-            for name, group in user_groups:
-                below = group[group["timestamp"] < ts]["timestamp"].count()
-                over = len(group) - below
-                if (below >= min_below) and (over >= min_over):
-                    ts_dict[ts] += 1
-        max_val = max(ts_dict.values())
-        best_tie = [ts for ts,v in ts_dict.items() if v == max_val]
+        """
+        Split at the timestamp leaving the largest number of users with at least min_below interactions before it
+        and at least min_over from it on, the latest one among ties.
+
+        The users satisfied by a timestamp ts are counted without scanning them: with t_1 <= ... <= t_m the
+        timestamps of a user and size its number of interactions, below = #{t_j < ts} is in [min_below,
+        size - min_over] exactly when ts is in the interval (t_min_below, t_(size - min_over + 1)]. The count of every
+        candidate timestamp is then a difference of two searches in the sorted interval bounds.
+        """
+        unique_timestamps = d["timestamp"].unique()
+        order, indptr, user_codes = self.user_positions(d)
+        timestamps = d["timestamp"].to_numpy(dtype=np.float64)
+        sizes = np.diff(indptr)
+        # timestamps ascending within each user, the missing ones last (never below any timestamp)
+        order = np.lexsort((timestamps, user_codes))[len(user_codes) - len(order):]
+        sorted_timestamps = timestamps[order]
+        counted = np.bincount(user_codes[order][~np.isnan(sorted_timestamps)], minlength=len(sizes))
+
+        low_rank = max(min_below, 0)
+        high_rank = sizes - min_over
+        valid = (low_rank <= high_rank) & (low_rank <= counted)
+
+        def bound(rank, default):
+            # the rank-th smallest timestamp of each user (1-based), default when out of range
+            values = np.full(len(sizes), default)
+            inside = (rank >= 1) & (rank <= counted)
+            values[inside] = sorted_timestamps[(indptr[:-1] + rank - 1)[inside]]
+            return np.sort(values[valid])
+
+        low = bound(np.full(len(sizes), low_rank), -np.inf)
+        high = bound(high_rank + 1, np.inf)
+        candidates = unique_timestamps.astype(np.float64)
+        counts = np.searchsorted(low, candidates, side='left') - np.searchsorted(high, candidates, side='left')
+        # a missing timestamp is compared as never greater: every interaction is over it
+        counts[np.isnan(candidates)] = np.count_nonzero(valid & (low_rank == 0))
+
+        best_tie = unique_timestamps[counts == counts.max()].tolist()
         max_ts = max(best_tie)
         print(f"Best Timestamp: {max_ts}")
         return self.splitting_passed_timestamp(d, max_ts)
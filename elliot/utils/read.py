@@ -12,8 +12,12 @@ import configparser
 import pickle
 import numpy as np
 import os
+import struct
+import zipfile
 from types import SimpleNamespace
 
+from elliot.utils.write import save_clustering_npz
+
 
 def read_csv(filename):
     """
@@ -36,6 +40,75 @@ def read_np(filename):
     return np.load(filename)
 
 
+def read_npz_mmap(filename):
+    """
+    Args:
+        filename (str): filename of the npz to load
+    Return:
+        A dict with the arrays of the npz, memory mapped from the file when they are stored uncompressed (np.savez),
+        read in memory otherwise (np.savez_compressed).
+    """
+    arrays = {}
+    with zipfile.ZipFile(filename) as archive, open(filename, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+            # the data of a stored member follows its local header: 30 bytes, then the file name and extra field
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject or len(shape) == 0 or np.prod(shape) == 0:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+            else:
+                arrays[name] = np.memmap(filename, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+def read_split_npz(filename, column_names=('userId', 'itemId', 'rating')):
+    """
+    Args:
+        filename (str): npz file path, as stored by write.save_split_npz
+        column_names: names of the user, item and rating columns
+    Return:
+         A pandas dataframe equal to the one read with pd.read_csv from the headerless tsv of the same split.
+    """
+    arrays = read_npz_mmap(filename)
+    return pd.DataFrame({column_names[0]: arrays['user_ids'][arrays['user_codes']],
+                         column_names[1]: arrays['item_ids'][arrays['item_codes']],
+                         column_names[2]: arrays['ratings'].astype(np.dtype(str(arrays['rating_dtype'])))})
+
+
+def read_clustering(filename, names=None):
+    """
+    Args:
+        filename (str): clustering file path, a headerless entity/group tsv or an npz stored by
+            write.save_clustering_npz. A missing npz is created once from the tsv with the same name.
+        names: names of the entity and group columns, 0 and 1 by default
+    Return:
+         A pandas dataframe with the entity and group columns, as parsed from the headerless tsv.
+    """
+    names = list(names) if names is not None else [0, 1]
+    if not filename.endswith('.npz'):
+        return pd.read_csv(filename, sep="\t", header=None, names=names)
+    if not os.path.isfile(filename):
+        tmp_path = f"{filename}.tmp-{os.getpid()}"
+        save_clustering_npz(pd.read_csv(os.path.splitext(filename)[0] + ".tsv", sep="\t", header=None), tmp_path)
+        os.replace(tmp_path, filename)
+    arrays = read_npz_mmap(filename)
+    return pd.DataFrame({names[0]: np.asarray(arrays['entity_ids']).astype(np.dtype(str(arrays['id_dtype']))),
+                         names[1]: np.asarray(arrays['groups']).astype(np.int64)})
+
+
 def read_imagenet_classes_txt(filename):
     """
     Args:
@@ -8,6 +8,7 @@ __author__ = 'Vito Walter Anelli, Claudio Pomo'
 __email__ = 'vitowalter.anelli@poliba.it, claudio.pomo@poliba.it'
 
 import numpy as np
+import pandas as pd
 import pickle
 
 
@@ -32,6 +33,52 @@ def save_np(npy, filename):
     np.save(filename, npy)
 
 
+def save_split_npz(dataframe, filename):
+    """
+    Store a split as an uncompressed npz, the binary counterpart of a headerless user/item/rating tsv.
+    The file holds int32 user and item codes, the ratings (float32 when lossless), the id of each code and the
+    original dtype of the ratings. It is loaded without parsing, and memory mapped, by read.read_split_npz.
+    Args:
+        dataframe: split whose first three columns are user, item and rating
+        filename (str): npz file path, written as it is (no extension is appended)
+    """
+    arrays = {}
+    for name, column in zip(['user', 'item'], [dataframe.iloc[:, 0], dataframe.iloc[:, 1]]):
+        codes, ids = pd.factorize(column, sort=True)
+        ids = ids.to_numpy()
+        arrays[name + '_codes'] = codes.astype(np.int32)
+        arrays[name + '_ids'] = ids.astype(str) if ids.dtype == object else ids
+    ratings = dataframe.iloc[:, 2].to_numpy()
+    arrays['ratings'] = ratings.astype(np.float32)
+    if not np.array_equal(arrays['ratings'], ratings, equal_nan=ratings.dtype.kind == 'f'):
+        arrays['ratings'] = ratings.astype(np.float64)
+    arrays['rating_dtype'] = np.array(ratings.dtype.str)
+    with open(filename, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def save_clustering_npz(dataframe, filename):
+    """
+    Store a clustering as an uncompressed npz, the binary counterpart of a headerless entity/group tsv.
+    The file holds the entity ids (int32 when they fit) and their groups as int16. It is loaded without parsing
+    by read.read_clustering.
+    Args:
+        dataframe: clustering whose first two columns are entity id and group
+        filename (str): npz file path, written as it is (no extension is appended)
+    """
+    ids = dataframe.iloc[:, 0].to_numpy()
+    groups = dataframe.iloc[:, 1].to_numpy()
+    int32 = np.iinfo(np.int32)
+    if ids.dtype.kind in 'iu' and (len(ids) == 0 or int32.min <= ids.min() and ids.max() <= int32.max):
+        ids = ids.astype(np.int32)
+    elif ids.dtype == object:
+        ids = ids.astype(str)
+    group_dtype = np.int16 if len(groups) == 0 or groups.max() <= np.iinfo(np.int16).max else np.int32
+    with open(filename, 'wb') as f:
+        np.savez(f, entity_ids=ids, groups=groups.astype(group_dtype),
+                 id_dtype=np.array(dataframe.iloc[:, 0].dtype.str))
+
+
 def store_recommendation(recommendations, path=""):
     """
     Store recommendation list (top-k)
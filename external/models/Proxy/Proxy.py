@@ -51,21 +51,14 @@ class ProxyRecommender(RecMixin, BaseRecommenderModel):
         return predictions_top_k_val, predictions_top_k_test
 
     def get_single_recommendation(self, mask, k):
-
-        nonzero = mask.nonzero()
-        candidate_items = {}
-        [candidate_items.setdefault(self._data.private_users[user], set()).add(self._data.private_items[item]) for user, item in zip(*nonzero)]
-        recs = {}
-        for u, user_recs in self._recommendations.items():
-            user_cleaned_recs = []
-            user_candidate_items = candidate_items[u]
-            for p, (item, prediction) in enumerate(user_recs):
-                if p >= k:
-                    break
-                if item in user_candidate_items:
-                    user_cleaned_recs.append((item, prediction))
-            recs[u] = user_cleaned_recs
-        return recs
+        # the first k recommendations of each user are kept if they are candidates, checked at once on the sparse mask
+        users, top_k = zip(*((u, user_recs[:k]) for u, user_recs in self._recommendations.items())) \
+            if self._recommendations else ((), ())
+        rows = np.repeat([self._data.public_users[u] for u in users], [len(user_recs) for user_recs in top_k])
+        cols = np.array([self._data.public_items.get(item, -1) for user_recs in top_k for item, _ in user_recs])
+        candidates = (cols >= 0) & mask.contains(rows, np.maximum(cols, 0)) if len(cols) else np.zeros(0, dtype=bool)
+        candidates = iter(candidates.tolist())
+        return {u: [rec for rec in user_recs if next(candidates)] for u, user_recs in zip(users, top_k)}
 
     def read_recommendations(self, path):
         recs = {}
@@ -13,6 +13,7 @@ from tqdm import tqdm
 import math
 
 from elliot.dataset.samplers import custom_sampler as cs
+from elliot.dataset.samplers.prefetch_sampler import PrefetchSampler
 from elliot.utils.write import store_recommendation
 
 from elliot.recommender import BaseRecommenderModel
@@ -72,7 +73,7 @@ class BPRMF(RecMixin, BaseRecommenderModel):
 
         self._ratings = self._data.train_dict
 
-        self._sampler = cs.Sampler(self._data.i_train_dict, self._seed)
+        self._sampler = cs.Sampler(self._data.user_items, self._seed)
 
         self._model = BPRMFModel(self._num_users,
                                  self._num_items,
@@ -80,6 +81,9 @@ class BPRMF(RecMixin, BaseRecommenderModel):
                                  self._factors,
                                  self._l_w,
                                  self._seed)
+        if self._prefetch:
+            self._sampler = PrefetchSampler(self._sampler, self._prefetch,
+                                            convert=PrefetchSampler.to_torch(self._model.device))
 
     @property
     def name(self):
@@ -105,6 +109,9 @@ class BPRMF(RecMixin, BaseRecommenderModel):
                     t.set_postfix({'loss': f'{loss / steps:.5f}'})
                     t.update()
 
+            if self._prefetch:
+                self.logger.debug(f"Prefetching: {self._sampler.starved} of {self._sampler.batches} batches waited "
+                                  f"{self._sampler.wait_time:.3f}s")
             self.evaluate(it, loss / (it + 1))
 
     def get_recommendations(self, k: int = 100):
@@ -112,16 +119,21 @@ class BPRMF(RecMixin, BaseRecommenderModel):
         predictions_top_k_val = {}
         for index, offset in enumerate(range(0, self._num_users, self._batch_size)):
             offset_stop = min(offset + self._batch_size, self._num_users)
-            predictions = self._model.predict(offset, offset_stop)
-            recs_val, recs_test = self.process_protocol(k, predictions, offset, offset_stop)
+            if self._negative_sampling:
+                # only the sampled candidates of each user are scored
+                recs_val, recs_test = self.process_candidates_protocol(k, self._model.predict_pairs, offset,
+                                                                       offset_stop)
+            else:
+                predictions = self._model.predict(offset, offset_stop)
+                recs_val, recs_test = self.process_protocol(k, predictions, offset, offset_stop)
             predictions_top_k_val.update(recs_val)
             predictions_top_k_test.update(recs_test)
         return predictions_top_k_val, predictions_top_k_test
 
     def get_single_recommendation(self, mask, k, predictions, offset, offset_stop):
-        v, i = self._model.get_top_k(predictions, mask[offset: offset_stop], k=k)
-        items_ratings_pair = [list(zip(map(self._data.private_items.get, u_list[0]), u_list[1]))
-                              for u_list in list(zip(i.detach().cpu().numpy(), v.detach().cpu().numpy()))]
+        v, i = self._model.get_top_k(predictions, mask.batch(offset, offset_stop), k=k)
+        items_ratings_pair = [list(zip(map(self._data.private_items.get, u_list[0].tolist()), u_list[1]))
+                              for u_list in zip(i, v)]
         return dict(zip(map(self._data.private_users.get, range(offset, offset_stop)), items_ratings_pair))
 
     def evaluate(self, it=None, loss=0):
@@ -36,6 +36,7 @@ class BPRMFModel(torch.nn.Module, ABC):
         torch.backends.cudnn.deterministic = True
 
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.top_k_buffers = {}
 
         self.num_users = num_users
         self.num_items = num_items
@@ -65,6 +66,17 @@ class BPRMFModel(torch.nn.Module, ABC):
         return torch.matmul(self.Gu.weight[start:stop].to(self.device),
                             torch.transpose(self.Gi.weight.to(self.device), 0, 1))
 
+    def predict_pairs(self, users, items, **kwargs):
+        """
+        The predictions of the (user, item) pairs only, the entries of predict over the whole catalog up to the rounding
+        of the sums
+        """
+        users = torch.as_tensor(users, dtype=torch.int64, device=self.device)
+        items = torch.as_tensor(items, dtype=torch.int64, device=self.device)
+        with torch.no_grad():
+            return torch.sum(self.Gu.weight.to(self.device)[users] * self.Gi.weight.to(self.device)[items],
+                             1).cpu().numpy()
+
     def train_step(self, batch):
         user, pos, neg = batch
         xu_pos, gamma_u, gamma_i_pos = self.forward(inputs=(user, pos))
@@ -83,5 +95,4 @@ class BPRMFModel(torch.nn.Module, ABC):
         return loss.detach().cpu().numpy()
 
     def get_top_k(self, preds, train_mask, k=100):
-        return torch.topk(torch.where(torch.tensor(train_mask).to(self.device), preds.to(self.device),
-                                      torch.tensor(-np.inf).to(self.device)), k=k, sorted=True)
\ No newline at end of file
+        return train_mask.top_k(preds.to(self.device), k, self.top_k_buffers)
\ No newline at end of file
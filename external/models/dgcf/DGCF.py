@@ -80,9 +80,8 @@ class DGCF(RecMixin, BaseRecommenderModel):
         ]
         self.autoset_params()
 
-        row, col = data.sp_i_train.nonzero()
-        col = [c + self._num_users for c in col]
-        self.edge_index = np.array([list(row) + col, col + list(row)])
+        # both directions of every user-item edge
+        self.edge_index = np.concatenate([data.user_item_edges, data.user_item_edges[::-1]], axis=1)
 
         self._model = DGCFModel(
             num_users=self._num_users,
@@ -140,9 +139,9 @@ class DGCF(RecMixin, BaseRecommenderModel):
         return predictions_top_k_val, predictions_top_k_test
 
     def get_single_recommendation(self, mask, k, predictions, offset, offset_stop):
-        v, i = self._model.get_top_k(predictions, mask[offset: offset_stop], k=k)
-        items_ratings_pair = [list(zip(map(self._data.private_items.get, u_list[0]), u_list[1]))
-                              for u_list in list(zip(i.detach().cpu().numpy(), v.detach().cpu().numpy()))]
+        v, i = self._model.get_top_k(predictions, mask.batch(offset, offset_stop), k=k)
+        items_ratings_pair = [list(zip(map(self._data.private_items.get, u_list[0].tolist()), u_list[1]))
+                              for u_list in zip(i, v)]
         return dict(zip(map(self._data.private_users.get, range(offset, offset_stop)), items_ratings_pair))
 
     def evaluate(self, it=None, loss=0):
@@ -45,6 +45,7 @@ class DGCFModel(torch.nn.Module, ABC):
         torch.backends.cudnn.deterministic = True
 
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.top_k_buffers = {}
 
         self.num_users = num_users
         self.num_items = num_items
@@ -234,5 +235,4 @@ class DGCFModel(torch.nn.Module, ABC):
         return loss.detach().cpu().numpy()
 
     def get_top_k(self, preds, train_mask, k=100):
-        return torch.topk(torch.where(torch.tensor(train_mask).to(self.device), preds.to(self.device),
-                                      torch.tensor(-np.inf).to(self.device)), k=k, sorted=True)
+        return train_mask.top_k(preds.to(self.device), k, self.top_k_buffers)
@@ -31,6 +31,7 @@ class KGCNModel(torch.nn.Module, ABC):
         torch.backends.cudnn.deterministic = True
 
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.top_k_buffers = {}
 
         self.embedding_size = embed_k
         self.aggregator_class = aggr
@@ -255,5 +256,4 @@ class KGCNModel(torch.nn.Module, ABC):
         return torch.mul(user_e, item_e.to(self.device)).sum(dim=1).view(batch_user, batch_item)
 
     def get_top_k(self, preds, train_mask, k=100):
-        return torch.topk(torch.where(torch.tensor(train_mask).to(self.device), torch.tensor(preds).to(self.device),
-                                      torch.tensor(-np.inf).to(self.device)), k=k, sorted=True)
+        return train_mask.top_k(torch.as_tensor(preds).to(self.device), k, self.top_k_buffers)
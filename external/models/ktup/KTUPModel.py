@@ -285,9 +285,8 @@ class jtup(keras.Model):
         #     score = tf.reduce_sum((proj_u_e + r_e - proj_i_e) ** 2, -1)
         return tf.squeeze(score)
 
-    @tf.function
     def get_top_k(self, preds, train_mask, k=100):
-        return tf.nn.top_k(tf.where(train_mask, preds, -np.inf), k=k, sorted=True)
+        return tf.nn.top_k(train_mask.apply(preds), k=k, sorted=True)
 
     @tf.function
     def bprLoss(self, pos, neg, target=1.0):
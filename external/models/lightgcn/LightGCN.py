@@ -4,7 +4,8 @@ import torch
 import os
 
 from elliot.utils.write import store_recommendation
-from .custom_sampler import Sampler
+from elliot.dataset.samplers import custom_sampler as cs
+from elliot.dataset.samplers.prefetch_sampler import PrefetchSampler
 from elliot.recommender import BaseRecommenderModel
 from elliot.recommender.base_recommender_model import init_charger
 from elliot.recommender.recommender_utils_mixin import RecMixin
@@ -28,6 +29,8 @@ class LightGCN(RecMixin, BaseRecommenderModel):
         batch_size: Batch size
         l_w: Regularization coefficient
         n_layers: Number of stacked propagation layers
+        subgraph: Propagate each batch on the subgraph of its users and items only, with the same embeddings. Off by
+            default, its speed against the full propagation has not been measured yet
 
     To include the recommendation model, add it to the config file adopting the following pattern:
 
@@ -57,15 +60,13 @@ class LightGCN(RecMixin, BaseRecommenderModel):
             ("_normalize", "normalize", "normalize", True, bool, None)
         ]
         self.autoset_params()
+        self._subgraph = getattr(self._params, "subgraph", False)
 
-        self._sampler = Sampler(self._data.i_train_dict, seed=self._seed)
+        self._sampler = cs.Sampler(self._data.user_items, seed=self._seed)
         if self._batch_size < 1:
             self._batch_size = self._num_users
 
-        row, col = data.sp_i_train.nonzero()
-        col = [c + self._num_users for c in col]
-        edge_index = np.array([row, col])
-        edge_index = torch.tensor(edge_index, dtype=torch.int64)
+        edge_index = torch.tensor(data.user_item_edges, dtype=torch.int64)
         self.adj = SparseTensor(row=torch.cat([edge_index[0], edge_index[1]], dim=0),
                                 col=torch.cat([edge_index[1], edge_index[0]], dim=0),
                                 sparse_sizes=(self._num_users + self._num_items,
@@ -80,8 +81,12 @@ class LightGCN(RecMixin, BaseRecommenderModel):
             n_layers=self._n_layers,
             adj=self.adj,
             normalize=self._normalize,
-            random_seed=self._seed
+            random_seed=self._seed,
+            subgraph=self._subgraph
         )
+        if self._prefetch:
+            self._sampler = PrefetchSampler(self._sampler, self._prefetch,
+                                            convert=PrefetchSampler.to_torch(self._model.device))
 
     @property
     def name(self):
@@ -98,7 +103,7 @@ class LightGCN(RecMixin, BaseRecommenderModel):
             steps = 0
             n_batch = int(self._data.transactions / self._batch_size) if self._data.transactions % self._batch_size == 0 else int(self._data.transactions / self._batch_size) + 1
             with tqdm(total=n_batch, disable=not self._verbose) as t:
-                for batch in self._sampler.step(self._data.transactions, self._batch_size):
+                for batch in self._sampler.step(self._data.transactions, self._batch_size, as_tensor=True):
                     steps += 1
                     loss += self._model.train_step(batch)
 
@@ -108,6 +113,9 @@ class LightGCN(RecMixin, BaseRecommenderModel):
                     t.set_postfix({'loss': f'{loss / steps:.5f}'})
                     t.update()
 
+            if self._prefetch:
+                self.logger.debug(f"Prefetching: {self._sampler.starved} of {self._sampler.batches} batches waited "
+                                  f"{self._sampler.wait_time:.3f}s")
             self.evaluate(it, loss / (it + 1))
 
     def get_recommendations(self, k: int = 100):
@@ -116,16 +124,21 @@ class LightGCN(RecMixin, BaseRecommenderModel):
         gu, gi = self._model.propagate_embeddings(evaluate=True)
         for index, offset in enumerate(range(0, self._num_users, self._batch_size)):
             offset_stop = min(offset + self._batch_size, self._num_users)
-            predictions = self._model.predict(gu[offset: offset_stop], gi)
-            recs_val, recs_test = self.process_protocol(k, predictions, offset, offset_stop)
+            if self._negative_sampling:
+                # only the sampled candidates of each user are scored
+                recs_val, recs_test = self.process_candidates_protocol(
+                    k, lambda users, items: self._model.predict_pairs(gu, gi, users, items), offset, offset_stop)
+            else:
+                predictions = self._model.predict(gu[offset: offset_stop], gi)
+                recs_val, recs_test = self.process_protocol(k, predictions, offset, offset_stop)
             predictions_top_k_val.update(recs_val)
             predictions_top_k_test.update(recs_test)
         return predictions_top_k_val, predictions_top_k_test
 
     def get_single_recommendation(self, mask, k, predictions, offset, offset_stop):
-        v, i = self._model.get_top_k(predictions, mask[offset: offset_stop], k=k)
-        items_ratings_pair = [list(zip(map(self._data.private_items.get, u_list[0]), u_list[1]))
-                              for u_list in list(zip(i.detach().cpu().numpy(), v.detach().cpu().numpy()))]
+        v, i = self._model.get_top_k(predictions, mask.batch(offset, offset_stop), k=k)
+        items_ratings_pair = [list(zip(map(self._data.private_items.get, u_list[0].tolist()), u_list[1]))
+                              for u_list in zip(i, v)]
         return dict(zip(map(self._data.private_users.get, range(offset, offset_stop)), items_ratings_pair))
 
     def evaluate(self, it=None, loss=0):
@@ -1,6 +1,7 @@
 from abc import ABC
 
 from torch_geometric.nn import LGConv
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
 import torch
 import torch_geometric
 import numpy as np
@@ -18,6 +19,7 @@ class LightGCNModel(torch.nn.Module, ABC):
                  adj,
                  normalize,
                  random_seed,
+                 subgraph=False,
                  name="LightGCN",
                  **kwargs
                  ):
@@ -33,6 +35,7 @@ class LightGCNModel(torch.nn.Module, ABC):
         torch.use_deterministic_algorithms(True)
 
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.top_k_buffers = {}
 
         self.num_users = num_users
         self.num_items = num_items
@@ -42,8 +45,13 @@ class LightGCNModel(torch.nn.Module, ABC):
         self.n_layers = n_layers
         self.weight_size_list = [self.embed_k] * (self.n_layers + 1)
         self.alpha = torch.tensor([1 / (k + 1) for k in range(len(self.weight_size_list))])
-        self.adj = adj
         self.normalize = normalize
+        self.subgraph = subgraph
+        # the graph is fixed, it is normalized and moved to the device once instead of at every layer call
+        if self.normalize:
+            adj = gcn_norm(adj, num_nodes=self.num_users + self.num_items, add_self_loops=False,
+                           dtype=torch.float32)
+        self.adj = adj.to(self.device)
 
         self.Gu = torch.nn.Embedding(
             num_embeddings=self.num_users, embedding_dim=self.embed_k)
@@ -55,7 +63,7 @@ class LightGCNModel(torch.nn.Module, ABC):
         propagation_network_list = []
 
         for _ in range(self.n_layers):
-            propagation_network_list.append((LGConv(normalize=self.normalize), 'x, edge_index -> x'))
+            propagation_network_list.append((LGConv(normalize=False), 'x, edge_index -> x'))
 
         self.propagation_network = torch_geometric.nn.Sequential('x, edge_index', propagation_network_list)
         self.propagation_network.to(self.device)
@@ -66,18 +74,15 @@ class LightGCNModel(torch.nn.Module, ABC):
     def propagate_embeddings(self, evaluate=False):
         ego_embeddings = torch.cat((self.Gu.weight.to(self.device), self.Gi.weight.to(self.device)), 0)
         all_embeddings = [ego_embeddings]
+        layers = list(self.propagation_network.children())
 
         for layer in range(0, self.n_layers):
             if evaluate:
                 self.propagation_network.eval()
                 with torch.no_grad():
-                    all_embeddings += [list(
-                        self.propagation_network.children()
-                    )[layer](all_embeddings[layer].to(self.device), self.adj.to(self.device))]
+                    all_embeddings += [layers[layer](all_embeddings[layer].to(self.device), self.adj)]
             else:
-                all_embeddings += [list(
-                    self.propagation_network.children()
-                )[layer](all_embeddings[layer].to(self.device), self.adj.to(self.device))]
+                all_embeddings += [layers[layer](all_embeddings[layer].to(self.device), self.adj)]
 
         if evaluate:
             self.propagation_network.train()
@@ -88,6 +93,28 @@ class LightGCNModel(torch.nn.Module, ABC):
 
         return gu, gi
 
+    def propagate_subgraph(self, nodes):
+        """
+        The propagated embeddings of the given nodes (users, and items offset by num_users), as propagate_embeddings
+        computes them, on the subgraph they depend on: layer l is only computed on the nodes within n_layers - l hops.
+        """
+        # hops[h] holds the nodes within h hops of the given ones, sorted
+        hops = [torch.unique(nodes)]
+        for _ in range(self.n_layers):
+            neighbours = self.adj.index_select(0, hops[-1]).storage.col()
+            hops.append(torch.unique(torch.cat((hops[-1], neighbours))))
+
+        ego_embeddings = torch.cat((self.Gu.weight.to(self.device), self.Gi.weight.to(self.device)), 0)
+        embeddings = ego_embeddings[hops[-1]]
+        all_embeddings = [embeddings[torch.searchsorted(hops[-1], hops[0])]]
+        for layer in range(self.n_layers):
+            targets, sources = hops[self.n_layers - layer - 1], hops[self.n_layers - layer]
+            embeddings = self.adj.index_select(0, targets).index_select(1, sources) @ embeddings
+            all_embeddings += [embeddings[torch.searchsorted(targets, hops[0])]]
+
+        all_embeddings = torch.mean(torch.stack(all_embeddings, 0), dim=0)
+        return all_embeddings[torch.searchsorted(hops[0], nodes)]
+
     def forward(self, inputs, **kwargs):
         gu, gi = inputs
         gamma_u = torch.squeeze(gu).to(self.device)
@@ -100,11 +127,26 @@ class LightGCNModel(torch.nn.Module, ABC):
     def predict(self, gu, gi, **kwargs):
         return torch.sigmoid(torch.matmul(gu.to(self.device), torch.transpose(gi.to(self.device), 0, 1)))
 
+    def predict_pairs(self, gu, gi, users, items, **kwargs):
+        """
+        The predictions of the (user, item) pairs only, the entries of predict over the whole catalog up to the rounding
+        of the sums
+        """
+        users = torch.as_tensor(users, dtype=torch.int64, device=self.device)
+        items = torch.as_tensor(items, dtype=torch.int64, device=self.device)
+        with torch.no_grad():
+            return torch.sigmoid(torch.sum(gu.to(self.device)[users] * gi.to(self.device)[items], 1)).cpu().numpy()
+
     def train_step(self, batch):
-        gu, gi = self.propagate_embeddings()
         user, pos, neg = batch
-        xu_pos = self.forward(inputs=(gu[user[:, 0]], gi[pos[:, 0]]))
-        xu_neg = self.forward(inputs=(gu[user[:, 0]], gi[neg[:, 0]]))
+        if self.subgraph:
+            nodes = torch.cat((user[:, 0], pos[:, 0] + self.num_users, neg[:, 0] + self.num_users)).to(self.device)
+            gamma_u, gamma_i_pos, gamma_i_neg = torch.split(self.propagate_subgraph(nodes), user.shape[0])
+        else:
+            gu, gi = self.propagate_embeddings()
+            gamma_u, gamma_i_pos, gamma_i_neg = gu[user[:, 0]], gi[pos[:, 0]], gi[neg[:, 0]]
+        xu_pos = self.forward(inputs=(gamma_u, gamma_i_pos))
+        xu_neg = self.forward(inputs=(gamma_u, gamma_i_neg))
         loss = torch.mean(torch.nn.functional.softplus(xu_neg - xu_pos))
         reg_loss = self.l_w * (1 / 2) * (self.Gu.weight[user[:, 0]].norm(2).pow(2) +
                                          self.Gi.weight[pos[:, 0]].norm(2).pow(2) +
@@ -118,5 +160,4 @@ class LightGCNModel(torch.nn.Module, ABC):
         return loss.detach().cpu().numpy()
 
     def get_top_k(self, preds, train_mask, k=100):
-        return torch.topk(torch.where(torch.tensor(train_mask).to(self.device), preds.to(self.device),
-                                      torch.tensor(-np.inf).to(self.device)), k=k, sorted=True)
\ No newline at end of file
+        return train_mask.top_k(preds.to(self.device), k, self.top_k_buffers)
\ No newline at end of file
@@ -1,16 +1,26 @@
 import os
+import time
 import pandas as pd
-from typing import List
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple
 import shutil
 
 from data_minimization import data_splitting
 from data_minimization import minimization_strategies
+from data_minimization import streaming_minimization
+from data_minimization.item_statistics import ItemStatistics
+from data_minimization.minimization_cache import MinimizationCache, file_digest
+from data_minimization.shared_frame import SharedFrame
+from elliot.utils.write import save_split_npz
 
 INTERACTIONS_N = [1, 3, 7, 15, 100]
 
 STRATEGIES = ['full', 'random', 'most_recent', 'most_favorite', 'least_favorite', 'most_rated', 'most_characteristic',
               'highest_variance']
 
+# strategies ranking by an item statistic, they share the ItemStatistics saved next to the candidate file
+ITEM_STATISTICS_STRATEGIES = ['most_rated', 'most_characteristic', 'highest_variance']
+
 function_mapping = {
     'full': minimization_strategies.full_min,
     'random': minimization_strategies.random_min,
@@ -51,37 +61,123 @@ def copy_and_rename(source_file_path: str, dest_file_path: str) -> None:
         print(f"Unexpected error {e}")
 
 
-def apply_minimization_strategy(df_path: str, dataset: str = 'ml-1m', df_name: str = 'dm_candidate.tsv',
-                                strategy: str = 'full', val_path: str = None, test_path: str = None, **kwargs) -> str:
+def check_strategy(strategy: str) -> str:
     strategy = strategy.lower()
     if strategy not in STRATEGIES:
         all_strategies_names = "\n".join(["\t-" + n for n in STRATEGIES])
         raise ValueError(
             f" Strategy: {strategy} not implemented.\n The implemented strategies are:\n {all_strategies_names}")
-
-    df = pd.read_csv(os.path.join(df_path, df_name), sep='\t')
-    try:
-        func = function_mapping[strategy]
-        minimized_df = func(df, **kwargs)
-    except TypeError as e:
-        raise TypeError(f" Error calling function '{strategy}': {e}")
-
+    return strategy
+
+
+def dataset_directory(dataset: str) -> str:
+    return os.path.abspath(os.path.join('./dataset', dataset))
+
+
+def open_cache(candidate_path: str, dataset: str, use_cache: bool = True) -> Tuple[MinimizationCache, str]:
+    # the cache of the minimized datasets of `dataset` and the content hash of the candidate file
+    if not use_cache:
+        return None, None
+    return MinimizationCache(dataset_directory(dataset)), file_digest(candidate_path)
+
+
+def _cached_budgets(cache: MinimizationCache, candidate_digest: str, strategy: str, interactions_n: List[int],
+                    **kwargs) -> Tuple[Dict[int, str], Dict[int, str]]:
+    # split the budgets into those already on disk (n -> path) and those to produce (n -> cache key)
+    kwargs.pop('n', None)
+    cached, missing = {}, {}
+    for n in interactions_n:
+        key = None if cache is None else cache.key(candidate_digest, strategy, n, **kwargs)
+        cached_path = None if cache is None else cache.lookup(strategy, n, key)
+        if cached_path is None:
+            missing[n] = key
+        else:
+            cached[n] = cached_path
+            print(f" {strategy} n={n} unchanged, cached in {cached_path}")
+    return cached, missing
+
+
+def _write_output(cache: MinimizationCache, path: str, write) -> list:
+    # write(path) produces the file, through the cache object store when there is one
+    if cache is None:
+        # write next to the destination and rename, readers never see a partially written file
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return None
+    written_path = f"{path}.new-{os.getpid()}"
+    write(written_path)
+    return cache.put(written_path, path)
+
+
+def save_minimized_dataset(minimized_df: pd.DataFrame, dataset: str, strategy: str, n: int, user_col_name: str,
+                           item_col_name: str, rating_col_name: str, cache: MinimizationCache = None,
+                           cache_key: str = None, candidate_digest: str = None, **kwargs) -> str:
     # new_df_name = dataset + '-' + strategy
-    new_df_path_method = os.path.abspath(os.path.join('./dataset', dataset, strategy))
+    new_df_path_method = os.path.join(dataset_directory(dataset), strategy)
     create_directory(new_df_path_method)  # directory for the method minimization
 
-    train_file_name = f"{kwargs['n']}" + '.tsv'
-    # train_file_name = f"{n}" + '.tsv'
+    train_file_name = f"{n}" + '.tsv'
 
-    minimized_df.to_csv(os.path.join(new_df_path_method, train_file_name + 'headers_full'), sep='\t', index=False)
+    files = {'.tsvheaders_full': _write_output(
+        cache, os.path.join(new_df_path_method, train_file_name + 'headers_full'),
+        lambda path: minimized_df.to_csv(path, sep='\t', index=False))}
 
-    user_col_name = kwargs['user_col_name']
-    item_col_name = kwargs['item_col_name']
-    rating_col_name = kwargs['rating_col_name']
     # minimized_df_elliot = minimized_df[['user_id:token', 'item_id:token', 'rating:float']].copy()
-    minimized_df_elliot = minimized_df[[user_col_name, item_col_name, rating_col_name]].copy()
-    minimized_df_elliot.to_csv(os.path.join(new_df_path_method, train_file_name), sep='\t', index=False, header=False)
+    minimized_df_elliot = minimized_df[[user_col_name, item_col_name, rating_col_name]]
+    files['.tsv'] = _write_output(cache, os.path.join(new_df_path_method, train_file_name),
+                                  lambda path: minimized_df_elliot.to_csv(path, sep='\t', index=False, header=False))
+    # binary copy of the same split, loaded by Elliot with the data_config strategy "binary"
+    files['.npz'] = _write_output(cache, os.path.join(new_df_path_method, f"{n}.npz"),
+                                  lambda path: save_split_npz(minimized_df_elliot, path))
+    if cache is not None:
+        cache.record(strategy, n, cache_key, candidate_digest, files)
+    return os.path.join(new_df_path_method, train_file_name)
+
+
+def save_full_dataset_streaming(candidate_path: str, dataset: str, n: int, user_col_name: str, item_col_name: str,
+                                rating_col_name: str, chunksize: int, cache: MinimizationCache = None,
+                                cache_key: str = None, candidate_digest: str = None, **kwargs) -> str:
+    new_df_path_method = os.path.join(dataset_directory(dataset), 'full')
+    create_directory(new_df_path_method)  # directory for the method minimization
+
+    train_file_name = f"{n}" + '.tsv'
+
+    def write(headers_full_path: str, train_path: str) -> None:
+        for i, chunk in enumerate(pd.read_csv(candidate_path, sep='\t', chunksize=chunksize)):
+            mode = 'w' if i == 0 else 'a'
+            chunk.to_csv(headers_full_path, sep='\t', index=False, mode=mode, header=i == 0)
+            chunk[[user_col_name, item_col_name, rating_col_name]].to_csv(train_path, sep='\t', index=False,
+                                                                          header=False, mode=mode)
+
+    headers_full_path = os.path.join(new_df_path_method, train_file_name + 'headers_full')
+    train_path = os.path.join(new_df_path_method, train_file_name)
+    binary_path = os.path.join(new_df_path_method, f"{n}.npz")
+    if cache is None:
+        write(headers_full_path, train_path)
+        save_split_binary(train_path, binary_path)
+        return train_path
+
+    written = {path: f"{path}.new-{os.getpid()}" for path in (headers_full_path, train_path, binary_path)}
+    write(written[headers_full_path], written[train_path])
+    save_split_binary(written[train_path], written[binary_path])
+    files = {'.tsvheaders_full': cache.put(written[headers_full_path], headers_full_path),
+             '.tsv': cache.put(written[train_path], train_path),
+             '.npz': cache.put(written[binary_path], binary_path)}
+    cache.record('full', n, cache_key, candidate_digest, files)
+    return train_path
+
+
+def save_split_binary(tsv_path: str, binary_path: str) -> None:
+    # the npz of a headerless user/item/rating tsv (3 columns, it is small even when the tsv was streamed)
+    save_split_npz(pd.read_csv(tsv_path, sep='\t', header=None), binary_path)
+
 
+def copy_val_test(df_path: str, dataset: str, val_path: str = None, test_path: str = None) -> None:
     path = df_path
 
     dest_val_path = os.path.abspath(os.path.join('./dataset', dataset, 'val.tsv'))
@@ -94,11 +190,185 @@ def apply_minimization_strategy(df_path: str, dataset: str = 'ml-1m', df_name: s
     if test_path is None:
         test_path = os.path.join(path, 'dm_test.tsv')  # actual
         copy_and_rename(test_path, dest_test_path)
-    return 'miao'
+
+    for dest_path in (dest_val_path, dest_test_path):
+        binary_path = os.path.splitext(dest_path)[0] + '.npz'
+        if os.path.isfile(dest_path) and (not os.path.isfile(binary_path)
+                                          or os.path.getmtime(binary_path) < os.path.getmtime(dest_path)):
+            tmp_path = f"{binary_path}.tmp-{os.getpid()}"
+            save_split_binary(dest_path, tmp_path)
+            os.replace(tmp_path, binary_path)
+
+
+def apply_minimization_strategy(df_path: str, dataset: str = 'ml-1m', df_name: str = 'dm_candidate.tsv',
+                                strategy: str = 'full', val_path: str = None, test_path: str = None,
+                                chunksize: int = None, use_cache: bool = True, **kwargs) -> str:
+    """
+    Minimize the candidate set with a strategy and save the result in ./dataset/{dataset}/{strategy}/{n}.tsv.
+    With use_cache, a dataset already produced from the same candidate file, strategy, n, seed and columns is not
+    produced again. Returns the path of the training file.
+    """
+    strategy = check_strategy(strategy)
+    if chunksize is not None:
+        return apply_minimization_strategy_budgets(df_path, dataset=dataset, df_name=df_name, strategy=strategy,
+                                                   interactions_n=[kwargs.pop('n')], val_path=val_path,
+                                                   test_path=test_path, chunksize=chunksize, use_cache=use_cache,
+                                                   **kwargs)[0]
+
+    candidate_path = os.path.join(df_path, df_name)
+    cache, candidate_digest = open_cache(candidate_path, dataset, use_cache)
+    cached, missing = _cached_budgets(cache, candidate_digest, strategy, [kwargs['n']], **kwargs)
+    if cached:
+        copy_val_test(df_path, dataset=dataset, val_path=val_path, test_path=test_path)
+        return cached[kwargs['n']]
+
+    df = pd.read_csv(candidate_path, sep='\t')
+    if strategy in ITEM_STATISTICS_STRATEGIES:
+        kwargs['item_statistics'] = ItemStatistics.load_or_compute(candidate_path, df, **kwargs)
+    try:
+        func = function_mapping[strategy]
+        minimized_df = func(df, **kwargs)
+    except TypeError as e:
+        raise TypeError(f" Error calling function '{strategy}': {e}")
+
+    saved_path = save_minimized_dataset(minimized_df, dataset=dataset, strategy=strategy, cache=cache,
+                                        cache_key=missing[kwargs['n']], candidate_digest=candidate_digest, **kwargs)
+    if cache is not None:
+        cache.save()
+    copy_val_test(df_path, dataset=dataset, val_path=val_path, test_path=test_path)
+    return saved_path
+
+
+def apply_minimization_strategy_budgets(df_path: str, dataset: str = 'ml-1m', df_name: str = 'dm_candidate.tsv',
+                                        strategy: str = 'full', interactions_n: List[int] = INTERACTIONS_N,
+                                        val_path: str = None, test_path: str = None, chunksize: int = None,
+                                        use_cache: bool = True, **kwargs) -> List[str]:
+    """
+    Same as apply_minimization_strategy, but reads the candidate set and ranks it once for all the budgets in
+    interactions_n, saving one minimized dataset per n.
+    With chunksize, the candidate set is streamed in chunks of that many rows instead of being loaded in memory.
+    """
+    strategy = check_strategy(strategy)
+    kwargs.pop('n', None)
+    candidate_path = os.path.join(df_path, df_name)
+    cache, candidate_digest = open_cache(candidate_path, dataset, use_cache)
+    saved_paths, missing = _cached_budgets(cache, candidate_digest, strategy, interactions_n, **kwargs)
+
+    if missing and chunksize is not None and strategy == 'full':
+        for n, cache_key in missing.items():
+            saved_paths[n] = save_full_dataset_streaming(candidate_path, dataset=dataset, n=n, chunksize=chunksize,
+                                                         cache=cache, cache_key=cache_key,
+                                                         candidate_digest=candidate_digest, **kwargs)
+    elif missing:
+        try:
+            if chunksize is not None:
+                minimized_dfs = streaming_minimization.streaming_multi_budget_min(candidate_path, strategy, missing,
+                                                                                  chunksize=chunksize, **kwargs)
+            else:
+                df = pd.read_csv(candidate_path, sep='\t')
+                if strategy in ITEM_STATISTICS_STRATEGIES:
+                    kwargs['item_statistics'] = ItemStatistics.load_or_compute(candidate_path, df, **kwargs)
+                minimized_dfs = minimization_strategies.multi_budget_min(df, strategy, missing, **kwargs)
+        except TypeError as e:
+            raise TypeError(f" Error calling function '{strategy}': {e}")
+
+        for n, minimized_df in minimized_dfs.items():
+            saved_paths[n] = save_minimized_dataset(minimized_df, dataset=dataset, strategy=strategy, n=n, cache=cache,
+                                                    cache_key=missing[n], candidate_digest=candidate_digest, **kwargs)
+    if missing and cache is not None:
+        cache.save()
+    copy_val_test(df_path, dataset=dataset, val_path=val_path, test_path=test_path)
+    return [saved_paths[n] for n in interactions_n]
+
+
+def _grid_job(spec: list, dataset: str, strategy: str, cache_keys: Dict[int, str], cache: MinimizationCache,
+              candidate_digest: str, kwargs: dict) -> Tuple[List[Tuple[str, int, str, float]], dict]:
+    started = time.perf_counter()
+    shared = SharedFrame.attach(spec)
+    # the factorized columns stay codes while ranking, only the selected rows are decoded
+    df = shared.to_frame(categorical=True)
+    shared.close()
+    minimized_dfs = {n: shared.decode(minimized_df) for n, minimized_df in
+                     minimization_strategies.multi_budget_min(df, strategy, cache_keys, **kwargs).items()}
+    rank_time = time.perf_counter() - started
+
+    done = []
+    for n, minimized_df in minimized_dfs.items():
+        started = time.perf_counter()
+        saved_path = save_minimized_dataset(minimized_df, dataset=dataset, strategy=strategy, n=n, cache=cache,
+                                            cache_key=cache_keys[n], candidate_digest=candidate_digest, **kwargs)
+        done.append((strategy, n, saved_path, rank_time + time.perf_counter() - started))
+        rank_time = 0.0
+    # the manifest is written by the parent process only, the worker returns its new entries
+    entries = {} if cache is None else {f"{strategy}/{n}": cache.entries[f"{strategy}/{n}"] for n in cache_keys}
+    return done, entries
+
+
+def apply_minimization_grid(df_path: str, dataset: str = 'ml-1m', df_name: str = 'dm_candidate.tsv',
+                            strategies: List[str] = STRATEGIES, interactions_n: List[int] = INTERACTIONS_N,
+                            val_path: str = None, test_path: str = None, n_jobs: int = None, use_cache: bool = True,
+                            **kwargs) -> List[Tuple[str, int, str, float]]:
+    """
+    Materialize every (strategy, n) minimized dataset of the grid with a pool of processes.
+
+    The candidate set is parsed once and shared with the workers as columnar arrays in shared memory. Each worker
+    ranks the candidates for one strategy and writes all its budgets (atomically); the time of every (strategy, n)
+    dataset is printed as soon as its strategy completes. With use_cache, the (strategy, n) datasets already produced
+    from the same candidate file are skipped.
+
+    Returns:
+        List[Tuple[str, int, str, float]]: The strategy, n, saved path and seconds of every job.
+    """
+    strategies = [check_strategy(strategy) for strategy in strategies]
+    kwargs.pop('n', None)
+    for strategy in strategies:
+        create_directory(os.path.abspath(os.path.join('./dataset', dataset, strategy)))
+
+    started = time.perf_counter()
+    candidate_path = os.path.join(df_path, df_name)
+    cache, candidate_digest = open_cache(candidate_path, dataset, use_cache)
+    results, jobs = [], {}
+    for strategy in strategies:
+        cached, missing = _cached_budgets(cache, candidate_digest, strategy, interactions_n, **kwargs)
+        results.extend((strategy, n, saved_path, 0.0) for n, saved_path in cached.items())
+        if missing:
+            jobs[strategy] = missing
+    if not jobs:
+        copy_val_test(df_path, dataset=dataset, val_path=val_path, test_path=test_path)
+        return results
+
+    df = pd.read_csv(candidate_path, sep='\t')
+    if any(strategy in ITEM_STATISTICS_STRATEGIES for strategy in jobs):
+        kwargs['item_statistics'] = ItemStatistics.load_or_compute(candidate_path, df, **kwargs)
+    shared = SharedFrame.from_frame(df)
+    del df
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(_grid_job, shared.spec, dataset, strategy, cache_keys, cache, candidate_digest,
+                                       kwargs)
+                       for strategy, cache_keys in jobs.items()]
+            for future in as_completed(futures):
+                done, entries = future.result()
+                if cache is not None:
+                    cache.update(entries)
+                    cache.save()
+                for strategy, n, saved_path, seconds in done:
+                    results.append((strategy, n, saved_path, seconds))
+                    print(f" [{len(results)}/{len(strategies) * len(interactions_n)}] {dataset} {strategy} n={n} "
+                          f"saved in {saved_path} ({seconds:.2f}s)")
+    finally:
+        shared.close()
+        shared.unlink()
+
+    copy_val_test(df_path, dataset=dataset, val_path=val_path, test_path=test_path)
+    print(f" Minimization grid for {dataset} completed in {time.perf_counter() - started:.2f}s")
+    return results
+
 
 def preprocess_dataset_ambar(dataset_name: str = 'ambar', dataset_inter_name: str = 'ratings_info.tsv',
                        user_col: str = 'user_id', k_core: int = 45,
-                       user_based_split: float = 0.7, subsample: int = 2500, item_col: str = 'track_id', rating_col:str = 'rating') -> str:
+                       user_based_split: float = 0.7, subsample: int = 2500, item_col: str = 'track_id', rating_col:str = 'rating',
+                       reproduce_splits: bool = False) -> str:
     data_directory = './data'
     dataset_path = os.path.abspath(os.path.join(data_directory, dataset_name, dataset_inter_name))
 
@@ -110,7 +380,9 @@ def preprocess_dataset_ambar(dataset_name: str = 'ambar', dataset_inter_name: st
     df = pd.read_csv(dataset_path, sep='\t')
 
 
-    df_cored = data_splitting.iterative_k_core(df, column1=user_col, column2=item_col, k=k_core) # used on ambar
+    df_cored, removed_per_round = data_splitting.iterative_k_core(df, column1=user_col, column2=item_col, k=k_core,
+                                                                  return_stats=True) # used on ambar
+    print(f"k-core converged in {len(removed_per_round)} rounds, rows removed per round: {removed_per_round}")
     df_subsampled = data_splitting.subsample_by_column(df=df_cored, column=user_col, n=subsample, seed=42)
 
     print(f"k-core finished. Begin user-based split in ds: {70}% and dm: {30}% \n")
@@ -126,18 +398,20 @@ def preprocess_dataset_ambar(dataset_name: str = 'ambar', dataset_inter_name: st
 
     print(f" User-splitting finished. File saved in {current_data_path} \n Begin data splitting 70-10-20")
     # Splitting DM
-    dm_candidate, dm_val, dm_test = data_splitting.split_dataset_per_user(dm, user_col=user_col, train_ratio=0.7,
-                                                                          val_ratio=0.1, test_ratio=0.2)
-    dm_candidate.to_csv(os.path.join(current_data_path, 'dm_candidate.tsv'), sep='\t', index=False)
-
-
-    dm_val_elliot = dm_val[[user_col, item_col, rating_col]].copy()
-    dm_val_elliot.to_csv(os.path.join(current_data_path, 'dm_val.tsv'), sep='\t', index=False, header=False)
+    candidate_idx, val_idx, test_idx = data_splitting.split_indices_per_user(dm, user_col=user_col, train_ratio=0.7,
+                                                                             val_ratio=0.1, test_ratio=0.2,
+                                                                             reproduce_splits=reproduce_splits)
+    dm.take(candidate_idx).to_csv(os.path.join(current_data_path, 'dm_candidate.tsv'), sep='\t', index=False)
+
+    dm_val = dm.take(val_idx)
+    dm_val[[user_col, item_col, rating_col]].to_csv(os.path.join(current_data_path, 'dm_val.tsv'), sep='\t',
+                                                    index=False, header=False)
     dm_val.to_csv(os.path.join(current_data_path, 'dm_val_full.tsv'), sep='\t', index=False)
 
+    dm_test = dm.take(test_idx)
     dm_test.to_csv(os.path.join(current_data_path, 'dm_test_full.tsv'), sep='\t', index=False)
-    dm_test_elliot = dm_test[[user_col, item_col, rating_col]].copy()
-    dm_test_elliot.to_csv(os.path.join(current_data_path, 'dm_test.tsv'), sep='\t', index=False, header=False)
+    dm_test[[user_col, item_col, rating_col]].to_csv(os.path.join(current_data_path, 'dm_test.tsv'), sep='\t',
+                                                     index=False, header=False)
 
 
     print(f" Data-splitting finished. Files saved in {current_data_path} \n")
@@ -147,7 +421,7 @@ def preprocess_dataset_ambar(dataset_name: str = 'ambar', dataset_inter_name: st
 def preprocess_dataset_ml(dataset_name: str = 'ml-1m', dataset_inter_name: str = 'inter.tsv',
                        user_col: str = 'user_id:token', k_core: int = 45,
                        user_based_split: float = 0.7, subsample: int = 2500, item_col: str = 'item_id:token', rating_col:str = 'rating:float',
-                       strategies: List[str] = 'full') -> str:
+                       strategies: List[str] = 'full', reproduce_splits: bool = False) -> str:
     data_directory = './data'
     dataset_path = os.path.abspath(os.path.join(data_directory, dataset_name, dataset_inter_name))
 
@@ -159,7 +433,8 @@ def preprocess_dataset_ml(dataset_name: str = 'ml-1m', dataset_inter_name: str =
     df = pd.read_csv(dataset_path, sep='\t')
 
 
-    df_cored = data_splitting.k_core(df, column=user_col, k=k_core)
+    df_cored, removed_per_round = data_splitting.k_core(df, column=user_col, k=k_core, return_stats=True)
+    print(f"k-core converged in {len(removed_per_round)} rounds, rows removed per round: {removed_per_round}")
     df_subsampled = data_splitting.subsample_by_column(df=df_cored, column=user_col, n=subsample, seed=42)
 
     print(f"k-core finished. Begin user-based split in ds: {70}% and dm: {30}% \n")
@@ -175,18 +450,20 @@ def preprocess_dataset_ml(dataset_name: str = 'ml-1m', dataset_inter_name: str =
 
     print(f" User-splitting finished. File saved in {current_data_path} \n Begin data splitting 70-10-20")
     # Splitting DM
-    dm_candidate, dm_val, dm_test = data_splitting.split_dataset_per_user(dm, user_col=user_col, train_ratio=0.7,
-                                                                          val_ratio=0.1, test_ratio=0.2)
-    dm_candidate.to_csv(os.path.join(current_data_path, 'dm_candidate.tsv'), sep='\t', index=False)
-
-
-    dm_val_elliot = dm_val[[user_col, item_col, rating_col]].copy()
-    dm_val_elliot.to_csv(os.path.join(current_data_path, 'dm_val.tsv'), sep='\t', index=False, header=False)
+    candidate_idx, val_idx, test_idx = data_splitting.split_indices_per_user(dm, user_col=user_col, train_ratio=0.7,
+                                                                             val_ratio=0.1, test_ratio=0.2,
+                                                                             reproduce_splits=reproduce_splits)
+    dm.take(candidate_idx).to_csv(os.path.join(current_data_path, 'dm_candidate.tsv'), sep='\t', index=False)
+
+    dm_val = dm.take(val_idx)
+    dm_val[[user_col, item_col, rating_col]].to_csv(os.path.join(current_data_path, 'dm_val.tsv'), sep='\t',
+                                                    index=False, header=False)
     dm_val.to_csv(os.path.join(current_data_path, 'dm_val_full.tsv'), sep='\t', index=False)
 
+    dm_test = dm.take(test_idx)
     dm_test.to_csv(os.path.join(current_data_path, 'dm_test_full.tsv'), sep='\t', index=False)
-    dm_test_elliot = dm_test[[user_col, item_col, rating_col]].copy()
-    dm_test_elliot.to_csv(os.path.join(current_data_path, 'dm_test.tsv'), sep='\t', index=False, header=False)
+    dm_test[[user_col, item_col, rating_col]].to_csv(os.path.join(current_data_path, 'dm_test.tsv'), sep='\t',
+                                                     index=False, header=False)
 
 
     print(f" Data-splitting finished. Files saved in {current_data_path} \n")
@@ -1,9 +1,9 @@
 import os
+import numpy as np
 import pandas as pd
 from typing import List
 
-# from save_recs_for_best_models import dataset_name
-import pandas as pd
+from elliot.utils.write import save_clustering_npz
 
 
 def load_and_merge_data(dataset_name: str = 'ambar', type: str = 'item', file_1_name='tracks_info.tsv', file_2_name='artists_info.tsv',
@@ -25,8 +25,6 @@ def load_and_merge_data(dataset_name: str = 'ambar', type: str = 'item', file_1_
     file_1_path = os.path.join(path, file_1_name)
     file_2_path = os.path.join(path, file_2_name)
 
-    # file_1 = pd.read_csv(file_1_path, sep='\t')
-    file_2 = pd.read_csv(file_2_path, sep='\t')
     # Read the track_info.tsv file into a DataFrame
     try:
         file_1 = pd.read_csv(file_1_path, sep='\t')
@@ -88,122 +86,127 @@ def load_and_merge_data(dataset_name: str = 'ambar', type: str = 'item', file_1_
     return df_save_name, path_to_save
 
 
-def remap_column_with_group_mapping(dataframe: pd.DataFrame, column_entity: [int, str], column_attribute: [int, str],
-                                    path: str, n_groups: int = None, type: str = '') -> pd.DataFrame:
+def factorize_in_order(values: pd.Series) -> [np.ndarray, np.ndarray]:
     """
-    Remap the values in a specified column of a dataframe to continuous integers starting from zero
-    or group them into specified ranges.
+    Code the values of a column with consecutive integers in order of first appearance, in one call.
+    Missing values get a code of their own, as with unique() and map().
 
-    Save the mapping to a file.
+    Returns:
+        [np.ndarray, np.ndarray]: The code of every value and the value of every code.
+    """
+    try:
+        codes, uniques = pd.factorize(values, sort=False, use_na_sentinel=False)
+    except TypeError:
+        # pandas < 1.5
+        codes, uniques = pd.factorize(values, sort=False, na_sentinel=None)
+    return codes, np.asarray(uniques)
 
-    Parameters:
-        dataframe (pd.DataFrame): The input dataframe.
-        column_entity (int or str): The column containing either user or item ids, specified by name or column index.
-        column_attribute (int or str): The column to remap or group, specified by name or column index.
-        path (str): The path to save the mapping file and the extracted dataframe.
-        n_groups (int, optional): Number of groups to divide numerical column values into. If not specified, perform a 1-to-1 mapping.
+
+def equal_width_groups(values: pd.Series, n_groups: int) -> np.ndarray:
+    """
+    Bin a numerical column into n_groups ranges of equal width between its minimum and maximum, the maximum falling
+    in the last group. Vectorized version of int((value - min) // step) with step = (max - min) / n_groups.
 
     Returns:
-        pd.DataFrame: The dataframe with the remapped column.
+        np.ndarray: The group of every value.
+    """
+    values = values.to_numpy(dtype=np.float64)
+    if np.isnan(values).any():
+        raise ValueError(" Numerical values can not be grouped when some of them are missing.")
+    min_value, max_value = values.min(), values.max()
+    range_step = (max_value - min_value) / n_groups
+    with np.errstate(divide='ignore', invalid='ignore'):
+        groups = np.floor_divide(values - min_value, range_step)
+    return np.where(values < max_value, groups, n_groups - 1).astype(np.int64)
+
+
+def save_clustering(entities: pd.Series, groups: np.ndarray, mapping: List, path: str, attribute_column_name: str,
+                    type: str = '') -> str:
     """
-    # Handle dataframes without headers
-    if not isinstance(dataframe.columns, pd.Index):
-        dataframe.columns = range(dataframe.shape[1])
+    Save the clustering of one attribute for elliot: the headerless entity/group tsv, its npz sidecar (see
+    save_clustering_npz, read by the fairness metrics without parsing) and the mapping of the groups.
 
-    # Get column name if column is specified by index
-    if isinstance(column_attribute, int):
-        attribute_column_name = dataframe.columns[column_attribute]
-        entity_column_name = dataframe.columns[column_entity]
-    else:
-        attribute_column_name = column_attribute
-        entity_column_name = column_entity
-
-    if n_groups is not None:
-        # Group numerical values into ranges
-        min_value = dataframe[attribute_column_name].min()
-        max_value = dataframe[attribute_column_name].max()
-        range_step = (max_value - min_value) / n_groups
-
-        # Create a mapping based on ranges
-        def map_to_group(value):
-            return int((value - min_value) // range_step) if value < max_value else n_groups - 1
-
-        dataframe[attribute_column_name] = dataframe[attribute_column_name].apply(map_to_group)
-        value_to_int = {f"Group {i}": i for i in range(n_groups)}
-    else:
-        print(f" Group number can not be None")
-
-    # Save the mapping to a file
+    Parameters:
+        entities (pd.Series): The user or item ids.
+        groups (np.ndarray): The group of every entity.
+        mapping (List): The (original, group) pairs written in the mapping file.
+        path (str): The directory of the files.
+        attribute_column_name (str): The name of the attribute, part of the file names.
+        type (str): Specify user or item to rename the saved files.
+
+    Returns:
+        str: The path of the saved tsv.
+    """
     mapping_file_name = type + '_' + str(attribute_column_name) + '_mapping.tsv'
     mapping_file_path = os.path.join(path, mapping_file_name)
     with open(mapping_file_path, 'w') as f:
         f.write("Original\tMapped\n")
-        if n_groups is not None:
-            for i in range(n_groups):
-                f.write(f"Group {i}\t{i}\n")
-        else:
-            for original, mapped in value_to_int.items():
-                f.write(f"{original}\t{mapped}\n")
+        f.writelines(f"{original}\t{mapped}\n" for original, mapped in mapping)
 
-    reduced_remapped_df = dataframe[[entity_column_name, attribute_column_name]]
+    reduced_remapped_df = pd.DataFrame({entities.name: entities.to_numpy(), attribute_column_name: groups})
 
     # Save reduced side information dataset for elliot
     dataframe_file_name = type + '_' + str(attribute_column_name) + '.tsv'
     dataframe_file_path = os.path.join(path, dataframe_file_name)
     reduced_remapped_df.to_csv(dataframe_file_path, sep='\t', header=False, index=False)
+    save_clustering_npz(reduced_remapped_df, os.path.splitext(dataframe_file_path)[0] + '.npz')
     return dataframe_file_path
 
 
-def remap_column_with_mapping(dataframe: pd.DataFrame, column_entity: [int, str], column_attribute: [int, str],
-                              path: str, type: str = '') -> pd.DataFrame:
+def _column_names(dataframe: pd.DataFrame, column_entity: [int, str], column_attribute: [int, str]) -> [str, str]:
+    # Get column name if column is specified by index
+    if isinstance(column_attribute, int):
+        return dataframe.columns[column_entity], dataframe.columns[column_attribute]
+    return column_entity, column_attribute
+
+
+def remap_column_with_group_mapping(dataframe: pd.DataFrame, column_entity: [int, str], column_attribute: [int, str],
+                                    path: str, n_groups: int = None, type: str = '') -> str:
     """
-    Remap the values in a specified column of a dataframe to continuous integers starting from zero.
-    Save the mapping to a file.
+    Group the values in a specified numerical column of a dataframe into n_groups ranges of equal width.
+
+    Save the grouped column and the mapping to files.
 
     Parameters:
         dataframe (pd.DataFrame): The input dataframe.
-        column_entity(int or str): The column containing either user or item ids, specified by name or column index.
-        column_attribute (int or str): The column to remap, specified by name or column index.
-        path (str): The path to save the mapping file and the extracted dataframe
+        column_entity (int or str): The column containing either user or item ids, specified by name or column index.
+        column_attribute (int or str): The column to group, specified by name or column index.
+        path (str): The path to save the mapping file and the extracted dataframe.
+        n_groups (int): Number of groups to divide numerical column values into.
         type (str): Specify user or item to rename the saved dataframe
 
     Returns:
-        pd.DataFrame: The dataframe with the remapped column.
+        str: The path of the saved dataframe.
     """
-    # Handle dataframes without headers
-    if not isinstance(dataframe.columns, pd.Index):
-        dataframe.columns = range(dataframe.shape[1])
+    if n_groups is None:
+        raise ValueError(" Group number can not be None")
+    entity_column_name, attribute_column_name = _column_names(dataframe, column_entity, column_attribute)
+    groups = equal_width_groups(dataframe[attribute_column_name], n_groups)
+    return save_clustering(dataframe[entity_column_name], groups, [(f"Group {i}", i) for i in range(n_groups)],
+                           path, attribute_column_name, type=type)
 
-    # Get column name if column is specified by index
-    if isinstance(column_attribute, int):
-        attribute_column_name = dataframe.columns[column_attribute]
-        entity_column_name = dataframe.columns[column_entity]
-    else:
-        attribute_column_name = column_attribute
-        entity_column_name = column_entity
 
-    # Get unique values and create a mapping
-    unique_values = dataframe[attribute_column_name].unique()
-    value_to_int = {value: idx for idx, value in enumerate(unique_values)}
-
-    # Map the column values to integers
-    dataframe[attribute_column_name] = dataframe[attribute_column_name].map(value_to_int)
-
-    # Save the mapping to a file
-    mapping_file_name = type + '_' + str(attribute_column_name) + '_mapping.tsv'
-    mapping_file_path = os.path.join(path, mapping_file_name)
-    with open(mapping_file_path, 'w') as f:
-        f.write("Original\tMapped\n")
-        for original, mapped in value_to_int.items():
-            f.write(f"{original}\t{mapped}\n")
+def remap_column_with_mapping(dataframe: pd.DataFrame, column_entity: [int, str], column_attribute: [int, str],
+                              path: str, type: str = '') -> str:
+    """
+    Remap the values in a specified column of a dataframe to continuous integers starting from zero, in order of
+    first appearance.
+    Save the remapped column and the mapping to files.
 
-    reduced_remapped_df = dataframe[[entity_column_name, attribute_column_name]]
+    Parameters:
+        dataframe (pd.DataFrame): The input dataframe.
+        column_entity(int or str): The column containing either user or item ids, specified by name or column index.
+        column_attribute (int or str): The column to remap, specified by name or column index.
+        path (str): The path to save the mapping file and the extracted dataframe
+        type (str): Specify user or item to rename the saved dataframe
 
-    # Save reduced side information dataset for elliot
-    dataframe_file_name = type + '_' + str(attribute_column_name) + '.tsv'
-    dataframe_file_path = os.path.join(path, dataframe_file_name)
-    reduced_remapped_df.to_csv(dataframe_file_path, sep='\t', header=False, index=False)
-    return dataframe_file_path
+    Returns:
+        str: The path of the saved dataframe.
+    """
+    entity_column_name, attribute_column_name = _column_names(dataframe, column_entity, column_attribute)
+    codes, uniques = factorize_in_order(dataframe[attribute_column_name])
+    return save_clustering(dataframe[entity_column_name], codes, zip(uniques, range(len(uniques))), path,
+                           attribute_column_name, type=type)
 
 
 def extract_side_elliot_information(dataset_name: str, attribute_file_name: str, column_entity_name: [str, int],
@@ -211,6 +214,7 @@ def extract_side_elliot_information(dataset_name: str, attribute_file_name: str,
                                     = [], type: str = '', n_groups: int = None) -> None:
     path = os.path.abspath(os.path.join('./data', dataset_name))
     dataset_path = os.path.join(path, attribute_file_name)
+    # the attribute file is read once, for all its attributes
     df = pd.read_csv(dataset_path, sep='\t')
 
     for att_name in column_attribute_name:
@@ -226,42 +230,36 @@ def extract_side_elliot_information(dataset_name: str, attribute_file_name: str,
     return None
 
 
-def run_extraction_movielens_1_m():
-    dataset_name = 'ml-1m'
+def compile_side_information(dataset_name: str, tables: List[dict]) -> None:
+    """
+    Emit every user and item clustering of a dataset, with its mapping and npz sidecar, in one pass.
 
-    type = 'item'
-    attribute_file_name = 'item.tsv'
-    column_entity_name = 'item_id:token'
-    column_attribute_name_group = ['release_year:token']
-    extract_side_elliot_information(dataset_name=dataset_name, attribute_file_name=attribute_file_name,
-                                    column_entity_name=column_entity_name,
-                                    column_attribute_name_group=column_attribute_name_group, type=type, n_groups=4)
+    Parameters:
+        dataset_name (str): The directory of the dataset in ./data.
+        tables (List[dict]): One entry per attribute file, with the arguments of extract_side_elliot_information
+            (attribute_file_name, column_entity_name, column_attribute_name, column_attribute_name_group, type,
+            n_groups).
+    """
+    for table in tables:
+        extract_side_elliot_information(dataset_name=dataset_name, **table)
 
-    type = 'user'
-    attribute_file_name = 'user.tsv'
-    column_entity_name = 'user_id:token'
-    column_attribute_name = ['gender:token']
-    extract_side_elliot_information(dataset_name=dataset_name, attribute_file_name=attribute_file_name,
-                                    column_entity_name=column_entity_name,
-                                    column_attribute_name=column_attribute_name, type=type)
+
+def run_extraction_movielens_1_m():
+    dataset_name = 'ml-1m'
+    compile_side_information(dataset_name, [
+        dict(type='item', attribute_file_name='item.tsv', column_entity_name='item_id:token',
+             column_attribute_name_group=['release_year:token'], n_groups=4),
+        dict(type='user', attribute_file_name='user.tsv', column_entity_name='user_id:token',
+             column_attribute_name=['gender:token']),
+    ])
 
 
 def run_extraction_ambar():
     dataset_name = 'ambar'
-
-
-    type = 'item'
     attribute_file_name, _ = load_and_merge_data()
-    column_entity_name = 'track_id'
-    column_attribute_name = ['gender', 'country', 'continent']
-    extract_side_elliot_information(dataset_name=dataset_name, attribute_file_name=attribute_file_name,
-                                    column_entity_name=column_entity_name,
-                                    column_attribute_name=column_attribute_name, type=type)
-
-    type = 'user'
-    attribute_file_name = 'users_info.tsv'
-    column_entity_name = 'user_id'
-    column_attribute_name = ['gender', 'country', 'continent']
-    extract_side_elliot_information(dataset_name=dataset_name, attribute_file_name=attribute_file_name,
-                                    column_entity_name=column_entity_name,
-                                    column_attribute_name=column_attribute_name, type=type)
\ No newline at end of file
+    compile_side_information(dataset_name, [
+        dict(type='item', attribute_file_name=attribute_file_name, column_entity_name='track_id',
+             column_attribute_name=['gender', 'country', 'continent']),
+        dict(type='user', attribute_file_name='users_info.tsv', column_entity_name='user_id',
+             column_attribute_name=['gender', 'country', 'continent']),
+    ])
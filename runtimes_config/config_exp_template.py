@@ -1,10 +1,11 @@
 TEMPLATE_BPR = """experiment:
   backend: pytorch
   data_config:
-    strategy: fixed
-    train_path: ../dataset/{dataset}/{strategy}/{interactions_numb}.tsv
-    validation_path: ../dataset/{dataset}/val.tsv
-    test_path: ../dataset/{dataset}/test.tsv
+    strategy: binary
+    train_path: ../dataset/{dataset}/{strategy}/{interactions_numb}.npz
+    validation_path: ../dataset/{dataset}/val.npz
+    test_path: ../dataset/{dataset}/test.npz
+    snapshot_folder: ../dataset/{dataset}/snapshots
   dataset: {dataset_name}
   top_k: 10
   evaluation:
@@ -37,10 +38,11 @@ TEMPLATE_BPR = """experiment:
 TEMPLATE_MULTIVAE = """experiment:
   backend: tensorflow
   data_config:
-    strategy: fixed
-    train_path: ../dataset/{dataset}/{strategy}/{interactions_numb}.tsv
-    validation_path: ../dataset/{dataset}/val.tsv
-    test_path: ../dataset/{dataset}/test.tsv
+    strategy: binary
+    train_path: ../dataset/{dataset}/{strategy}/{interactions_numb}.npz
+    validation_path: ../dataset/{dataset}/val.npz
+    test_path: ../dataset/{dataset}/test.npz
+    snapshot_folder: ../dataset/{dataset}/snapshots
   dataset: {dataset_name}
   top_k: 10
   evaluation:
@@ -74,10 +76,11 @@ TEMPLATE_MULTIVAE = """experiment:
 TEMPLATE_LIGHTGCN = """experiment:
   backend: pytorch
   data_config:
-    strategy: fixed
-    train_path: ../dataset/{dataset}/{strategy}/{interactions_numb}.tsv
-    validation_path: ../dataset/{dataset}/val.tsv
-    test_path: ../dataset/{dataset}/test.tsv
+    strategy: binary
+    train_path: ../dataset/{dataset}/{strategy}/{interactions_numb}.npz
+    validation_path: ../dataset/{dataset}/val.npz
+    test_path: ../dataset/{dataset}/test.npz
+    snapshot_folder: ../dataset/{dataset}/snapshots
   dataset: {dataset_name}
   top_k: 10
   evaluation:
@@ -109,10 +112,11 @@ TEMPLATE_LIGHTGCN = """experiment:
 TEMPLATE_EASER = """experiment:
   backend: tensorflow
   data_config:
-    strategy: fixed
-    train_path: ../dataset/{dataset}/{strategy}/{interactions_numb}.tsv
-    validation_path: ../dataset/{dataset}/val.tsv
-    test_path: ../dataset/{dataset}/test.tsv
+    strategy: binary
+    train_path: ../dataset/{dataset}/{strategy}/{interactions_numb}.npz
+    validation_path: ../dataset/{dataset}/val.npz
+    test_path: ../dataset/{dataset}/test.npz
+    snapshot_folder: ../dataset/{dataset}/snapshots
   dataset: {dataset_name}
   top_k: 10
   evaluation:
@@ -139,10 +143,11 @@ TEMPLATE_EASER = """experiment:
 TEMPLATE_USERKNN = """experiment:
   backend: tensorflow
   data_config:
-    strategy: fixed
-    train_path: ../dataset/{dataset}/{strategy}/{interactions_numb}.tsv
-    validation_path: ../dataset/{dataset}/val.tsv
-    test_path: ../dataset/{dataset}/test.tsv
+    strategy: binary
+    train_path: ../dataset/{dataset}/{strategy}/{interactions_numb}.npz
+    validation_path: ../dataset/{dataset}/val.npz
+    test_path: ../dataset/{dataset}/test.npz
+    snapshot_folder: ../dataset/{dataset}/snapshots
   dataset: {dataset_name}
   top_k: 10
   evaluation:
@@ -0,0 +1,114 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+
+def _candidate_mask_class():
+    # loaded from its file, elliot.dataset imports the whole dataset stack (PIL for the visual loaders)
+    path = os.path.join(os.path.dirname(__file__), os.pardir, 'elliot', 'dataset', 'candidate_mask.py')
+    spec = importlib.util.spec_from_file_location('candidate_mask', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.CandidateMask
+
+
+CandidateMask = _candidate_mask_class()
+
+
+def _masks():
+    rng = np.random.RandomState(0)
+    validation = CandidateMask(sp.random(20, 60, 0.3, random_state=rng, format='csr'), exclude=False)
+    test = CandidateMask(sp.random(20, 60, 0.3, random_state=rng, format='csr'), exclude=False)
+    return validation, test, rng.rand(20, 60).astype(np.float32)
+
+
+def _expected(mask, scores, k):
+    masked = mask.apply(scores)
+    items = np.argsort(-masked, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(masked, items, axis=1), items
+
+
+def test_apply_in_place_matches_apply():
+    validation, test, scores = _masks()
+    for mask in (validation, test, CandidateMask(validation.matrix)):
+        block = scores.copy()
+        assert mask.apply_(block) is block
+        np.testing.assert_array_equal(block, mask.apply(scores))
+
+
+def test_apply_in_place_on_shared_scores_hides_the_next_mask():
+    # the bug of the in-place top_k: the validation mask written into the scores also masks the test ranking
+    validation, test, scores = _masks()
+    block = scores.copy()
+    validation.apply_(block)
+    test.apply_(block)
+    only_test = test.apply(scores)
+    assert np.isfinite(only_test).sum() > np.isfinite(block).sum()
+
+
+def test_top_k_leaves_the_scores_for_the_next_mask():
+    validation, test, scores = _masks()
+    original = scores.copy()
+    buffers, block = {}, None
+    for mask in (validation, test):
+        values, items = mask.top_k(scores, 10, buffers)
+        expected_values, expected_items = _expected(mask, original, 10)
+        np.testing.assert_array_equal(values, expected_values)
+        # the order of the -inf items of a user with less than k candidates is arbitrary
+        finite = np.isfinite(expected_values)
+        np.testing.assert_array_equal(items[finite], expected_items[finite])
+        assert items.dtype == np.int32 and values.dtype == np.float32
+        # the copy of the scores is masked in a buffer reused by the next call
+        block = buffers[('scores', scores.dtype)] if block is None else block
+        assert buffers[('scores', scores.dtype)] is block
+    np.testing.assert_array_equal(scores, original)
+
+
+@pytest.mark.parametrize('k', [1, 10, 60])
+def test_top_k_of_the_sampled_candidates_equals_the_dense_mask(k):
+    rng = np.random.RandomState(k)
+    # the test positives and the sampled negatives of each user, a user without candidates
+    candidates = (sp.random(20, 60, 0.2, random_state=rng) + sp.random(20, 60, 0.05, random_state=rng)).tolil()
+    candidates[3, :] = 0
+    candidates = candidates.tocsr()
+    mask = CandidateMask(candidates, exclude=False)
+    scores = rng.rand(20, 60).astype(np.float32)
+    # the dense mask of the previous implementation
+    dense = np.where(candidates.toarray() != 0, scores, -np.inf)
+    expected_items = np.argsort(-dense, axis=1, kind='stable')[:, :k]
+    expected_values = np.take_along_axis(dense, expected_items, axis=1)
+    finite = np.isfinite(expected_values)
+
+    rows, cols = mask.stored_positions()
+    for values, items in (mask.top_k(scores, k), mask.top_k_candidates(scores[rows, cols], k)):
+        np.testing.assert_array_equal(values, expected_values)
+        np.testing.assert_array_equal(items[finite], expected_items[finite])
+        # the rows with less than k candidates are completed with distinct items out of the mask
+        assert not mask.contains(np.nonzero(~finite)[0], items[~finite]).any()
+        assert all(len(set(row)) == k for row in items.tolist())
+
+
+def test_top_k_torch_leaves_the_scores_for_the_next_mask():
+    torch = pytest.importorskip('torch')
+    validation, test, scores = _masks()
+    tensor = torch.from_numpy(scores.copy())
+    buffers = {}
+    for mask in (validation, test):
+        values, items = mask.top_k(tensor, 10, buffers)
+        expected_values, _ = _expected(mask, scores, 10)
+        np.testing.assert_array_equal(values, expected_values)
+        np.testing.assert_array_equal(np.take_along_axis(mask.apply(scores), items.astype(np.int64), axis=1),
+                                      expected_values)
+    np.testing.assert_array_equal(tensor.numpy(), scores)
+
+
+def test_apply_in_place_torch_matches_apply():
+    torch = pytest.importorskip('torch')
+    validation, test, scores = _masks()
+    for mask in (validation, test, CandidateMask(validation.matrix)):
+        block = torch.from_numpy(scores.copy())
+        assert mask.apply_(block) is block
+        np.testing.assert_array_equal(block.numpy(), mask.apply(scores))
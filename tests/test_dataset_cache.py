@@ -0,0 +1,125 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+
+# elliot.dataset imports the visual loaders
+pytest.importorskip('PIL')
+
+import elliot.dataset.dataset as dataset_module
+from elliot.dataset import dataset_cache
+from elliot.dataset.dataset import DataSet, DataSetLoader
+from elliot.utils.write import save_split_npz
+
+
+def _split(rng, users, items, n):
+    return pd.DataFrame({'userId': rng.randint(0, users, n), 'itemId': rng.randint(0, items, n),
+                         'rating': rng.randint(1, 6, n).astype(float)})
+
+
+def _config(tmp_path, **data_config):
+    rng = np.random.RandomState(0)
+    paths = {}
+    for name, n in (('train', 300), ('val', 60), ('test', 60)):
+        paths[name] = str(tmp_path / f'{name}.npz')
+        save_split_npz(_split(rng, 30, 40, n), paths[name])
+    data_config = SimpleNamespace(strategy='binary', train_path=paths['train'], validation_path=paths['val'],
+                                  test_path=paths['test'], side_information=[], dataloader='DataSetLoader',
+                                  **data_config)
+    return SimpleNamespace(config_test=False, binarize=False, align_side_with_train=False, random_seed=42,
+                           data_config=data_config, evaluation=SimpleNamespace(paired_ttest=True))
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    dataset_cache.clear()
+    yield
+    dataset_cache.clear()
+
+
+def test_load_data_reuses_the_datasets_of_the_same_data_config(tmp_path):
+    loaders = []
+
+    class CountingLoader(DataSetLoader):
+        def __init__(self, config, *args, **kwargs):
+            loaders.append(config)
+            super().__init__(config, *args, **kwargs)
+
+    first_config = _config(tmp_path)
+    first = dataset_cache.load_data(CountingLoader, first_config)
+    # the next model of the grid: a new configuration namespace with the same data fields
+    second_config = SimpleNamespace(**vars(first_config))
+    second_config.evaluation = SimpleNamespace(paired_ttest=True)
+    second = dataset_cache.load_data(CountingLoader, second_config)
+
+    assert len(loaders) == 1
+    assert second[0][0] is first[0][0]
+    assert second[0][0].config is second_config
+
+
+def test_binary_splits_are_parsed_once(tmp_path, monkeypatch):
+    reads = []
+    read_split_npz = dataset_module.read_split_npz
+
+    def counting_read(path, *args, **kwargs):
+        reads.append(path)
+        return read_split_npz(path, *args, **kwargs)
+
+    monkeypatch.setattr(dataset_module, 'read_split_npz', counting_read)
+    config = _config(tmp_path)
+    first = DataSetLoader(config)
+    # another data configuration on the same split files, e.g. with binarized ratings
+    config.binarize = True
+    second = DataSetLoader(config)
+
+    assert len(reads) == 3
+    assert (second.train_dataframe['rating'] == 1).all()
+    assert not (first.train_dataframe['rating'] == 1).all()
+
+
+def test_snapshot_round_trip(tmp_path):
+    config = _config(tmp_path)
+    config.negative_sampling = SimpleNamespace(strategy='random', num_items=5,
+                                               file_path=str(tmp_path / 'negatives.tsv'))
+    data = DataSetLoader(config).generate_dataobjects()[0][0]
+    data.save_snapshot(str(tmp_path / 'snapshot'))
+    loaded = DataSet.load_snapshot(str(tmp_path / 'snapshot'), config)
+
+    # memory mapped, read-only
+    assert not loaded.sp_i_train.indices.flags.writeable
+    for name in ('sp_i_train', 'sp_i_train_ratings'):
+        assert (getattr(loaded, name) != getattr(data, name)).nnz == 0
+        assert getattr(loaded, name).dtype == getattr(data, name).dtype
+    assert loaded.private_users == data.private_users
+    assert loaded.private_items == data.private_items
+    for name in ('val_mask', 'test_mask', 'allunrated_mask'):
+        mask, loaded_mask = getattr(data, name), getattr(loaded, name)
+        assert loaded_mask.exclude == mask.exclude
+        assert (loaded_mask.matrix != mask.matrix).nnz == 0
+    assert loaded.train_dict == data.train_dict
+    assert loaded.val_dict == data.val_dict
+    assert loaded.test_dict == data.test_dict
+
+
+def test_load_data_memory_maps_the_snapshot_of_a_previous_process(tmp_path):
+    loaders = []
+
+    class CountingLoader(DataSetLoader):
+        def __init__(self, config, *args, **kwargs):
+            loaders.append(config)
+            super().__init__(config, *args, **kwargs)
+
+    config = _config(tmp_path, snapshot_folder=str(tmp_path / 'snapshots'))
+    first = dataset_cache.load_data(DataSetLoader, config)[0][0]
+    # a new process: the in-memory cache is empty, the snapshot is on disk
+    dataset_cache.clear()
+    loaded = dataset_cache.load_data(CountingLoader, config)[0][0]
+
+    assert not loaders
+    assert loaded is not first
+    # memory mapped, read-only
+    assert not loaded.sp_i_train.indices.flags.writeable
+    assert (loaded.sp_i_train_ratings != first.sp_i_train_ratings).nnz == 0
+    assert loaded.private_items == first.private_items
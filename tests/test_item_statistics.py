@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_minimization.item_statistics import ItemStatistics
+
+
+def _candidates(path, seed, n=200):
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'user_id:token': rng.randint(0, 20, n),
+                       'item_id:token': [f'i{i}' for i in rng.randint(0, 30, n)],
+                       'rating:float': rng.randint(1, 6, n).astype(float)})
+    df.to_csv(path, sep='\t', index=False)
+    return df
+
+
+def _computed(monkeypatch):
+    computed = []
+    from_frame = ItemStatistics.from_frame.__func__
+
+    def counting_from_frame(cls, df, **kwargs):
+        computed.append(len(df))
+        return from_frame(cls, df, **kwargs)
+
+    monkeypatch.setattr(ItemStatistics, 'from_frame', classmethod(counting_from_frame))
+    return computed
+
+
+def _assert_statistics_of(statistics, df):
+    # built without from_frame, which counts the computations
+    expected = ItemStatistics(pd.Index(np.sort(df['item_id:token'].unique())), df=df).compute_all()
+    assert statistics.items.equals(expected.items)
+    for name in ItemStatistics.STATISTICS:
+        np.testing.assert_array_equal(getattr(statistics, name), getattr(expected, name))
+
+
+def test_load_or_compute_loads_the_sidecar_without_pickle(tmp_path, monkeypatch):
+    candidate_path = str(tmp_path / 'candidates.tsv')
+    df = _candidates(candidate_path, 0)
+    computed = _computed(monkeypatch)
+
+    ItemStatistics.load_or_compute(candidate_path)
+    with np.load(ItemStatistics.default_path(candidate_path), allow_pickle=False) as stored:
+        assert stored['items'].dtype.kind == 'U'
+    statistics = ItemStatistics.load_or_compute(candidate_path)
+
+    assert len(computed) == 1
+    _assert_statistics_of(statistics, df)
+
+
+def test_load_or_compute_recomputes_after_the_candidate_file_changes(tmp_path, monkeypatch):
+    candidate_path = str(tmp_path / 'candidates.tsv')
+    _candidates(candidate_path, 0)
+    computed = _computed(monkeypatch)
+    ItemStatistics.load_or_compute(candidate_path)
+
+    # a different size
+    df = _candidates(candidate_path, 1, n=150)
+    _assert_statistics_of(ItemStatistics.load_or_compute(candidate_path), df)
+    assert len(computed) == 2
+
+    # the same size, a different modification time
+    stat = os.stat(candidate_path)
+    os.utime(candidate_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    ItemStatistics.load_or_compute(candidate_path)
+    assert len(computed) == 3
+    ItemStatistics.load_or_compute(candidate_path)
+    assert len(computed) == 3
+
+
+def test_load_or_compute_replaces_a_sidecar_with_object_arrays(tmp_path, monkeypatch):
+    candidate_path = str(tmp_path / 'candidates.tsv')
+    df = _candidates(candidate_path, 0)
+    statistics = ItemStatistics.from_frame(df).compute_all()
+    # as saved by the earlier versions, the string ids as an object array
+    np.savez(ItemStatistics.default_path(candidate_path), items=statistics.items.to_numpy(),
+             signature=ItemStatistics._signature(candidate_path),
+             columns=np.array(['item_id:token', 'user_id:token', 'rating:float']), **statistics._statistics)
+    computed = _computed(monkeypatch)
+
+    _assert_statistics_of(ItemStatistics.load_or_compute(candidate_path), df)
+    assert len(computed) == 1
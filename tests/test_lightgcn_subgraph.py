@@ -0,0 +1,50 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torch_geometric')
+torch_sparse = pytest.importorskip('torch_sparse')
+
+
+def _model_class():
+    # loaded from its file, the external models package needs the backend set by run_experiment
+    path = os.path.join(os.path.dirname(__file__), os.pardir, 'external', 'models', 'lightgcn', 'LightGCNModel.py')
+    spec = importlib.util.spec_from_file_location('LightGCNModel', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.LightGCNModel
+
+
+def _model(n_layers, num_users=12, num_items=20):
+    rng = np.random.RandomState(n_layers)
+    users, items = np.nonzero(rng.rand(num_users, num_items) < 0.15)
+    edges = torch.tensor(np.stack([users, items + num_users]), dtype=torch.int64)
+    adj = torch_sparse.SparseTensor(row=torch.cat([edges[0], edges[1]]), col=torch.cat([edges[1], edges[0]]),
+                                    sparse_sizes=(num_users + num_items, num_users + num_items))
+    return _model_class()(num_users=num_users, num_items=num_items, learning_rate=0.01, embed_k=8, l_w=0.1,
+                          n_layers=n_layers, adj=adj, normalize=True, random_seed=42)
+
+
+@pytest.mark.parametrize('n_layers', [1, 2, 3])
+def test_subgraph_propagation_equals_full_propagation(n_layers):
+    model = _model(n_layers)
+    # users and items (offset by num_users) of a batch, with repetitions
+    nodes = torch.tensor([0, 3, 3, 7, 12, 15, 12, 31], dtype=torch.int64, device=model.device)
+
+    gu, gi = model.propagate_embeddings()
+    full = torch.cat((gu, gi))[nodes]
+    subgraph = model.propagate_subgraph(nodes)
+    torch.testing.assert_close(subgraph, full)
+
+    # the gradients reaching the ego embeddings are the same too
+    full_grads = torch.autograd.grad(full.pow(2).sum(), (model.Gu.weight, model.Gi.weight))
+    subgraph_grads = torch.autograd.grad(subgraph.pow(2).sum(), (model.Gu.weight, model.Gi.weight))
+    for full_grad, subgraph_grad in zip(full_grads, subgraph_grads):
+        torch.testing.assert_close(subgraph_grad, full_grad)
+
+
+def test_subgraph_is_off_by_default():
+    assert _model(1).subgraph is False
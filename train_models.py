@@ -18,13 +18,14 @@ def train_models():
         elif dataset == 'ambar':
             STRATEGIES = ['highest_variance', 'least_favorite', 'most_characteristic', 'most_favorite',
                           'most_rated', 'random', 'full']
-        for model, TEMPLATE in TEMPLATES.items():
-            for strategy in STRATEGIES:
-                if strategy == 'full':
-                    INTERACTIONS_NUM = ['1']
-                else:
-                    INTERACTIONS_NUM = ['1', '3', '7', '15', '100']
-                for int_n in INTERACTIONS_NUM:
+        # the five models of a configuration run back to back, they reuse its DataSet objects (dataset_cache)
+        for strategy in STRATEGIES:
+            if strategy == 'full':
+                INTERACTIONS_NUM = ['1']
+            else:
+                INTERACTIONS_NUM = ['1', '3', '7', '15', '100']
+            for int_n in INTERACTIONS_NUM:
+                for model, TEMPLATE in TEMPLATES.items():
                     dataset_name = dataset + '_' + strategy + '_' + int_n
                     config = TEMPLATE.format(dataset=dataset, strategy=strategy, interactions_numb=int_n, dataset_name=dataset_name)
                     config_path = os.path.abspath(os.path.join(CONFIG_DIR, 'runtime_metrics_conf.yml'))